@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+已验证令牌缓存的微基准
+对比每次完整解码校验与命中缓存时 decode_access_token 的单次耗时
+
+用法: python scripts/bench_jwt_cache.py [次数] [并发令牌数]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from app.security.jwt import create_access_token, decode_access_token, token_cache
+
+
+def bench(tokens, rounds: int) -> float:
+    """返回每次解码的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for i in range(rounds):
+        decode_access_token(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    tokens = [
+        create_access_token(f"user-{i}", {"role": "employee"}) for i in range(sessions)
+    ]
+
+    max_entries = token_cache.max_entries
+    token_cache.max_entries = 0
+    uncached = bench(tokens, rounds)
+
+    token_cache.max_entries = max_entries
+    token_cache.clear()
+    for token in tokens:
+        decode_access_token(token)
+    cached = bench(tokens, rounds)
+
+    print(f"{rounds} 次解码，{sessions} 个活跃令牌")
+    print(f"完整校验: {uncached:8.2f} us/次")
+    print(f"命中缓存: {cached:8.2f} us/次")
+    print(f"每个请求节省: {uncached - cached:8.2f} us（{uncached / cached:.1f}x）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+密码校验吞吐基准
+按启动时相同的方式确定哈希轮数，报告单核和多线程下每秒可完成的校验次数，用于估算登录容量
+
+用法: python scripts/bench_password_hash.py [线程数] [每个线程的校验次数]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from app.security.passwords import (
+    hash_password,
+    setup_password_hashing,
+    verify_password,
+)
+
+
+def verify_many(hashed: str, count: int) -> None:
+    for _ in range(count):
+        verify_password("benchmark-password", hashed)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    rounds = setup_password_hashing()
+    hashed = hash_password("benchmark-password")
+
+    start = time.perf_counter()
+    verify_many(hashed, count)
+    single = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(verify_many, hashed, count)
+    parallel = threads * count / (time.perf_counter() - start)
+
+    print(f"pbkdf2_sha256 轮数: {rounds}")
+    print(f"单核: {single:8.1f} 次校验/秒（{1000 / single:.1f} ms/次）")
+    print(f"{threads} 线程: {parallel:8.1f} 次校验/秒（每核 {parallel / threads:.1f}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,232 @@
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import date, datetime, timezone
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 from uuid import UUID
-from sqlalchemy import select, update, delete
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (
+    and_,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
 from sqlalchemy.orm import selectinload
 
-from .models import User as UserModel, Ticket as TicketModel
+from .database import READ_SESSION_KEY
+from .replica import REPLICA_ERRORS, primary_required, record_write, replica_health
+from .security.email_filter import email_filter
+from .security.refresh_tokens import revoked_refresh_tokens
+from .security.revocation import auth_epochs
+from .ticket_summary import TICKET_SUMMARY_SOURCE
+from .models import (
+    User as UserModel,
+    Ticket as TicketModel,
+    RefreshToken as RefreshTokenModel,
+    TicketMonthlySummary as TicketSummaryModel,
+    TicketLocator as TicketLocatorModel,
+    TicketListVersion as TicketListVersionModel,
+)
+
+
+class TicketsVersion(NamedTuple):
+    """可见票据集合的版本
+
+    version 由 ticket_list_versions 中按员工递增的版本号得出，用于 ETag；
+    taken_at 为数据库当前时间，用作增量同步的水位线。
+    """
+
+    version: int
+    taken_at: datetime
+
+
+class TicketTransition(NamedTuple):
+    """条件状态变更的结果
+
+    outcome: "updated"（已更新）| "not_found"（不存在、已软删或不属于该用户）| "conflict"（状态不是 pending）
+    ticket: 更新后的票据；冲突时为当前票据；不存在时为 None
+    """
+
+    outcome: str
+    ticket: Optional[TicketModel]
+
+
+class TicketPartitionError(RuntimeError):
+    """部分月份的票据分区创建失败；created 为已创建（或已存在）的分区名"""
+
+    def __init__(self, months: List[date], created: List[str]):
+        super().__init__(
+            "creating ticket partitions failed for "
+            + ", ".join(month.isoformat() for month in months)
+        )
+        self.months = months
+        self.created = created
+
+
+# 汇总接口允许的分组维度（currency 始终参与分组，不同币种的金额不能相加）
+SUMMARY_DIMENSIONS = ("user_id", "status", "month")
+
+# 创建票据分区时使用的 advisory lock
+TICKET_PARTITION_LOCK_ID = 7243012
+
+# 票据列表允许的排序列
+TICKET_SORT_COLUMNS = {
+    "created_at": TicketModel.created_at,
+    "spent_at": TicketModel.spent_at,
+    "amount": TicketModel.amount,
+}
 
 
 class DatabaseService:
     """数据库服务层，提供与SQLAlchemy模型交互的方法"""
 
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self, session: AsyncSession, read_session: Optional[AsyncSession] = None
+    ):
         self.session = session
+        # 只读副本会话（可选），默认取 get_db 放在主会话 info 中的副本会话
+        self.read_session = read_session or session.info.get(READ_SESSION_KEY)
+        self._committed = False
+
+    async def _commit(self) -> None:
+        await self.session.commit()
+        self._committed = True
+        record_write()
+
+    def _reader(self) -> AsyncSession:
+        """选择只读查询使用的会话
+
+        以下情况留在主库：未配置副本、副本延迟超限或不可用、本服务已提交过写入或客户端在粘滞窗口内
+        提交过写入（读己之写，见 ReadYourWritesMiddleware），以及主会话有未结束的事务
+        （例如条件 UPDATE 未命中后的补充查询）。
+        """
+        if (
+            self.read_session is None
+            or self._committed
+            or primary_required()
+            or self.session.in_transaction()
+            or not replica_health.usable
+        ):
+            return self.session
+        return self.read_session
+
+    async def _replica_failed(self) -> None:
+        replica_health.mark_failed()
+        replica_health.fallbacks += 1
+        try:
+            await self.read_session.rollback()
+        except REPLICA_ERRORS:
+            pass
+
+    async def _read(self, query, stream: bool = False) -> Result | AsyncResult:
+        """执行只读查询：优先走副本，副本连接失败时改走主库；stream=True 时使用服务端游标"""
+        session = self._reader()
+        execute = AsyncSession.stream if stream else AsyncSession.execute
+        if session is self.session:
+            return await execute(session, query)
+        try:
+            result = await execute(session, query)
+        except REPLICA_ERRORS:
+            await self._replica_failed()
+            return await execute(self.session, query)
+        replica_health.routed_reads += 1
+        return result
+
+    def _dialect_insert(self):
+        return (
+            sqlite_insert
+            if self.session.bind.dialect.name == "sqlite"
+            else postgresql_insert
+        )
+
+    async def _bump_ticket_versions(self, owner_ids: Iterable[UUID]) -> None:
+        """在当前事务中递增相关员工的票据列表版本号，随写入一起提交
+
+        每个员工一行，版本行的锁只让同一员工的写入互相等待，不同员工的写入互不影响；
+        在写入的最后、提交前执行，并按 id 顺序加锁，并发写入不会互相死锁。
+        """
+        scopes = sorted({str(owner_id) for owner_id in owner_ids})
+        if not scopes:
+            return
+        statement = self._dialect_insert()(TicketListVersionModel).values(
+            [{"scope": scope, "version": 1} for scope in scopes]
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[TicketListVersionModel.scope],
+                set_={"version": TicketListVersionModel.version + 1},
+            )
+        )
 
     # User 相关方法
     async def create_user(
         self, email: str, username: str, role: str, password_hash: str
     ) -> UserModel:
-        """创建新用户"""
-        # 检查邮箱是否已存在
-        existing_user = await self.get_user_by_email(email)
-        if existing_user:
-            raise ValueError("email_exists")
+        """创建新用户
 
-        user = UserModel(
-            email=email,
-            username=username,
-            role=role,
-            password_hash=password_hash,
-            is_suspended=False,  # 明确设置为False，确保新用户默认是正常状态
+        使用 INSERT ... ON CONFLICT (email) DO NOTHING RETURNING 一次往返完成查重和插入，
+        并发注册同一邮箱时只有一个成功；邮箱已存在时抛出 ValueError("email_exists")。
+        """
+        result = await self.session.execute(
+            self._dialect_insert()(UserModel)
+            .values(
+                email=email,
+                username=username,
+                role=role,
+                password_hash=password_hash,
+                is_suspended=False,  # 明确设置为False，确保新用户默认是正常状态
+            )
+            .on_conflict_do_nothing(index_elements=[UserModel.email])
+            .returning(UserModel)
         )
-        self.session.add(user)
-        await self.session.commit()
-        await self.session.refresh(user)
+        user = result.scalar_one_or_none()
+        if user is None:
+            raise ValueError("email_exists")
+        await self._commit()
+        email_filter.add(user.email)
         return user
 
+    async def user_emails_version(self) -> Tuple[int, Optional[datetime]]:
+        """用户总数和最新注册时间，用于确定邮箱过滤器的大小和增量同步水位线"""
+        result = await self.session.execute(
+            select(func.count(UserModel.id), func.max(UserModel.created_at))
+        )
+        return tuple(result.one())
+
+    async def latest_user_created_at(self) -> Optional[datetime]:
+        """最新注册时间，用作邮箱过滤器增量同步的水位线（走 created_at 索引）"""
+        result = await self.session.execute(select(func.max(UserModel.created_at)))
+        return result.scalar_one()
+
+    async def stream_user_emails(
+        self, created_after: Optional[datetime] = None, batch_size: int = 10000
+    ) -> AsyncIterator[str]:
+        """分批流式读取已注册邮箱，可只读取某个时间之后注册的"""
+        query = select(UserModel.email)
+        if created_after is not None:
+            query = query.where(UserModel.created_at > created_after)
+        result = await self.session.stream_scalars(
+            query.execution_options(yield_per=batch_size)
+        )
+        async for email in result:
+            yield email
+
     async def get_user_by_email(self, email: str) -> Optional[UserModel]:
         """根据邮箱获取用户"""
         result = await self.session.execute(
@@ -45,24 +236,182 @@ class DatabaseService:
 
     async def get_user_by_id(self, user_id: UUID) -> Optional[UserModel]:
         """根据ID获取用户"""
-        result = await self.session.execute(
+        result = await self._read(
             select(UserModel).where(UserModel.id == user_id)
         )
         return result.scalar_one_or_none()
 
+    async def update_password_hash(
+        self, user_id: UUID, old_hash: str, new_hash: str
+    ) -> bool:
+        """替换密码哈希；只有当前哈希仍为 old_hash 时才写入，避免覆盖并发修改"""
+        result = await self.session.execute(
+            update(UserModel)
+            .where(UserModel.id == user_id, UserModel.password_hash == old_hash)
+            .values(password_hash=new_hash)
+            .returning(UserModel.id)
+        )
+        updated = result.scalar_one_or_none() is not None
+        if updated:
+            await self._commit()
+        return updated
+
     async def set_user_suspended(self, user_id: UUID, suspended: bool) -> Optional[UserModel]:
         """设置用户暂停状态"""
         result = await self.session.execute(
             update(UserModel)
             .where(UserModel.id == user_id)
-            .values(is_suspended=suspended, updated_at=datetime.utcnow())
+            .values(
+                is_suspended=suspended,
+                updated_at=func.now(),
+                auth_epoch=UserModel.auth_epoch + (1 if suspended else 0),
+            )
             .returning(UserModel)
         )
         user = result.scalar_one_or_none()
         if user:
-            await self.session.commit()
+            revoked = []
+            if suspended:
+                # 暂停时吊销该用户所有刷新令牌，访问令牌过期后无法再续期
+                revoked = await self._revoke_user_refresh_tokens(user_id)
+            # 雇主视角的票据列表随员工停用或恢复变化；只递增该员工自己的版本行
+            await self._bump_ticket_versions([user_id])
+            await self._commit()
+            # 立即更新本进程的吊销表，暂停/激活在下一个请求即生效
+            auth_epochs.update(user.id, user.auth_epoch, user.is_suspended)
+            revoked_refresh_tokens.add(revoked)
         return user
 
+    async def latest_user_updated_at(self) -> Optional[datetime]:
+        """最新的用户变更时间，用作吊销表增量同步的水位线（走 updated_at 索引）"""
+        result = await self.session.execute(select(func.max(UserModel.updated_at)))
+        return result.scalar_one()
+
+    async def list_auth_epochs(
+        self, updated_after: datetime
+    ) -> List[Tuple[UUID, int, bool]]:
+        """获取 updated_after 之后变化过的用户的认证纪元，用于增量同步吊销表"""
+        result = await self.session.execute(
+            select(
+                UserModel.id, UserModel.auth_epoch, UserModel.is_suspended
+            ).where(UserModel.updated_at > updated_after)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def list_revoked_auth_epochs(
+        self, changed_after: datetime
+    ) -> List[Tuple[UUID, int, bool]]:
+        """获取重建吊销表所需的认证纪元：暂停中的用户，以及 changed_after 之后变化过且被暂停过的用户
+
+        更早激活的用户按旧纪元签发的访问令牌均已过期，不再需要记录。
+        """
+        result = await self.session.execute(
+            select(
+                UserModel.id, UserModel.auth_epoch, UserModel.is_suspended
+            ).where(
+                or_(
+                    UserModel.is_suspended == True,
+                    and_(
+                        UserModel.auth_epoch > 0,
+                        UserModel.updated_at > changed_after,
+                    ),
+                )
+            )
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def create_refresh_token(
+        self, user_id: UUID, token_hash: str, expires_at: datetime
+    ) -> RefreshTokenModel:
+        """保存刷新令牌（只保存摘要）"""
+        token = RefreshTokenModel(
+            user_id=user_id, token_hash=token_hash, expires_at=expires_at
+        )
+        self.session.add(token)
+        await self._commit()
+        return token
+
+    async def rotate_refresh_token(
+        self,
+        token_id: UUID,
+        token_hash: str,
+        new_token_hash: str,
+        new_expires_at: datetime,
+    ) -> Tuple[Optional[UserModel], Optional[RefreshTokenModel]]:
+        """轮换刷新令牌：用单条 UPDATE 吊销仍有效且摘要匹配的旧令牌，再为未暂停的用户签发新令牌
+
+        返回 (用户, 新令牌)；旧令牌无效时返回 (None, None)，用户被暂停时返回 (用户, None)。
+        """
+        result = await self.session.execute(
+            update(RefreshTokenModel)
+            .where(
+                RefreshTokenModel.id == token_id,
+                RefreshTokenModel.token_hash == token_hash,
+                RefreshTokenModel.revoked_at.is_(None),
+                RefreshTokenModel.expires_at > datetime.now(timezone.utc),
+            )
+            .values(revoked_at=func.now())
+            .returning(RefreshTokenModel.user_id, RefreshTokenModel.expires_at)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None, None
+        user_id, expires_at = row
+
+        user = await self.get_user_by_id(user_id)
+        new_token = None
+        if user is not None and not user.is_suspended:
+            new_token = RefreshTokenModel(
+                user_id=user_id, token_hash=new_token_hash, expires_at=new_expires_at
+            )
+            self.session.add(new_token)
+        await self._commit()
+        revoked_refresh_tokens.add([(token_id, expires_at)])
+        return user, new_token
+
+    async def revoke_refresh_token(self, token_id: UUID, token_hash: str) -> bool:
+        """吊销一个仍有效且摘要匹配的刷新令牌（登出）；令牌无效或已吊销时返回 False"""
+        result = await self.session.execute(
+            update(RefreshTokenModel)
+            .where(
+                RefreshTokenModel.id == token_id,
+                RefreshTokenModel.token_hash == token_hash,
+                RefreshTokenModel.revoked_at.is_(None),
+            )
+            .values(revoked_at=func.now())
+            .returning(RefreshTokenModel.expires_at)
+        )
+        expires_at = result.scalar_one_or_none()
+        if expires_at is None:
+            return False
+        await self._commit()
+        revoked_refresh_tokens.add([(token_id, expires_at)])
+        return True
+
+    async def _revoke_user_refresh_tokens(
+        self, user_id: UUID
+    ) -> List[Tuple[UUID, datetime]]:
+        result = await self.session.execute(
+            update(RefreshTokenModel)
+            .where(
+                RefreshTokenModel.user_id == user_id,
+                RefreshTokenModel.revoked_at.is_(None),
+            )
+            .values(revoked_at=func.now())
+            .returning(RefreshTokenModel.id, RefreshTokenModel.expires_at)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def list_revoked_refresh_tokens(self) -> List[Tuple[UUID, datetime]]:
+        """获取已吊销但尚未过期的刷新令牌 (id, 过期时间)"""
+        result = await self.session.execute(
+            select(RefreshTokenModel.id, RefreshTokenModel.expires_at).where(
+                RefreshTokenModel.revoked_at.is_not(None),
+                RefreshTokenModel.expires_at > datetime.now(timezone.utc),
+            )
+        )
+        return [tuple(row) for row in result.all()]
+
     async def list_employees(
         self, include_suspended: Optional[bool] = None
     ) -> List[UserModel]:
@@ -72,9 +421,21 @@ class DatabaseService:
         if include_suspended is not None:
             query = query.where(UserModel.is_suspended == include_suspended)
         
-        result = await self.session.execute(query)
+        result = await self._read(query)
         return result.scalars().all()
 
+    async def employees_version(
+        self, include_suspended: Optional[bool] = None
+    ) -> Tuple[int, Optional[datetime]]:
+        """计算员工列表的廉价版本号：(行数, 最大 updated_at)，用于 ETag"""
+        query = select(func.count(UserModel.id), func.max(UserModel.updated_at)).where(
+            UserModel.role == "employee"
+        )
+        if include_suspended is not None:
+            query = query.where(UserModel.is_suspended == include_suspended)
+        result = await self._read(query)
+        return tuple(result.one())
+
     # Ticket 相关方法
     async def create_ticket(
         self,
@@ -94,26 +455,307 @@ class DatabaseService:
             description=description,
             link=link,
         )
+        # eager_defaults：INSERT ... RETURNING 一次往返取回 created_at/updated_at
         self.session.add(ticket)
-        await self.session.commit()
-        await self.session.refresh(ticket)
+        await self.session.flush()
+        await self._bump_ticket_versions([user_id])
+        await self._commit()
         return ticket
 
+    async def create_tickets_bulk(
+        self, user_id: UUID, batches: AsyncIterable[List[Dict[str, Any]]]
+    ) -> int:
+        """批量创建票据：每批一条多行 INSERT，全部批次在同一事务中提交
+
+        batches 为异步产出的批次（例如边读请求体边解析），每条记录包含
+        spent_at、amount、currency、description、link。返回插入的行数。
+        """
+        inserted = 0
+        async for rows in batches:
+            await self.session.execute(
+                insert(TicketModel), [{**row, "user_id": user_id} for row in rows]
+            )
+            inserted += len(rows)
+        await self._bump_ticket_versions([user_id])
+        await self._commit()
+        return inserted
+
+    def _where_ticket_id(self, query, ticket_id: UUID):
+        """按 id 定位票据
+
+        PostgreSQL 上 tickets 按 spent_at 分区，同时用标量子查询从 ticket_locators 取得 spent_at，
+        执行时只扫描票据所在的分区，而不是探测每个分区的索引。
+        """
+        query = query.where(TicketModel.id == ticket_id)
+        if self.session.bind.dialect.name == "postgresql":
+            query = query.where(
+                TicketModel.spent_at
+                == select(TicketLocatorModel.spent_at)
+                .where(TicketLocatorModel.id == ticket_id)
+                .scalar_subquery()
+            )
+        return query
+
+    async def _where_ticket_ids(self, query, ticket_ids: List[UUID]):
+        """按一组 id 定位票据；PostgreSQL 上先查出这些票据的 spent_at，以常量列表过滤分区键"""
+        query = query.where(TicketModel.id.in_(ticket_ids))
+        if self.session.bind.dialect.name == "postgresql":
+            spent_at = await self.session.scalars(
+                select(TicketLocatorModel.spent_at)
+                .where(TicketLocatorModel.id.in_(ticket_ids))
+                .distinct()
+            )
+            query = query.where(TicketModel.spent_at.in_(spent_at.all()))
+        return query
+
     async def get_ticket(self, ticket_id: UUID) -> Optional[TicketModel]:
         """根据ID获取票据"""
-        result = await self.session.execute(
-            select(TicketModel).where(TicketModel.id == ticket_id)
-        )
+        result = await self._read(self._where_ticket_id(select(TicketModel), ticket_id))
         return result.scalar_one_or_none()
 
     async def list_tickets(self) -> List[TicketModel]:
         """获取所有票据"""
-        result = await self.session.execute(select(TicketModel))
+        result = await self._read(select(TicketModel))
+        return result.scalars().all()
+
+    def _visible_tickets_query(self, user_id: UUID, role: str):
+        """构造当前用户可见票据的查询
+
+        员工只能看到自己未删除的票据；雇主能看到所有未删除、且所属用户未被停用的票据。
+        可见性过滤全部在数据库中完成，避免逐条查询票据所属用户。
+        """
+        return self._restrict_to_visible(
+            select(TicketModel).where(TicketModel.is_soft_deleted == False),
+            TicketModel.user_id,
+            user_id,
+            role,
+        )
+
+    @staticmethod
+    def _restrict_to_visible(query, owner_column, user_id: UUID, role: str):
+        """按角色限制票据所属用户：员工只看自己，雇主排除被停用的用户"""
+        if role == "employee":
+            return query.where(owner_column == user_id)
+        return query.join(UserModel, owner_column == UserModel.id).where(
+            UserModel.is_suspended == False
+        )
+
+    @staticmethod
+    def _apply_ticket_filters(
+        query,
+        status: Optional[str] = None,
+        owner_id: Optional[UUID] = None,
+        spent_from: Optional[datetime] = None,
+        spent_to: Optional[datetime] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+    ):
+        """将列表筛选条件编译为 WHERE 谓词（spent_at 区间为左闭右开）
+
+        spent_at 直接与边界比较，不包在函数中，PostgreSQL 据此只扫描区间内月份的分区。
+        """
+        if status is not None:
+            query = query.where(TicketModel.status == status)
+        if owner_id is not None:
+            query = query.where(TicketModel.user_id == owner_id)
+        if spent_from is not None:
+            query = query.where(TicketModel.spent_at >= spent_from)
+        if spent_to is not None:
+            query = query.where(TicketModel.spent_at < spent_to)
+        if min_amount is not None:
+            query = query.where(TicketModel.amount >= min_amount)
+        if max_amount is not None:
+            query = query.where(TicketModel.amount <= max_amount)
+        return query
+
+    def _list_visible_tickets_query(
+        self,
+        user_id: UUID,
+        role: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[Any, UUID]] = None,
+        sort: str = "-created_at",
+        **filters,
+    ):
+        """构造带筛选、排序和键集分页的可见票据查询
+
+        sort 为 TICKET_SORT_COLUMNS 中的列名，前缀 "-" 表示倒序，并以 id 作为次级排序保证顺序稳定；
+        传入 after=(排序值, id) 时使用键集分页，只返回排在该位置之后的票据，不使用 OFFSET 扫描。
+        filters 见 _apply_ticket_filters。
+        """
+        descending = sort.startswith("-")
+        sort_column = TICKET_SORT_COLUMNS[sort.lstrip("-")]
+
+        query = self._apply_ticket_filters(
+            self._visible_tickets_query(user_id, role), **filters
+        )
+        if after is not None:
+            keyset = tuple_(sort_column, TicketModel.id)
+            query = query.where(
+                keyset < tuple_(*after) if descending else keyset > tuple_(*after)
+            )
+        if descending:
+            query = query.order_by(sort_column.desc(), TicketModel.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), TicketModel.id.asc())
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    async def visible_tickets_version(self, user_id: UUID, role: str) -> TicketsVersion:
+        """可见票据集合的版本号，无需扫描票据
+
+        员工为自己票据的版本（主键查询一行）；雇主为所有员工版本之和（行数等于有票据的员工数），
+        每次写入都让某一行递增，和必然随之增大。不区分筛选条件，任何写入都会让所有筛选的缓存失效。
+        """
+        version = select(func.coalesce(func.sum(TicketListVersionModel.version), 0))
+        if role == "employee":
+            version = version.where(TicketListVersionModel.scope == str(user_id))
+        result = await self._read(select(version.scalar_subquery(), func.now()))
+        return TicketsVersion(*result.one())
+
+    async def database_now(self) -> datetime:
+        """数据库当前时间（只读会话上的 now()），用作增量同步的水位线，无需扫描票据"""
+        result = await self._read(select(func.now()))
+        return result.scalar_one()
+
+    async def list_ticket_changes(
+        self, user_id: UUID, role: str, since: datetime
+    ) -> Tuple[List[TicketModel], List[UUID]]:
+        """增量同步：返回 since 之后变化的可见票据，以及需要从客户端移除的票据 id
+
+        移除的票据包括 since 之后被软删的票据，以及（雇主视角）所属用户在 since 之后被停用的票据；
+        所属用户在 since 之后恢复的票据作为变化的票据返回。
+        """
+        changed_query = self._visible_tickets_query(user_id, role)
+        if role == "employee":
+            changed_query = changed_query.where(TicketModel.updated_at > since)
+            removed_query = select(TicketModel.id).where(
+                TicketModel.user_id == user_id,
+                TicketModel.is_soft_deleted == True,
+                TicketModel.updated_at > since,
+            )
+        else:
+            changed_query = changed_query.where(
+                or_(TicketModel.updated_at > since, UserModel.updated_at > since)
+            )
+            removed_query = (
+                select(TicketModel.id)
+                .join(UserModel, TicketModel.user_id == UserModel.id)
+                .where(
+                    or_(
+                        and_(
+                            TicketModel.is_soft_deleted == True,
+                            TicketModel.updated_at > since,
+                        ),
+                        and_(
+                            UserModel.is_suspended == True,
+                            UserModel.updated_at > since,
+                        ),
+                    )
+                )
+            )
+
+        changed = await self._read(
+            changed_query.order_by(TicketModel.updated_at, TicketModel.id)
+        )
+        removed = await self._read(removed_query)
+        return changed.scalars().all(), removed.scalars().all()
+
+    async def list_visible_tickets(
+        self, user_id: UUID, role: str, **options
+    ) -> List[TicketModel]:
+        """获取当前用户可见的票据（单条JOIN查询），参数见 _list_visible_tickets_query"""
+        result = await self._read(
+            self._list_visible_tickets_query(user_id, role, **options)
+        )
         return result.scalars().all()
 
+    async def stream_visible_tickets(
+        self, user_id: UUID, role: str, batch_size: int = 1000, **options
+    ) -> AsyncIterator[List[TicketModel]]:
+        """以服务端游标分批读取当前用户可见的票据，内存占用与总行数无关
+
+        参数见 _list_visible_tickets_query；每次产出最多 batch_size 条票据。
+        """
+        query = self._list_visible_tickets_query(user_id, role, **options)
+        result = await self._read(
+            query.execution_options(yield_per=batch_size), stream=True
+        )
+        async for batch in result.scalars().partitions():
+            yield batch
+
+    def _month_expression(self, column):
+        """将时间列格式化为 YYYY-MM
+
+        格式串以字面量渲染：绑定参数在 SELECT 和 GROUP BY 中会成为两个不同的占位符，
+        PostgreSQL 会认为两处表达式不相同。
+        """
+        if self.session.bind.dialect.name == "sqlite":
+            return func.strftime(literal_column("'%Y-%m'"), column)
+        return func.to_char(column, literal_column("'YYYY-MM'"))
+
+    async def summarize_visible_tickets(
+        self, user_id: UUID, role: str, group_by: Iterable[str] = (), **filters
+    ) -> List[Dict[str, Any]]:
+        """在数据库中按维度汇总当前用户可见的票据（可见性规则与列表相同）
+
+        group_by 取自 SUMMARY_DIMENSIONS，币种总是参与分组。每行包含分组键、ticket_count 和 total_amount。
+        只按状态、用户筛选且启用汇总表时，直接读取增量维护的汇总表。
+        """
+        dimensions = [d for d in SUMMARY_DIMENSIONS if d in set(group_by)]
+        use_table = (
+            TICKET_SUMMARY_SOURCE == "table"
+            and self.session.bind.dialect.name == "postgresql"
+            and set(k for k, v in filters.items() if v is not None)
+            <= {"status", "owner_id"}
+        )
+
+        if use_table:
+            model = TicketSummaryModel
+            columns = {
+                "user_id": model.user_id,
+                "status": model.status,
+                "month": self._month_expression(model.month),
+            }
+            count_expr = func.sum(model.ticket_count)
+            total_expr = func.sum(model.total_amount)
+            query = select(model).where(model.ticket_count > 0)
+            if filters.get("status") is not None:
+                query = query.where(model.status == filters["status"])
+            if filters.get("owner_id") is not None:
+                query = query.where(model.user_id == filters["owner_id"])
+            query = self._restrict_to_visible(query, model.user_id, user_id, role)
+        else:
+            model = TicketModel
+            columns = {
+                "user_id": model.user_id,
+                "status": model.status,
+                "month": self._month_expression(model.spent_at),
+            }
+            count_expr = func.count(model.id)
+            total_expr = func.sum(model.amount)
+            query = self._apply_ticket_filters(
+                self._visible_tickets_query(user_id, role), **filters
+            )
+
+        keys = [columns[d].label(d) for d in dimensions]
+        keys.append(model.currency.label("currency"))
+        query = (
+            query.with_only_columns(
+                *keys,
+                count_expr.label("ticket_count"),
+                total_expr.label("total_amount"),
+            )
+            .group_by(*keys)
+            .order_by(*keys)
+        )
+        result = await self._read(query)
+        return [dict(row) for row in result.mappings()]
+
     async def list_tickets_by_user(self, user_id: UUID) -> List[TicketModel]:
         """获取指定用户的票据"""
-        result = await self.session.execute(
+        result = await self._read(
             select(TicketModel).where(TicketModel.user_id == user_id)
         )
         return result.scalars().all()
@@ -125,19 +767,93 @@ class DatabaseService:
         if not update_fields:
             return await self.get_ticket(ticket_id)
         
-        update_fields["updated_at"] = datetime.utcnow()
+        update_fields["updated_at"] = func.now()
         
         result = await self.session.execute(
-            update(TicketModel)
-            .where(TicketModel.id == ticket_id)
+            self._where_ticket_id(update(TicketModel), ticket_id)
             .values(**update_fields)
             .returning(TicketModel)
         )
         ticket = result.scalar_one_or_none()
         if ticket:
-            await self.session.commit()
+            await self._bump_ticket_versions([ticket.user_id])
+            await self._commit()
         return ticket
 
+    async def transition_ticket(
+        self, ticket_id: UUID, owner_id: Optional[UUID] = None, **fields
+    ) -> TicketTransition:
+        """仅当票据处于 pending 且未软删时更新（单条 UPDATE ... RETURNING）
+
+        状态检查与更新在同一条语句中完成，并发审批不会互相覆盖。传入 owner_id 时还要求票据属于该用户。
+        只有未命中时才额外查询一次，用于区分票据不存在和状态冲突。
+        """
+        update_fields = {k: v for k, v in fields.items() if v is not None}
+        update_fields["updated_at"] = func.now()
+
+        query = self._where_ticket_id(update(TicketModel), ticket_id).where(
+            TicketModel.status == "pending",
+            TicketModel.is_soft_deleted == False,
+        )
+        if owner_id is not None:
+            query = query.where(TicketModel.user_id == owner_id)
+        result = await self.session.execute(
+            query.values(**update_fields).returning(TicketModel)
+        )
+        ticket = result.scalar_one_or_none()
+        if ticket:
+            await self._bump_ticket_versions([ticket.user_id])
+            await self._commit()
+            return TicketTransition("updated", ticket)
+
+        current = await self.get_ticket(ticket_id)
+        if (
+            not current
+            or current.is_soft_deleted
+            or (owner_id is not None and current.user_id != owner_id)
+        ):
+            return TicketTransition("not_found", None)
+        return TicketTransition("conflict", current)
+
+    async def bulk_transition_tickets(
+        self, ticket_ids: List[UUID], **fields
+    ) -> Dict[UUID, TicketTransition]:
+        """批量条件状态变更：一条集合 UPDATE 加一次查询，在同一事务中完成
+
+        规则与 transition_ticket 相同（仅更新 pending 且未软删的票据），返回每个 id 的结果。
+        """
+        update_fields = {k: v for k, v in fields.items() if v is not None}
+        update_fields["updated_at"] = func.now()
+
+        query = await self._where_ticket_ids(update(TicketModel), ticket_ids)
+        result = await self.session.execute(
+            query.where(
+                TicketModel.status == "pending",
+                TicketModel.is_soft_deleted == False,
+            )
+            .values(**update_fields)
+            .returning(TicketModel)
+        )
+        outcomes = {t.id: TicketTransition("updated", t) for t in result.scalars()}
+
+        missed = [ticket_id for ticket_id in ticket_ids if ticket_id not in outcomes]
+        if missed:
+            query = await self._where_ticket_ids(select(TicketModel), missed)
+            result = await self.session.execute(
+                query.where(TicketModel.is_soft_deleted == False)
+            )
+            for t in result.scalars():
+                outcomes[t.id] = TicketTransition("conflict", t)
+        owners = [o.ticket.user_id for o in outcomes.values() if o.outcome == "updated"]
+        if owners:
+            await self._bump_ticket_versions(owners)
+        await self._commit()
+
+        return {
+            ticket_id: outcomes.get(ticket_id, TicketTransition("not_found", None))
+            for ticket_id in ticket_ids
+        }
+
     async def soft_delete_ticket(self, ticket_id: UUID) -> Optional[TicketModel]:
         """软删除票据"""
         return await self.update_ticket(ticket_id, is_soft_deleted=True)
@@ -150,6 +866,35 @@ class DatabaseService:
         """拒绝票据"""
         return await self.update_ticket(ticket_id, status="denied")
 
+    async def create_ticket_partitions(self, months: Iterable[date]) -> List[str]:
+        """确保给定月份的票据分区存在（仅 PostgreSQL），返回分区名
+
+        多个 worker 同时执行时由事务级 advisory lock 串行化，已存在的分区不会重复创建。
+        每个月份在各自的保存点中创建，某个月失败不影响其他月份；已创建的分区提交后，
+        若有失败的月份再抛出 TicketPartitionError。
+        """
+        if self.session.bind.dialect.name != "postgresql":
+            return []
+        await self.session.execute(
+            select(func.pg_advisory_xact_lock(TICKET_PARTITION_LOCK_ID))
+        )
+        names, failed, error = [], [], None
+        for month in months:
+            try:
+                async with self.session.begin_nested():
+                    names.append(
+                        await self.session.scalar(
+                            select(func.create_ticket_partition(month))
+                        )
+                    )
+            except DBAPIError as exc:
+                failed.append(month)
+                error = exc
+        await self._commit()
+        if failed:
+            raise TicketPartitionError(failed, names) from error
+        return names
+
     async def get_tickets_for_suspended_users(self) -> List[TicketModel]:
         """获取被暂停用户的票据（用于软删除）"""
         # 这里需要JOIN查询，获取被暂停用户的票据
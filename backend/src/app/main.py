@@ -1,18 +1,65 @@
+import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .routers import auth, employees, tickets
-from .database import init_db
+from .database import check_schema_version, pool_status, replica_engine
+from .partitions import partition_status, run_ticket_partition_maintainer
+from .replica import (
+    PRIMARY_UNTIL_HEADER,
+    ReadYourWritesMiddleware,
+    replica_metrics,
+    run_replica_monitor,
+)
+from .security.dependencies import require_role
+from .security.email_filter import (
+    email_filter,
+    rebuild_email_filter,
+    run_email_filter_refresher,
+)
+from .security.jwt import token_cache
+from .security.refresh_tokens import (
+    load_revoked_refresh_tokens,
+    revoked_refresh_tokens,
+)
+from .security.revocation import auth_epochs, run_auth_epoch_refresher
+from .security.passwords import (
+    hashing_metrics,
+    setup_password_hashing,
+    shutdown_hashing_pool,
+)
+from .security.throttle import throttle_metrics
+from .sql_logging import sql_logger
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动时初始化数据库
-    await init_db()
+    # 只检查数据库结构版本，迁移由部署时的 alembic upgrade head 完成
+    await check_schema_version()
+    # 使用部署时校准好的密码哈希轮数（PASSWORD_HASH_ROUNDS），worker 启动时不测速
+    setup_password_hashing()
+    await load_revoked_refresh_tokens()
+    # 定期按 users.updated_at 水位线增量同步令牌吊销表
+    refresher = asyncio.create_task(run_auth_epoch_refresher())
+    # 加载已注册邮箱过滤器，并定期同步新注册的邮箱
+    await rebuild_email_filter()
+    email_refresher = asyncio.create_task(run_email_filter_refresher())
+    # 配置了只读副本时持续检查复制延迟，延迟超限或不可用时只读查询改走主库
+    replica_monitor = (
+        asyncio.create_task(run_replica_monitor()) if replica_engine is not None else None
+    )
+    # 预建未来月份的票据分区
+    partition_maintainer = asyncio.create_task(run_ticket_partition_maintainer())
     yield
-    # 关闭时的清理工作（如果需要）
+    refresher.cancel()
+    email_refresher.cancel()
+    if replica_monitor is not None:
+        replica_monitor.cancel()
+    partition_maintainer.cancel()
+    # 关闭时释放密码哈希计算池
+    shutdown_hashing_pool()
 
 
 app = FastAPI(
@@ -21,12 +68,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 配置副本时，写入之后该客户端的读取在粘滞窗口内留在主库
+if replica_engine is not None:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 开发阶段放开，生产请收敛
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PRIMARY_UNTIL_HEADER],
 )
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -34,6 +86,24 @@ app.include_router(tickets.router, prefix="/tickets", tags=["tickets"])
 app.include_router(employees.router, prefix="/employees", tags=["employees"])
 
 
+# 运行时指标含连接池、吊销表和限流等内部状态，只对雇主开放
+@app.get("/metrics", dependencies=[Depends(require_role("employer"))])
+async def metrics():
+    """运行时指标"""
+    return {
+        "db_pool": pool_status(),
+        "db_replica": replica_metrics(),
+        "ticket_partitions": partition_status.metrics(),
+        "sql": sql_logger.metrics(),
+        "password_hashing": hashing_metrics(),
+        "jwt_cache": token_cache.metrics(),
+        "auth_epochs": auth_epochs.metrics(),
+        "revoked_refresh_tokens": revoked_refresh_tokens.metrics(),
+        "login_throttle": throttle_metrics(),
+        "email_filter": email_filter.metrics(),
+    }
+
+
 @app.get("/health")
 async def health():
     """健康检查端点，包含数据库连接检查"""
@@ -0,0 +1,113 @@
+from typing import List, Optional
+
+from alembic import op
+from sqlalchemy import text
+
+
+def _index_is_invalid(name: str) -> bool:
+    return bool(
+        op.get_bind().scalar(
+            text(
+                "SELECT NOT i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+            ),
+            {"name": name},
+        )
+    )
+
+
+def _partitions(table: str) -> Optional[List[str]]:
+    """分区表的各分区名；普通表（或离线生成 SQL、无法查询时）返回 None"""
+    if op.get_context().as_sql:
+        return None
+    bind = op.get_bind()
+    if bind.scalar(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    ) != "p":
+        return None
+    return list(
+        bind.scalars(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+            ),
+            {"table": table},
+        )
+    )
+
+
+def _create_partitioned_index_concurrently(
+    name: str, table: str, columns: List[str], partitions: List[str], **kw
+) -> None:
+    """分区表不支持 CREATE INDEX CONCURRENTLY：先在父表上建 ON ONLY 索引（只改目录，瞬间完成），
+    再对每个分区在线建索引并 ATTACH；全部挂上后父表索引自动变为有效。
+
+    父表索引建好后新建的分区会自动带上该索引；重复执行时已挂上的分区索引 ATTACH 为空操作。
+    """
+    where = kw.get("postgresql_where")
+    op.execute(
+        f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({', '.join(columns)})"
+        + (f" WHERE {where}" if where is not None else "")
+    )
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            index = f"{name}_{partition.removeprefix(table + '_')}"
+            if _index_is_invalid(index):
+                op.drop_index(index, table_name=partition, postgresql_concurrently=True)
+            op.create_index(
+                index,
+                partition,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **kw,
+            )
+            op.execute(f"ALTER INDEX {name} ATTACH PARTITION {index}")
+
+
+def create_index_concurrently(
+    name: str, table: str, columns: List[str], **kw
+) -> None:
+    """在线创建索引：PostgreSQL 上使用 CREATE INDEX CONCURRENTLY，建索引期间不阻塞表的写入
+
+    CONCURRENTLY 不能在事务中执行，因此放在 autocommit 块中。上一次中断留下的无效索引先删除再重建。
+    分区表（如 tickets）按分区逐个在线建索引后挂到父表索引上；离线生成 SQL 时无法判断是否分区，
+    按普通表输出。
+    """
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index(name, table, columns, **kw)
+        return
+    partitions = _partitions(table)
+    if partitions is not None:
+        _create_partitioned_index_concurrently(name, table, columns, partitions, **kw)
+        return
+    with op.get_context().autocommit_block():
+        if not op.get_context().as_sql and _index_is_invalid(name):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        op.create_index(
+            name,
+            table,
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kw,
+        )
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    """在线删除索引（DROP INDEX CONCURRENTLY）
+
+    分区表的索引不支持 CONCURRENTLY，直接删除父表索引（连同各分区上挂着的索引，只改目录）。
+    """
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(name, table_name=table)
+        return
+    if _partitions(table) is not None:
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            name, table_name=table, postgresql_concurrently=True, if_exists=True
+        )
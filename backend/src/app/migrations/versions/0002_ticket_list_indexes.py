@@ -0,0 +1,38 @@
+"""indexes for ticket list pagination, filters and delta sync
+
+Revision ID: 0002_ticket_list_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17 10:10:00.000000
+
+键集分页、审批队列筛选和增量同步所需的 tickets 索引。已有数据库中 tickets 可能很大，
+索引在线创建（CREATE INDEX CONCURRENTLY），不阻塞票据写入。
+"""
+from typing import Sequence, Union
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_ticket_list_indexes"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_tickets_created_at_id": ["created_at", "id"],
+    "ix_tickets_status_created_at_id": ["status", "created_at", "id"],
+    "ix_tickets_status_spent_at": ["status", "spent_at"],
+    "ix_tickets_user_id_created_at_id": ["user_id", "created_at", "id"],
+    "ix_tickets_updated_at": ["updated_at"],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, columns in INDEXES.items():
+        create_index_concurrently(name, "tickets", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(INDEXES)):
+        drop_index_concurrently(name, "tickets")
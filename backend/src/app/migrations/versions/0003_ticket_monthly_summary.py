@@ -0,0 +1,38 @@
+"""add ticket_monthly_summary
+
+Revision ID: 0003_ticket_monthly_summary
+Revises: 0002_ticket_list_indexes
+Create Date: 2026-10-17 10:20:00.000000
+
+按 (用户, 币种, 状态, 月份) 汇总的票据统计表。维护它的触发器和回填在 0008_ticket_summary_trigger 中，
+只在 TICKET_SUMMARY_SOURCE=table 时安装。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_ticket_monthly_summary"
+down_revision: Union[str, Sequence[str], None] = "0002_ticket_list_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ticket_monthly_summary",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("currency", sa.String(10), primary_key=True),
+        sa.Column("status", sa.String(20), primary_key=True),
+        sa.Column("month", sa.Date(), primary_key=True),
+        sa.Column("ticket_count", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ticket_monthly_summary")
@@ -0,0 +1,33 @@
+"""add users.auth_epoch
+
+Revision ID: 0004_users_auth_epoch
+Revises: 0003_ticket_monthly_summary
+Create Date: 2026-10-17 10:30:00.000000
+
+认证纪元：暂停用户时递增，令牌中携带的纪元小于当前值即视为已吊销。
+带常量默认值的 ADD COLUMN 在 PostgreSQL 11+ 上只改目录，不重写表。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_users_auth_epoch"
+down_revision: Union[str, Sequence[str], None] = "0003_ticket_monthly_summary"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column("auth_epoch", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("auth_epoch")
@@ -0,0 +1,35 @@
+"""partial index for loading revoked refresh tokens
+
+Revision ID: 0006_refresh_tokens_revoked
+Revises: 0005_refresh_tokens
+Create Date: 2026-10-17 10:50:00.000000
+
+每个 worker 启动时都会加载已吊销且未过期的刷新令牌；部分索引只包含已吊销的行，
+不必扫描整张 refresh_tokens 表。索引在线创建，不阻塞登录和刷新写入。
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_refresh_tokens_revoked"
+down_revision: Union[str, Sequence[str], None] = "0005_refresh_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_concurrently(
+        "ix_refresh_tokens_revoked_expires_at",
+        "refresh_tokens",
+        ["expires_at"],
+        postgresql_where=sa.text("revoked_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_refresh_tokens_revoked_expires_at", "refresh_tokens")
@@ -0,0 +1,153 @@
+"""partition tickets by month of spent_at
+
+Revision ID: 0007_partition_tickets
+Revises: 0006_refresh_tokens_revoked
+Create Date: 2026-10-17 11:00:00.000000
+
+把 tickets 改为按 spent_at 的月度范围分区表（仅 PostgreSQL，SQLite 仅用于测试，不分区）：
+为已有数据覆盖的月份（最多回溯 TICKET_PARTITION_BACKFILL_MONTHS 个月）和未来几个月建分区，
+更早的票据进入默认分区。迁移在一个事务中复制整张表，期间 tickets 被锁定，应在维护窗口执行：
+tickets 已有数据时必须显式确认 `alembic -x partition_tickets=yes upgrade head`，否则迁移中止，
+容器启动时自动执行的 `alembic upgrade head` 不会在滚动部署中悄悄锁表复制。
+索引在复制之后、同一事务中以普通 CREATE INDEX 建立（表已被锁定，比 CONCURRENTLY 快）；之后给分区表
+tickets 加索引须使用 app.migrations.create_index_concurrently，它按分区逐个在线建索引后挂到父表索引上。
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+from sqlalchemy import text
+
+from app.partitions import (
+    CREATE_DEFAULT_TICKET_PARTITION,
+    CREATE_TICKET_PARTITION_FUNCTION,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_partition_tickets"
+down_revision: Union[str, Sequence[str], None] = "0006_refresh_tokens_revoked"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_PARTITION_BACKFILL_MONTHS = 120
+TICKET_PARTITION_MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, user_id, spent_at, amount, currency, description, link, status, "
+    "is_soft_deleted, created_at, updated_at"
+)
+
+TICKETS_TABLE = """
+CREATE TABLE tickets (
+    id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    spent_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    amount FLOAT NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    description TEXT,
+    link TEXT,
+    status VARCHAR(20) NOT NULL,
+    is_soft_deleted BOOLEAN NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    PRIMARY KEY ({primary_key})
+){partition_by}
+"""
+
+INDEXES = {
+    "ix_tickets_user_id": "user_id",
+    "ix_tickets_created_at_id": "created_at, id",
+    "ix_tickets_status_created_at_id": "status, created_at, id",
+    "ix_tickets_status_spent_at": "status, spent_at",
+    "ix_tickets_user_id_created_at_id": "user_id, created_at, id",
+    "ix_tickets_updated_at": "updated_at",
+}
+
+# 汇总触发器只在启用汇总表时存在（见 app/ticket_summary.py），旧表上有才在新表上重建
+SUMMARY_TRIGGER = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_trigger
+         WHERE tgname = 'tickets_summary_trigger'
+           AND tgrelid = 'tickets_old'::regclass
+    ) THEN
+        CREATE TRIGGER tickets_summary_trigger
+        AFTER INSERT OR UPDATE OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION ticket_summary_apply();
+    END IF;
+END
+$$
+"""
+
+
+def _rebuild_tickets(primary_key: str, partition_by: str, before_copy=()) -> None:
+    """用新的表定义重建 tickets 并复制数据
+
+    旧表改名为 tickets_old，before_copy 在复制前执行（可引用 tickets_old）。
+    复制完成后再建索引和汇总触发器，复制的行不会被汇总表重复计数；旧表的触发器随旧表删除。
+    ticket_locators 在之后的 0009 才建立，此时 tickets 上还没有定位触发器。
+    """
+    op.execute("ALTER TABLE tickets RENAME TO tickets_old")
+    op.execute(
+        "ALTER TABLE tickets_old RENAME CONSTRAINT tickets_pkey TO tickets_old_pkey"
+    )
+    op.execute(
+        TICKETS_TABLE.format(primary_key=primary_key, partition_by=partition_by)
+    )
+    for statement in before_copy:
+        op.execute(statement)
+    op.execute(f"INSERT INTO tickets ({COLUMNS}) SELECT {COLUMNS} FROM tickets_old")
+    op.execute(SUMMARY_TRIGGER)
+    op.execute("DROP TABLE tickets_old")
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON tickets ({columns})")
+
+
+def _confirm_copy() -> None:
+    """tickets 有数据（生成离线 SQL 时无法判断）且未显式确认时中止迁移"""
+    if context.get_x_argument(as_dictionary=True).get("partition_tickets") == "yes":
+        return
+    if not context.is_offline_mode() and not op.get_bind().scalar(
+        text("SELECT EXISTS (SELECT 1 FROM tickets)")
+    ):
+        return
+    raise RuntimeError(
+        "0007_partition_tickets copies the whole tickets table while it is locked; "
+        "run it in a maintenance window with "
+        "`alembic -x partition_tickets=yes upgrade head`"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _confirm_copy()
+    _rebuild_tickets(
+        "id, spent_at",
+        " PARTITION BY RANGE (spent_at)",
+        before_copy=(
+            CREATE_TICKET_PARTITION_FUNCTION,
+            CREATE_DEFAULT_TICKET_PARTITION,
+            f"""
+            SELECT create_ticket_partition(month::date)
+              FROM generate_series(
+                       date_trunc('month', GREATEST(
+                           COALESCE((SELECT min(spent_at) FROM tickets_old), now()),
+                           now() - interval '{TICKET_PARTITION_BACKFILL_MONTHS} months'
+                       ) AT TIME ZONE 'UTC'),
+                       date_trunc('month', now() AT TIME ZONE 'UTC')
+                           + interval '{TICKET_PARTITION_MONTHS_AHEAD} months',
+                       interval '1 month'
+                   ) AS month
+            """,
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    _rebuild_tickets("id", "")
+    op.execute("DROP FUNCTION IF EXISTS create_ticket_partition(date)")
@@ -0,0 +1,40 @@
+"""install the ticket summary trigger when the summary table is enabled
+
+Revision ID: 0008_ticket_summary_trigger
+Revises: 0007_partition_tickets
+Create Date: 2026-10-17 11:10:00.000000
+
+触发器让每次票据插入和更新多一次汇总表 upsert，只在迁移时 TICKET_SUMMARY_SOURCE=table 才安装并回填；
+否则为空操作。之后切换数据来源执行 `python -m app.ticket_summary enable|disable`。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.ticket_summary import (
+    DISABLE_TICKET_SUMMARY,
+    ENABLE_TICKET_SUMMARY,
+    summary_trigger_enabled,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_ticket_summary_trigger"
+down_revision: Union[str, Sequence[str], None] = "0007_partition_tickets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql" or not summary_trigger_enabled():
+        return
+    for statement in ENABLE_TICKET_SUMMARY:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for statement in DISABLE_TICKET_SUMMARY:
+        op.execute(statement)
@@ -0,0 +1,54 @@
+"""add ticket_locators so lookups by id scan one partition
+
+Revision ID: 0009_ticket_locators
+Revises: 0008_ticket_summary_trigger
+Create Date: 2026-10-17 11:20:00.000000
+
+分区表 tickets 的主键为 (id, spent_at)，只按 id 查询会探测每个月份分区。ticket_locators 记录 id 到
+spent_at 的映射（PostgreSQL 上由触发器维护），按 id 查询时先取得 spent_at，只扫描所在分区。
+触发器先在迁移事务中安装，回填在之后单独的自动提交语句中执行，不在回填期间阻塞票据写入；
+回填与触发器并发写入同一 id 时由 ON CONFLICT DO NOTHING 保留触发器写入的最新值。
+ticket_locators 的主键同时保证票据 id 在数据库中唯一（分区表自身的主键为 (id, spent_at)）。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.partitions import INSTALL_TICKET_LOCATOR, UNINSTALL_TICKET_LOCATOR
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_ticket_locators"
+down_revision: Union[str, Sequence[str], None] = "0008_ticket_summary_trigger"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_LOCATOR_BACKFILL = """
+INSERT INTO ticket_locators (id, spent_at)
+SELECT id, spent_at FROM tickets
+ON CONFLICT (id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ticket_locators",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("spent_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for statement in INSTALL_TICKET_LOCATOR:
+        op.execute(statement)
+    with op.get_context().autocommit_block():
+        op.execute(TICKET_LOCATOR_BACKFILL)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        for statement in UNINSTALL_TICKET_LOCATOR:
+            op.execute(statement)
+    op.drop_table("ticket_locators")
@@ -0,0 +1,33 @@
+"""add ticket_list_versions for cheap list ETags
+
+Revision ID: 0010_ticket_list_versions
+Revises: 0009_ticket_locators
+Create Date: 2026-10-17 11:30:00.000000
+
+票据列表的 ETag 改用写入时递增的版本号，不再在每次列表请求前对可见票据做 count(*) 和 max()。
+版本号从 0 开始：升级后第一次写入前，客户端缓存的旧 ETag 与新格式不同，不会误判为未修改。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_ticket_list_versions"
+down_revision: Union[str, Sequence[str], None] = "0009_ticket_locators"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ticket_list_versions",
+        sa.Column("scope", sa.String(36), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("ticket_list_versions")
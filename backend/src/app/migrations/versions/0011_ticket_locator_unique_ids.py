@@ -0,0 +1,34 @@
+"""make ticket_locators enforce unique ticket ids
+
+Revision ID: 0011_ticket_locator_unique
+Revises: 0010_ticket_list_versions
+Create Date: 2026-10-17 12:00:00.000000
+
+重新安装 ticket_locators 的触发器（见 app/partitions.py）：插入票据时普通 INSERT 映射，重复的 id 违反
+ticket_locators 的主键而失败，不再被 ON CONFLICT 覆盖；只有 spent_at 真正变化的 UPDATE 才执行触发器。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.partitions import INSTALL_TICKET_LOCATOR
+
+# revision identifiers, used by Alembic.
+revision: str = "0011_ticket_locator_unique"
+down_revision: Union[str, Sequence[str], None] = "0010_ticket_list_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for statement in INSTALL_TICKET_LOCATOR:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 新触发器在旧版本下同样正确，无需还原
+    pass
@@ -0,0 +1,28 @@
+"""index users.created_at for the email filter refresh
+
+Revision ID: 0012_users_created_at
+Revises: 0011_ticket_locator_unique
+Create Date: 2026-10-17 12:10:00.000000
+
+每个 worker 每隔 EMAIL_FILTER_REFRESH_SECONDS 秒按注册时间增量同步邮箱过滤器（max(created_at) 和
+created_at > 水位线），没有索引时每次都要扫描整张 users 表。索引在线创建，不阻塞注册写入。
+"""
+from typing import Sequence, Union
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0012_users_created_at"
+down_revision: Union[str, Sequence[str], None] = "0011_ticket_locator_unique"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_concurrently("ix_users_created_at", "users", ["created_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_users_created_at", "users")
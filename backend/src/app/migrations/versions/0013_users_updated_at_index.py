@@ -0,0 +1,28 @@
+"""index users.updated_at for the auth epoch refresh
+
+Revision ID: 0013_users_updated_at
+Revises: 0012_users_created_at
+Create Date: 2026-10-17 12:20:00.000000
+
+每个 worker 每隔 AUTH_EPOCH_REFRESH_SECONDS 秒按 users.updated_at 水位线增量同步令牌吊销表
+（max(updated_at) 和 updated_at > 水位线），没有索引时每次都要扫描整张 users 表。索引在线创建，不阻塞写入。
+"""
+from typing import Sequence, Union
+
+from app.migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0013_users_updated_at"
+down_revision: Union[str, Sequence[str], None] = "0012_users_created_at"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_concurrently("ix_users_updated_at", "users", ["updated_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_users_updated_at", "users")
@@ -1,16 +1,38 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Text
+from sqlalchemy import (
+    Column,
+    String,
+    Float,
+    BigInteger,
+    Boolean,
+    Date,
+    DateTime,
+    Integer,
+    Text,
+    Index,
+    event,
+    text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 import uuid
 
+from .partitions import (
+    CREATE_DEFAULT_TICKET_PARTITION,
+    CREATE_TICKET_PARTITION_FUNCTION,
+    INSTALL_TICKET_LOCATOR,
+)
+from .ticket_summary import ENABLE_TICKET_SUMMARY, summary_trigger_enabled
+
 Base = declarative_base()
 
 
 class User(Base):
     __tablename__ = "users"
+    # 插入/更新时通过 RETURNING 取回服务端默认值（created_at 等），不再额外 SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -18,19 +40,49 @@ class User(Base):
     role = Column(String(20), nullable=False)  # 'employee' | 'employer'
     password_hash = Column(String(255), nullable=False)
     is_suspended = Column(Boolean, default=False, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # 认证纪元：暂停用户时递增，令牌中携带的纪元小于当前值即视为已吊销
+    auth_epoch = Column(Integer, default=0, server_default="0", nullable=False)
+    # 邮箱过滤器按注册时间增量同步（created_at > 水位线、max(created_at)）
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+    # 吊销表按 updated_at 水位线增量同步（updated_at > 水位线、max(updated_at)）
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+        index=True,
+    )
 
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email}, role={self.role})>"
 
 
 class Ticket(Base):
+    """票据；PostgreSQL 上按 spent_at 月度范围分区（见 partitions.py）
+
+    分区表的主键必须包含分区键，因此表主键为 (id, spent_at)；ORM 仍只以 id 标识票据，
+    id 的唯一性由 ticket_locators 的主键保证。
+    """
+
     __tablename__ = "tickets"
+    __table_args__ = (
+        # 票据列表按 (created_at, id) 键集分页
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        # 审批队列（status='pending'）按创建时间或消费时间的范围扫描
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tickets_status_spent_at", "status", "spent_at"),
+        # 员工自己的票据列表，以及雇主按员工筛选
+        Index("ix_tickets_user_id_created_at_id", "user_id", "created_at", "id"),
+        # 增量同步按 updated_at 水位线范围扫描
+        Index("ix_tickets_updated_at", "updated_at"),
+        {"postgresql_partition_by": "RANGE (spent_at)"},
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
-    spent_at = Column(DateTime(timezone=True), nullable=False)
+    spent_at = Column(DateTime(timezone=True), primary_key=True)
     amount = Column(Float, nullable=False)
     currency = Column(String(10), nullable=False)
     description = Column(Text, nullable=True)
@@ -40,5 +92,117 @@ class Ticket(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id]}
+
     def __repr__(self):
         return f"<Ticket(id={self.id}, user_id={self.user_id}, amount={self.amount}, status={self.status})>"
+
+
+class TicketLocator(Base):
+    """票据 id 到 spent_at 的映射，按 id 查询分区表 tickets 时据此只扫描票据所在的分区
+
+    分区表 tickets 的主键为 (id, spent_at)，数据库中 id 的唯一性由本表的主键保证。
+    仅在 PostgreSQL 上由 tickets 的触发器维护（见 partitions.INSTALL_TICKET_LOCATOR）。
+    """
+
+    __tablename__ = "ticket_locators"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    spent_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<TicketLocator(id={self.id}, spent_at={self.spent_at})>"
+
+
+class TicketListVersion(Base):
+    """票据列表的版本号，每次票据写入时在同一事务中递增，用作列表 ETag 而无需扫描票据
+
+    scope 为员工 id，每个员工一行（该员工的票据写入、停用或恢复时递增）；
+    雇主视角的版本为所有行之和，不设全局计数行，不同员工的写入不会争用同一行锁。
+    """
+
+    __tablename__ = "ticket_list_versions"
+
+    scope = Column(String(36), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<TicketListVersion(scope={self.scope}, version={self.version})>"
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # 启动时加载已吊销且未过期的令牌，部分索引只包含已吊销的行
+        Index(
+            "ix_refresh_tokens_revoked_expires_at",
+            "expires_at",
+            postgresql_where=text("revoked_at IS NOT NULL"),
+        ),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    # 只保存令牌密文部分的 SHA-256 摘要
+    token_hash = Column(String(64), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_id={self.user_id}, revoked_at={self.revoked_at})>"
+
+
+class TicketMonthlySummary(Base):
+    """按 (用户, 币种, 状态, 月份) 汇总的票据统计，TICKET_SUMMARY_SOURCE=table 时由 PostgreSQL 触发器增量维护
+
+    只统计未软删的票据；员工被停用时的可见性过滤在查询时与 users 表连接完成。
+    """
+
+    __tablename__ = "ticket_monthly_summary"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    currency = Column(String(10), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    month = Column(Date, primary_key=True)  # 当月第一天
+    ticket_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"<TicketMonthlySummary(user_id={self.user_id}, month={self.month}, "
+            f"currency={self.currency}, status={self.status})>"
+        )
+
+
+# 汇总表依赖 tickets 上的触发器，必须在 tickets 之后创建
+TicketMonthlySummary.__table__.add_is_dependent_on(Ticket.__table__)
+
+
+@event.listens_for(TicketMonthlySummary.__table__, "after_create")
+def _install_ticket_summary_trigger(target, connection, **kw):
+    """汇总触发器只在启用汇总表时安装（仅 PostgreSQL）"""
+    if connection.dialect.name == "postgresql" and summary_trigger_enabled():
+        for statement in ENABLE_TICKET_SUMMARY:
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Ticket.__table__, "after_create")
+def _install_ticket_partitions(target, connection, **kw):
+    """分区函数和默认分区（仅 PostgreSQL）"""
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(CREATE_TICKET_PARTITION_FUNCTION)
+        connection.exec_driver_sql(CREATE_DEFAULT_TICKET_PARTITION)
+
+
+# ticket_locators 由 tickets 上的触发器维护，必须在 tickets 之后创建
+TicketLocator.__table__.add_is_dependent_on(Ticket.__table__)
+
+
+@event.listens_for(TicketLocator.__table__, "after_create")
+def _install_ticket_locator_trigger(target, connection, **kw):
+    """维护 ticket_locators 的触发器（仅 PostgreSQL）"""
+    if connection.dialect.name == "postgresql":
+        for statement in INSTALL_TICKET_LOCATOR:
+            connection.exec_driver_sql(statement)
@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Tuple
+from uuid import UUID
+
+
+def encode_cursor(sort: str, value: Any, ticket_id: UUID) -> str:
+    """将排序键、排序值和 id 编码为不透明的游标字符串"""
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    raw = json.dumps([sort, value, str(ticket_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, UUID]:
+    """解析游标字符串；格式错误或与当前排序键不一致时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, ticket_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort:
+            raise ValueError("cursor_sort_mismatch")
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["dt"])
+        elif not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError("invalid_cursor_value")
+        return value, UUID(ticket_id)
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError("invalid_cursor") from exc
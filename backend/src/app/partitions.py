@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 提前创建的票据月度分区数（不含当月），以及检查间隔（秒）
+TICKET_PARTITION_MONTHS_AHEAD = int(os.getenv("TICKET_PARTITION_MONTHS_AHEAD", "3"))
+TICKET_PARTITION_CHECK_SECONDS = float(
+    os.getenv("TICKET_PARTITION_CHECK_SECONDS", "21600")
+)
+
+
+# 以下 DDL 由 models.py（create_all）和迁移共用，只在 PostgreSQL 上执行，以 exec_driver_sql / op.execute
+# 原样执行，不经过 Python 的百分号格式化
+
+# 按月创建票据分区的函数，分区名为 tickets_YYYY_MM，月份边界按 UTC 计算；
+# 另有一个默认分区接收没有对应月份分区的票据，新建分区时从中移出该月的行
+CREATE_TICKET_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_ticket_partition(month date) RETURNS text AS $$
+DECLARE
+    month_start timestamptz :=
+        date_trunc('month', month::timestamp) AT TIME ZONE 'UTC';
+    month_end timestamptz :=
+        (date_trunc('month', month::timestamp) + interval '1 month')
+        AT TIME ZONE 'UTC';
+    partition_name text :=
+        'tickets_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+    -- 默认分区已有该月的票据（如提前录入的未来消费）时建分区会失败：
+    -- 先把这些行移出默认分区，建好分区后再经父表插回（触发器看到的是一删一增，汇总不变）
+    IF EXISTS (
+        SELECT 1 FROM tickets_default
+         WHERE spent_at >= month_start AND spent_at < month_end
+    ) THEN
+        CREATE TEMP TABLE ticket_partition_moved AS
+            SELECT * FROM tickets_default
+             WHERE spent_at >= month_start AND spent_at < month_end;
+        DELETE FROM tickets_default
+         WHERE spent_at >= month_start AND spent_at < month_end;
+    END IF;
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF tickets '
+        'FOR VALUES FROM (%L) TO (%L)',
+        partition_name, month_start, month_end
+    );
+    IF to_regclass('pg_temp.ticket_partition_moved') IS NOT NULL THEN
+        INSERT INTO tickets SELECT * FROM ticket_partition_moved;
+        DROP TABLE ticket_partition_moved;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CREATE_DEFAULT_TICKET_PARTITION = (
+    "CREATE TABLE IF NOT EXISTS tickets_default PARTITION OF tickets DEFAULT"
+)
+
+# 分区表的唯一约束必须包含分区键，tickets 的主键只能是 (id, spent_at)。ticket_locators 以 id 为主键，
+# 是票据 id 唯一性的依据：插入重复 id 的票据时触发器的 INSERT 违反主键约束，整条语句失败。
+# 跨分区的 UPDATE 按先 DELETE 后 INSERT 触发；删除时只删除 spent_at 仍为旧值的映射。
+# 只有插入、删除和 spent_at 真正变化的更新才执行触发器，审批、编辑其他字段不产生额外写入
+TICKET_LOCATOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION ticket_locator_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO ticket_locators (id, spent_at) VALUES (NEW.id, NEW.spent_at);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE ticket_locators SET spent_at = NEW.spent_at WHERE id = NEW.id;
+    ELSE
+        DELETE FROM ticket_locators
+         WHERE id = OLD.id AND spent_at = OLD.spent_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+INSTALL_TICKET_LOCATOR = [
+    TICKET_LOCATOR_FUNCTION,
+    "DROP TRIGGER IF EXISTS tickets_locator_trigger ON tickets",
+    "DROP TRIGGER IF EXISTS tickets_locator_update_trigger ON tickets",
+    """
+    CREATE TRIGGER tickets_locator_trigger
+    AFTER INSERT OR DELETE ON tickets
+    FOR EACH ROW EXECUTE FUNCTION ticket_locator_apply()
+    """,
+    """
+    CREATE TRIGGER tickets_locator_update_trigger
+    AFTER UPDATE OF spent_at ON tickets
+    FOR EACH ROW WHEN (OLD.spent_at IS DISTINCT FROM NEW.spent_at)
+    EXECUTE FUNCTION ticket_locator_apply()
+    """,
+]
+
+UNINSTALL_TICKET_LOCATOR = [
+    "DROP TRIGGER IF EXISTS tickets_locator_trigger ON tickets",
+    "DROP TRIGGER IF EXISTS tickets_locator_update_trigger ON tickets",
+    "DROP FUNCTION IF EXISTS ticket_locator_apply()",
+]
+
+
+def upcoming_months(today: date, months_ahead: int) -> List[date]:
+    """当月及之后 months_ahead 个月的第一天"""
+    months = []
+    year, month = today.year, today.month
+    for _ in range(months_ahead + 1):
+        months.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class TicketPartitionStatus:
+    """分区维护任务的最近一次结果"""
+
+    def __init__(self):
+        self.partitions: List[str] = []
+        self.failed_months: List[str] = []
+        self.checked_at: Optional[float] = None
+        self.failures = 0
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "ensured": self.partitions,
+            "failed_months": self.failed_months,
+            "checked_at": self.checked_at,
+            "failures": self.failures,
+        }
+
+
+partition_status = TicketPartitionStatus()
+
+
+async def ensure_ticket_partitions(
+    months_ahead: int = TICKET_PARTITION_MONTHS_AHEAD,
+) -> List[str]:
+    """确保当月和未来几个月的票据分区已存在，新票据不会落入默认分区"""
+    from .database import AsyncSessionLocal
+    from .db_service import DatabaseService, TicketPartitionError
+
+    today = datetime.now(timezone.utc).date()
+    try:
+        async with AsyncSessionLocal() as session:
+            names = await DatabaseService(session).create_ticket_partitions(
+                upcoming_months(today, months_ahead)
+            )
+    except TicketPartitionError as exc:
+        partition_status.partitions = exc.created
+        partition_status.failed_months = [m.isoformat() for m in exc.months]
+        partition_status.checked_at = time.time()
+        raise
+    partition_status.partitions = names
+    partition_status.failed_months = []
+    partition_status.checked_at = time.time()
+    return names
+
+
+async def run_ticket_partition_maintainer(
+    interval: float = TICKET_PARTITION_CHECK_SECONDS,
+) -> None:
+    """后台任务：启动后立即检查一次，之后定期预建未来月份的分区"""
+    while True:
+        try:
+            await ensure_ticket_partitions()
+        except Exception:
+            partition_status.failures += 1
+            logger.exception("creating ticket partitions failed")
+        await asyncio.sleep(interval)
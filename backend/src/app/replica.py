@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError
+
+from .database import pool_status, replica_engine
+
+logger = logging.getLogger(__name__)
+
+# 副本复制延迟超过该值（秒）时只读查询改走主库。
+# 需小于 /tickets/changes 的 CHANGES_OVERLAP（5 秒），增量同步才不会漏掉副本尚未回放的修改
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+# 检查副本延迟的间隔（秒）；连续 3 个间隔没有成功检查时视为不可用
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "1"))
+STALE_CHECKS = 3
+
+# 写入之后该客户端的只读查询留在主库的时长（秒）：副本延迟最多为 REPLICA_MAX_LAG_SECONDS
+# 加上一个检查间隔，超过后才会被判定为延迟过大
+REPLICA_STICKY_SECONDS = float(
+    os.getenv("REPLICA_STICKY_SECONDS", str(REPLICA_MAX_LAG_SECONDS + REPLICA_CHECK_SECONDS))
+)
+# 写入请求的响应带上该头（主库读取截止的 Unix 时间戳），客户端在之后的请求中原样带回
+PRIMARY_UNTIL_HEADER = "X-Read-Primary-Until"
+
+# 副本连接层面的故障：出现时标记副本不可用并改走主库重试
+REPLICA_ERRORS = (OperationalError, InterfaceError, TimeoutError, OSError)
+
+# WAL 已全部回放时延迟为 0；否则为最后一个回放事务距今的时间。
+# 主库空闲时 pg_last_xact_replay_timestamp() 不再前进，仅凭它会误判为延迟
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class ReplicaHealth:
+    """只读副本的复制延迟和可用状态"""
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at: Optional[float] = None
+        self.failures = 0
+        self.routed_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def usable(self) -> bool:
+        return (
+            self.healthy
+            and self.checked_at is not None
+            and time.monotonic() - self.checked_at <= self.check_interval * STALE_CHECKS
+        )
+
+    def record_lag(self, lag: float) -> None:
+        self.lag = lag
+        self.checked_at = time.monotonic()
+        self.healthy = lag <= self.max_lag
+
+    def mark_failed(self) -> None:
+        if self.healthy:
+            logger.warning("read replica unavailable, routing reads to primary")
+        self.healthy = False
+        self.failures += 1
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "usable": self.usable,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+            "failures": self.failures,
+            "routed_reads": self.routed_reads,
+            "fallbacks": self.fallbacks,
+        }
+
+
+replica_health = ReplicaHealth(REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_SECONDS)
+
+
+class ReadConsistency:
+    """单个请求的读己之写状态：客户端带来的主库读取截止时间，以及本请求是否提交过写入"""
+
+    def __init__(self, primary_until: float = 0.0):
+        self.primary_until = primary_until
+        self.wrote = False
+
+
+_read_consistency: ContextVar[Optional[ReadConsistency]] = ContextVar(
+    "read_consistency", default=None
+)
+
+
+def primary_required() -> bool:
+    """当前客户端最近提交过写入，只读查询应留在主库"""
+    state = _read_consistency.get()
+    return state is not None and state.primary_until > time.time()
+
+
+def record_write() -> None:
+    """记录本请求提交了写入，响应中下发新的主库读取截止时间"""
+    state = _read_consistency.get()
+    if state is not None:
+        state.wrote = True
+
+
+def _parse_primary_until(value: Optional[bytes]) -> float:
+    """解析客户端带回的截止时间；无效值忽略，过远的值截断到一个粘滞窗口内"""
+    try:
+        until = float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+    return min(until, time.time() + REPLICA_STICKY_SECONDS)
+
+
+class ReadYourWritesMiddleware:
+    """跨请求的读己之写（ASGI 中间件）
+
+    提交过写入的请求在响应头 X-Read-Primary-Until 中返回截止时间；客户端之后的请求带回该头，
+    截止之前 DatabaseService 的只读查询留在主库，写入后立即刷新不会从副本读到旧数据。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = PRIMARY_UNTIL_HEADER.lower().encode()
+        value = next((v for k, v in scope["headers"] if k == header), None)
+        state = ReadConsistency(_parse_primary_until(value))
+        token = _read_consistency.set(state)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start" and state.wrote:
+                until = f"{time.time() + REPLICA_STICKY_SECONDS:.3f}".encode()
+                message["headers"] = [*message.get("headers", []), (header, until)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _read_consistency.reset(token)
+
+
+async def check_replica_lag() -> None:
+    """查询副本的复制延迟并更新可用状态"""
+    if replica_engine is None:
+        return
+    try:
+        async with replica_engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                lag = float(await conn.scalar(LAG_QUERY))
+            else:
+                await conn.execute(text("SELECT 1"))
+                lag = 0.0
+    except REPLICA_ERRORS:
+        replica_health.mark_failed()
+        return
+    replica_health.record_lag(lag)
+
+
+async def run_replica_monitor(interval: float = REPLICA_CHECK_SECONDS) -> None:
+    """后台任务：定期检查副本延迟"""
+    while True:
+        await check_replica_lag()
+        await asyncio.sleep(interval)
+
+
+def replica_metrics() -> Optional[Dict[str, object]]:
+    if replica_engine is None:
+        return None
+    return {**replica_health.metrics(), "pool": pool_status(replica_engine)}
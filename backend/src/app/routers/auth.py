@@ -1,18 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas.auth import AuthResponse, LoginRequest, RegisterRequest, UserPublic
+from ..schemas.auth import (
+    AuthResponse,
+    LoginRequest,
+    RefreshRequest,
+    RegisterRequest,
+    UserPublic,
+)
 from ..security.dependencies import get_current_user
-from ..security.jwt import create_access_token
-from ..security.passwords import hash_password, verify_password
+from ..security.jwt import JWT_EXPIRES_MINUTES, create_user_token
+from ..security.email_filter import email_filter
+from ..security.throttle import throttle_login
+from ..security.passwords import (
+    PasswordHashingBusy,
+    hash_password_async,
+    verify_and_rehash_password_async,
+)
 from ..database import get_db
 from ..db_service import DatabaseService
+from ..security.refresh_tokens import (
+    format_refresh_token,
+    hash_refresh_secret,
+    new_refresh_secret,
+    parse_refresh_token,
+    revoked_refresh_tokens,
+)
 
 router = APIRouter()
 
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _auth_response(user, refresh_token: str) -> AuthResponse:
+    return AuthResponse(
+        token=create_user_token(user),
+        refresh_token=refresh_token,
+        expires_in=JWT_EXPIRES_MINUTES * 60,
+        user=UserPublic(
+            id=str(user.id),
+            email=user.email,
+            username=user.username,
+            role=user.role,
+            is_suspended=user.is_suspended,
+        ),
+    )
+
+
+async def _issue_session(db_service: DatabaseService, user) -> AuthResponse:
+    """签发短期访问令牌和新的刷新令牌"""
+    secret, token_hash, expires_at = new_refresh_secret()
+    stored = await db_service.create_refresh_token(user.id, token_hash, expires_at)
+    return _auth_response(user, format_refresh_token(stored.id, secret))
+
+
 @router.post("/login", response_model=AuthResponse)
-async def login(payload: LoginRequest, db_session: AsyncSession = Depends(get_db)):
+async def login(
+    payload: LoginRequest,
+    request: Request,
+    db_session: AsyncSession = Depends(get_db),
+):
+    # 先按 IP 和邮箱限流，超限请求不查库、不做密码校验
+    throttle_login(request, payload.email)
+
+    # 过滤器判定一定未注册的邮箱不查库
+    if email_filter.definitely_absent(payload.email):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+        )
+
     db_service = DatabaseService(db_session)
     existing = await db_service.get_user_by_email(payload.email)
     if not existing:
@@ -26,63 +88,102 @@ async def login(payload: LoginRequest, db_session: AsyncSession = Depends(get_db
             detail="您的账户已被停用，请联系管理员"
         )
 
-    if not verify_password(payload.password, existing.password_hash):
+    try:
+        password_ok, new_hash = await verify_and_rehash_password_async(
+            payload.password, existing.password_hash
+        )
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Wrong password"
         )
 
-    token = create_access_token(str(existing.id), {"role": existing.role})
-    return AuthResponse(
-        token=token,
-        user=UserPublic(
-            id=str(existing.id),
-            email=existing.email,
-            username=existing.username,
-            role=existing.role,
-            is_suspended=existing.is_suspended,
-        ),
-    )
+    if new_hash:
+        # 哈希成本已过时：用当前轮数重新哈希后保存
+        await db_service.update_password_hash(
+            existing.id, existing.password_hash, new_hash
+        )
+    return await _issue_session(db_service, existing)
 
 
 @router.post("/register", response_model=AuthResponse)
 async def register(payload: RegisterRequest, db_session: AsyncSession = Depends(get_db)):
+    # 验证角色
+    if payload.role not in ("employee", "employer"):
+        raise HTTPException(status_code=400, detail="Invalid role")
+
+    try:
+        password_hash = await hash_password_async(payload.password)
+    except PasswordHashingBusy:
+        raise _hashing_busy()
+
+    # 创建新用户：邮箱查重和插入在同一条语句中完成
     db_service = DatabaseService(db_session)
-    
-    # 检查用户是否已存在
-    existing = await db_service.get_user_by_email(payload.email)
-    if existing:
+    try:
+        user = await db_service.create_user(
+            email=payload.email,
+            username=payload.username,
+            role=payload.role,
+            password_hash=password_hash,
+        )
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="User already exists"
         )
 
-    # 验证角色
-    if payload.role not in ("employee", "employer"):
-        raise HTTPException(status_code=400, detail="Invalid role")
+    return await _issue_session(db_service, user)
 
-    # 创建新用户
-    user = await db_service.create_user(
-        email=payload.email,
-        username=payload.username,
-        role=payload.role,
-        password_hash=hash_password(payload.password),
-    )
 
-    token = create_access_token(str(user.id), {"role": user.role})
-    return AuthResponse(
-        token=token,
-        user=UserPublic(
-            id=str(user.id), 
-            email=user.email, 
-            username=user.username, 
-            role=user.role,
-            is_suspended=user.is_suspended,
-        ),
+@router.post("/refresh", response_model=AuthResponse)
+async def refresh(payload: RefreshRequest, db_session: AsyncSession = Depends(get_db)):
+    """用刷新令牌换取新的访问令牌；刷新令牌每次使用后轮换，暂停的用户无法续期"""
+    try:
+        token_id, secret = parse_refresh_token(payload.refresh_token)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
+    if token_id in revoked_refresh_tokens:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token revoked"
+        )
+
+    db_service = DatabaseService(db_session)
+    new_secret, new_hash, expires_at = new_refresh_secret()
+    user, new_token = await db_service.rotate_refresh_token(
+        token_id, hash_refresh_secret(secret), new_hash, expires_at
     )
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
+    if new_token is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="您的账户已被停用，请联系管理员"
+        )
+    return _auth_response(user, format_refresh_token(new_token.id, new_secret))
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(payload: RefreshRequest, db_session: AsyncSession = Depends(get_db)):
+    """登出：吊销请求体中的刷新令牌；不要求访问令牌有效，令牌无效或已吊销时同样返回 204"""
+    try:
+        token_id, secret = parse_refresh_token(payload.refresh_token)
+    except ValueError:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    if token_id not in revoked_refresh_tokens:
+        db_service = DatabaseService(db_session)
+        await db_service.revoke_refresh_token(token_id, hash_refresh_secret(secret))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.get("/check-user/{email}")
 async def check_user_exists(email: str, db_session: AsyncSession = Depends(get_db)):
     """检查用户是否存在"""
+    if email_filter.definitely_absent(email):
+        return {"exists": False}
     db_service = DatabaseService(db_session)
     existing = await db_service.get_user_by_email(email)
     return {"exists": existing is not None}
@@ -1,7 +1,7 @@
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..schemas.user import UserPublic
@@ -9,6 +9,7 @@ from ..security.dependencies import require_role
 from ..models import User as UserModel
 from ..database import get_db
 from ..db_service import DatabaseService
+from ..conditional import compute_etag, not_modified, set_validator_headers
 
 router = APIRouter()
 
@@ -25,10 +26,19 @@ def to_public(u: UserModel) -> UserPublic:
 
 @router.get("/", response_model=List[UserPublic])
 async def list_employees(
+    request: Request,
+    response: Response,
     _: UserModel = Depends(require_role("employer")),
     db_session: AsyncSession = Depends(get_db)
 ):
     db_service = DatabaseService(db_session)
+    # 员工列表未变化时直接返回 304
+    etag = compute_etag("employees", *await db_service.employees_version())
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_validator_headers(response, etag)
+
     users = await db_service.list_employees()
     return [to_public(u) for u in users]
 
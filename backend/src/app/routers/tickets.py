@@ -1,17 +1,54 @@
-from typing import List
+import csv
+import inspect
+import io
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas.ticket import TicketCreate, TicketPublic, TicketUpdate
+from ..schemas.ticket import (
+    TicketBulkAction,
+    TicketBulkResponse,
+    TicketBulkResult,
+    TicketChanges,
+    TicketCreate,
+    TicketFilters,
+    TicketImportError,
+    TicketImportResult,
+    TicketPage,
+    TicketPublic,
+    TicketSort,
+    TicketSummary,
+    TicketSummaryRow,
+    TicketUpdate,
+)
 from ..security.dependencies import get_current_user, require_role
 from ..models import Ticket as TicketModel, User as UserModel
-from ..database import get_db
+from ..database import get_db, get_session_factory
 from ..db_service import DatabaseService
+from ..conditional import compute_etag, not_modified, set_validator_headers
+from ..pagination import decode_cursor, encode_cursor
+from ..ticket_import import (
+    IMPORT_MAX_BYTES,
+    ImportTooLarge,
+    batched,
+    iter_text_lines,
+    parse_ticket_rows,
+)
 
 router = APIRouter()
 
+# 导入结果中最多返回的错误明细条数
+MAX_IMPORT_ERRORS = 1000
+
+# 增量同步时向前回看的时间窗口，覆盖在水位线之前开始、之后才提交的事务；客户端按 id 幂等合并
+CHANGES_OVERLAP = timedelta(seconds=5)
+
 
 def ticket_to_public(t: TicketModel) -> TicketPublic:
     return TicketPublic(
@@ -29,28 +66,113 @@ def ticket_to_public(t: TicketModel) -> TicketPublic:
     )
 
 
-@router.get("/", response_model=List[TicketPublic])
+def ticket_filters(**params) -> TicketFilters:
+    """票据筛选查询参数
+
+    直接使用 Depends(TicketFilters) 时，跨字段校验（如 spent_from 晚于 spent_to）失败会变成 500；
+    这里转换为与单个参数校验失败相同的 422。
+    """
+    try:
+        return TicketFilters(**params)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**error, "loc": ("query", *error["loc"])} for error in exc.errors(include_url=False)]
+        )
+
+
+# FastAPI 按签名解析查询参数，与 Depends(TicketFilters) 相同
+ticket_filters.__signature__ = inspect.signature(TicketFilters)
+
+
+def filters_to_kwargs(filters: TicketFilters) -> dict:
+    """将查询参数转换为 DatabaseService 的筛选参数"""
+    return {
+        "status": filters.status,
+        "owner_id": filters.user_id,
+        "spent_from": filters.spent_from,
+        "spent_to": filters.spent_to,
+        "min_amount": filters.min_amount,
+        "max_amount": filters.max_amount,
+    }
+
+
+@router.get("/", response_model=TicketPage)
 async def list_tickets(
+    request: Request,
+    response: Response,
+    filters: TicketFilters = Depends(ticket_filters),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: TicketSort = "-created_at",
     current_user: UserModel = Depends(get_current_user),
     db_session: AsyncSession = Depends(get_db)
 ):
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     db_service = DatabaseService(db_session)
-    tickets = await db_service.list_tickets()
-    
-    if current_user.role == "employee":
-        visible = [
-            t for t in tickets if t.user_id == current_user.id and not t.is_soft_deleted
-        ]
-    else:  # employer
-        # 过滤：不显示已软删或所属用户被停用的票据
-        visible = []
-        for t in tickets:
-            if t.is_soft_deleted:
-                continue
-            owner = await db_service.get_user_by_id(t.user_id)
-            if owner and not owner.is_suspended:
-                visible.append(t)
-    return [ticket_to_public(t) for t in visible]
+    filter_kwargs = filters_to_kwargs(filters)
+
+    # 第一页：数据未变化时直接返回 304，不加载也不序列化票据。
+    # 版本号是写入时递增的计数器，读取只是一次主键查询；后续页（带 cursor）不做校验
+    synced_at = None
+    if after is None:
+        version = await db_service.visible_tickets_version(
+            current_user.id, current_user.role
+        )
+        etag = compute_etag(
+            current_user.id, current_user.role, version.version, request.url.query
+        )
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        set_validator_headers(response, etag)
+        synced_at = version.taken_at
+
+    # 员工只看自己的未删除票据；雇主不显示已软删或所属用户被停用的票据
+    # 多取一条用于判断是否还有下一页
+    visible = await db_service.list_visible_tickets(
+        current_user.id,
+        current_user.role,
+        limit=limit + 1,
+        after=after,
+        sort=sort,
+        **filter_kwargs,
+    )
+    next_cursor = None
+    if len(visible) > limit:
+        visible = visible[:limit]
+        last = visible[-1]
+        next_cursor = encode_cursor(sort, getattr(last, sort.lstrip("-")), last.id)
+    return TicketPage(
+        items=[ticket_to_public(t) for t in visible],
+        next_cursor=next_cursor,
+        synced_at=synced_at,
+    )
+
+
+@router.get("/changes", response_model=TicketChanges)
+async def list_ticket_changes(
+    since: datetime,
+    current_user: UserModel = Depends(get_current_user),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """增量同步：返回水位线之后变化的票据和需要移除的票据 id，以及新的水位线"""
+    db_service = DatabaseService(db_session)
+    # 水位线取自查询前的数据库时间，查询期间提交的修改由下一次请求的 CHANGES_OVERLAP 覆盖
+    next_since = await db_service.database_now()
+    changed, removed = await db_service.list_ticket_changes(
+        current_user.id, current_user.role, since - CHANGES_OVERLAP
+    )
+    return TicketChanges(
+        changed=[ticket_to_public(t) for t in changed],
+        removed=[str(ticket_id) for ticket_id in removed],
+        next_since=next_since,
+    )
 
 
 @router.post("/", response_model=TicketPublic)
@@ -71,6 +193,192 @@ async def create_ticket(
     return ticket_to_public(t)
 
 
+async def _export_chunks(
+    session_factory,
+    user_id: UUID,
+    role: str,
+    export_format: str,
+    sort: str,
+    filters: dict,
+):
+    """逐批生成导出内容；每批票据编码为一个数据块"""
+    # 生成器自己打开并关闭会话：流式响应在路由函数返回后才开始发送，不能依赖 get_db 的会话生命周期
+    async with session_factory() as session:
+        db_service = DatabaseService(session)
+        fields = list(TicketPublic.model_fields)
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            yield buffer.getvalue()
+
+        async for batch in db_service.stream_visible_tickets(
+            user_id, role, sort=sort, **filters
+        ):
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for t in batch:
+                    row = ticket_to_public(t).model_dump(mode="json")
+                    writer.writerow(row[f] for f in fields)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    ticket_to_public(t).model_dump_json() + "\n" for t in batch
+                )
+
+
+@router.get("/export")
+async def export_tickets(
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    sort: TicketSort = "-created_at",
+    filters: TicketFilters = Depends(ticket_filters),
+    current_user: UserModel = Depends(get_current_user),
+    session_factory=Depends(get_session_factory),
+):
+    """流式导出当前用户可见的票据（可见性规则与列表接口一致），配置了只读副本时从副本读取"""
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"tickets.{export_format}"
+    return StreamingResponse(
+        _export_chunks(
+            session_factory,
+            current_user.id,
+            current_user.role,
+            export_format,
+            sort,
+            filters_to_kwargs(filters),
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _bulk_transition(
+    payload: TicketBulkAction, target_status: str, db_session: AsyncSession
+) -> TicketBulkResponse:
+    db_service = DatabaseService(db_session)
+    # 去重并保持请求中的顺序
+    ticket_ids = list(dict.fromkeys(payload.ticket_ids))
+    outcomes = await db_service.bulk_transition_tickets(
+        ticket_ids, status=target_status
+    )
+    return TicketBulkResponse(
+        results=[
+            TicketBulkResult(
+                id=str(ticket_id),
+                outcome=result.outcome,
+                status=result.ticket.status if result.ticket else None,
+            )
+            for ticket_id, result in outcomes.items()
+        ]
+    )
+
+
+@router.post("/bulk/approve", response_model=TicketBulkResponse)
+async def bulk_approve_tickets(
+    payload: TicketBulkAction,
+    _: UserModel = Depends(require_role("employer")),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """批量批准待处理票据，返回每个票据的处理结果"""
+    return await _bulk_transition(payload, "approved", db_session)
+
+
+@router.post("/bulk/deny", response_model=TicketBulkResponse)
+async def bulk_deny_tickets(
+    payload: TicketBulkAction,
+    _: UserModel = Depends(require_role("employer")),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """批量拒绝待处理票据，返回每个票据的处理结果"""
+    return await _bulk_transition(payload, "denied", db_session)
+
+
+@router.get("/summary", response_model=TicketSummary)
+async def summarize_tickets(
+    group_by: List[Literal["user_id", "status", "month"]] = Query(default=[]),
+    filters: TicketFilters = Depends(ticket_filters),
+    current_user: UserModel = Depends(get_current_user),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """按员工、状态、月份（以及币种）汇总当前用户可见票据的数量和金额"""
+    db_service = DatabaseService(db_session)
+    rows = await db_service.summarize_visible_tickets(
+        current_user.id,
+        current_user.role,
+        group_by=group_by,
+        **filters_to_kwargs(filters),
+    )
+    return TicketSummary(
+        groups=[
+            TicketSummaryRow(
+                **{
+                    **row,
+                    "user_id": str(row["user_id"]) if "user_id" in row else None,
+                }
+            )
+            for row in rows
+        ]
+    )
+
+
+@router.post(
+    "/import",
+    response_model=TicketImportResult,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+            "required": True,
+        }
+    },
+)
+async def import_tickets(
+    request: Request,
+    import_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    user: UserModel = Depends(require_role("employee")),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """批量导入票据：请求体为 CSV（带表头）或 NDJSON
+
+    请求体按块流式读取和解析，内存占用与文件大小无关；超过 IMPORT_MAX_BYTES 时返回 413。
+    每行按 TicketCreate 校验，通过的行分批写入并在同一事务中提交，未通过的行在错误报告中返回。
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    errors = []
+    rejected = 0
+
+    async def valid_batches():
+        nonlocal rejected
+        lines = iter_text_lines(request.stream())
+        try:
+            async for batch in batched(parse_ticket_rows(lines, import_format)):
+                rows = []
+                for line_no, ticket, error in batch:
+                    if ticket is not None:
+                        rows.append(ticket.model_dump())
+                        continue
+                    rejected += 1
+                    if len(errors) < MAX_IMPORT_ERRORS:
+                        errors.append(TicketImportError(line=line_no, error=error))
+                if rows:
+                    yield rows
+        # 已写入的批次未提交，随会话关闭回滚
+        except ImportTooLarge:
+            raise HTTPException(status_code=413, detail="File too large")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+
+    db_service = DatabaseService(db_session)
+    imported = await db_service.create_tickets_bulk(user.id, valid_batches())
+    return TicketImportResult(imported=imported, rejected=rejected, errors=errors)
+
+
 @router.get("/{ticket_id}", response_model=TicketPublic)
 async def get_ticket(
     ticket_id: str, 
@@ -97,23 +405,22 @@ async def update_ticket(
     db_session: AsyncSession = Depends(get_db)
 ):
     db_service = DatabaseService(db_session)
-    t = await db_service.get_ticket(UUID(ticket_id))
-    if not t or t.is_soft_deleted or t.user_id != user.id:
-        raise HTTPException(status_code=404, detail="Not found")
-    if t.status != "pending":
-        raise HTTPException(
-            status_code=409, detail="Only pending ticket can be updated"
-        )
-    updated = await db_service.update_ticket(
+    result = await db_service.transition_ticket(
         UUID(ticket_id),
+        owner_id=user.id,
         spent_at=payload.spent_at,
         amount=payload.amount,
         currency=payload.currency,
         description=payload.description,
         link=payload.link,
     )
-    assert updated
-    return ticket_to_public(updated)
+    if result.outcome == "not_found":
+        raise HTTPException(status_code=404, detail="Not found")
+    if result.outcome == "conflict":
+        raise HTTPException(
+            status_code=409, detail="Only pending ticket can be updated"
+        )
+    return ticket_to_public(result.ticket)
 
 
 @router.delete("/{ticket_id}", response_model=TicketPublic)
@@ -123,16 +430,16 @@ async def delete_ticket(
     db_session: AsyncSession = Depends(get_db)
 ):
     db_service = DatabaseService(db_session)
-    t = await db_service.get_ticket(UUID(ticket_id))
-    if not t or t.is_soft_deleted or t.user_id != user.id:
+    result = await db_service.transition_ticket(
+        UUID(ticket_id), owner_id=user.id, is_soft_deleted=True
+    )
+    if result.outcome == "not_found":
         raise HTTPException(status_code=404, detail="Not found")
-    if t.status != "pending":
+    if result.outcome == "conflict":
         raise HTTPException(
             status_code=409, detail="Only pending ticket can be deleted"
         )
-    deleted = await db_service.soft_delete_ticket(UUID(ticket_id))
-    assert deleted
-    return ticket_to_public(deleted)
+    return ticket_to_public(result.ticket)
 
 
 @router.post("/{ticket_id}/approve", response_model=TicketPublic)
@@ -142,16 +449,13 @@ async def approve_ticket(
     db_session: AsyncSession = Depends(get_db)
 ):
     db_service = DatabaseService(db_session)
-    t = await db_service.get_ticket(UUID(ticket_id))
-    if not t or t.is_soft_deleted:
+    result = await db_service.transition_ticket(UUID(ticket_id), status="approved")
+    if result.outcome == "not_found":
         raise HTTPException(status_code=404, detail="Not found")
-    if t.status == "approved":
-        return ticket_to_public(t)
-    if t.status == "denied":
+    if result.outcome == "conflict" and result.ticket.status == "denied":
         raise HTTPException(status_code=409, detail="Already denied")
-    updated = await db_service.approve_ticket(UUID(ticket_id))
-    assert updated
-    return ticket_to_public(updated)
+    # 已批准的票据重复批准时直接返回当前状态
+    return ticket_to_public(result.ticket)
 
 
 @router.post("/{ticket_id}/deny", response_model=TicketPublic)
@@ -161,13 +465,10 @@ async def deny_ticket(
     db_session: AsyncSession = Depends(get_db)
 ):
     db_service = DatabaseService(db_session)
-    t = await db_service.get_ticket(UUID(ticket_id))
-    if not t or t.is_soft_deleted:
+    result = await db_service.transition_ticket(UUID(ticket_id), status="denied")
+    if result.outcome == "not_found":
         raise HTTPException(status_code=404, detail="Not found")
-    if t.status == "denied":
-        return ticket_to_public(t)
-    if t.status == "approved":
+    if result.outcome == "conflict" and result.ticket.status == "approved":
         raise HTTPException(status_code=409, detail="Already approved")
-    updated = await db_service.deny_ticket(UUID(ticket_id))
-    assert updated
-    return ticket_to_public(updated)
+    # 已拒绝的票据重复拒绝时直接返回当前状态
+    return ticket_to_public(result.ticket)
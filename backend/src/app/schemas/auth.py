@@ -21,6 +21,12 @@ class UserPublic(BaseModel):
     is_suspended: bool
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class AuthResponse(BaseModel):
     token: str
+    refresh_token: str
+    expires_in: int = Field(description="访问令牌有效期（秒）")
     user: UserPublic
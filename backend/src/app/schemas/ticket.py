@@ -1,7 +1,8 @@
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class TicketCreate(BaseModel):
@@ -32,3 +33,82 @@ class TicketPublic(BaseModel):
     is_soft_deleted: bool
     created_at: datetime
     updated_at: datetime
+
+
+TicketSort = Literal[
+    "created_at", "-created_at", "spent_at", "-spent_at", "amount", "-amount"
+]
+
+
+class TicketFilters(BaseModel):
+    status: Optional[Literal["pending", "approved", "denied"]] = None
+    user_id: Optional[UUID] = None
+    spent_from: Optional[datetime] = None
+    spent_to: Optional[datetime] = None
+    min_amount: Optional[float] = Field(default=None, ge=0)
+    max_amount: Optional[float] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def check_spent_range(self) -> "TicketFilters":
+        if self.spent_from is None or self.spent_to is None:
+            return self
+        # 未带时区的时间按 UTC 比较，避免与带时区的时间比较时抛出 TypeError
+        spent_from, spent_to = (
+            value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+            for value in (self.spent_from, self.spent_to)
+        )
+        if spent_from > spent_to:
+            raise ValueError("spent_from must not be after spent_to")
+        return self
+
+
+class TicketPage(BaseModel):
+    items: List[TicketPublic]
+    next_cursor: Optional[str] = None
+    synced_at: Optional[datetime] = Field(
+        default=None, description="增量同步水位线（仅第一页返回），可作为 /tickets/changes 的 since"
+    )
+
+
+class TicketChanges(BaseModel):
+    changed: List[TicketPublic]
+    removed: List[str]
+    next_since: datetime
+
+
+class TicketBulkAction(BaseModel):
+    ticket_ids: List[UUID] = Field(min_length=1, max_length=1000)
+
+
+class TicketBulkResult(BaseModel):
+    id: str
+    outcome: str = Field(description="updated|not_found|conflict")
+    status: Optional[str] = None
+
+
+class TicketBulkResponse(BaseModel):
+    results: List[TicketBulkResult]
+
+
+class TicketImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TicketImportResult(BaseModel):
+    imported: int
+    rejected: int
+    errors: List[TicketImportError]
+
+
+class TicketSummaryRow(BaseModel):
+    user_id: Optional[str] = None
+    status: Optional[str] = None
+    month: Optional[str] = Field(default=None, description="YYYY-MM")
+    currency: str
+    ticket_count: int
+    total_amount: float
+
+
+class TicketSummary(BaseModel):
+    groups: List[TicketSummaryRow]
@@ -9,6 +9,32 @@ from ..security.jwt import decode_access_token
 from ..models import User as UserModel
 from ..database import get_db
 from ..db_service import DatabaseService
+from .revocation import auth_epochs
+
+# 自包含令牌中携带的用户声明
+SESSION_CLAIMS = ("role", "username", "email", "epoch")
+
+
+def _user_from_claims(payload: dict) -> UserModel:
+    """根据自包含令牌中的声明构造用户对象，并按吊销表校验认证纪元"""
+    user_id = UUID(payload["sub"])
+    epoch, suspended = auth_epochs.get(user_id)
+    if suspended:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="User suspended"
+        )
+    if payload["epoch"] < epoch:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked"
+        )
+    return UserModel(
+        id=user_id,
+        email=payload["email"],
+        username=payload["username"],
+        role=payload["role"],
+        is_suspended=False,
+        auth_epoch=payload["epoch"],
+    )
 
 bearer_scheme = HTTPBearer(auto_error=True)
 
@@ -30,6 +56,10 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
 
+    if all(claim in payload for claim in SESSION_CLAIMS):
+        return _user_from_claims(payload)
+
+    # 不含用户声明的旧令牌（在 JWT_EXPIRES_MINUTES 内全部过期）：从数据库加载用户，不再单独缓存
     db_service = DatabaseService(db_session)
     user = await db_service.get_user_by_id(UUID(user_id))
     if not user:
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 已注册邮箱的布隆过滤器：目标误判率、内存上限（字节）
+EMAIL_FILTER_FALSE_POSITIVE_RATE = float(
+    os.getenv("EMAIL_FILTER_FALSE_POSITIVE_RATE", "0.01")
+)
+EMAIL_FILTER_MAX_BYTES = int(os.getenv("EMAIL_FILTER_MAX_BYTES", str(4 * 1024 * 1024)))
+# 增量同步新注册邮箱的间隔，以及按当前用户数重新分配大小的完整重建间隔（秒）
+EMAIL_FILTER_REFRESH_SECONDS = float(os.getenv("EMAIL_FILTER_REFRESH_SECONDS", "5"))
+EMAIL_FILTER_REBUILD_SECONDS = float(os.getenv("EMAIL_FILTER_REBUILD_SECONDS", "3600"))
+# 过滤器只在最近一次同步完成后的这段时间内（秒）回答“一定不存在”，超过后查库；默认为 3 个同步间隔，
+# 正常运行时不会在两次同步之间过期，只有同步连续失败时才改为查库。
+# 其他 worker 注册的邮箱要等下一次同步才加入本进程的过滤器，被误报为不存在的时间不超过一个同步间隔
+# （加一次同步的耗时），同步中断时不超过该值；设为 0 则不再跳过查库
+EMAIL_FILTER_MAX_STALENESS_SECONDS = float(
+    os.getenv(
+        "EMAIL_FILTER_MAX_STALENESS_SECONDS", str(EMAIL_FILTER_REFRESH_SECONDS * 3)
+    )
+)
+# 容量预留：按当前用户数的倍数分配（不少于 MIN_CAPACITY），给两次重建之间的新注册留出空间
+CAPACITY_HEADROOM = 2
+MIN_CAPACITY = 10000
+# 增量同步时向前回看的时间窗口，覆盖水位线之前开始、之后才提交的注册
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """位数组实现的布隆过滤器，使用双重哈希生成 k 个位置"""
+
+    def __init__(self, capacity: int, false_positive_rate: float, max_bytes: int):
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.size = max(8, min(bits, max_bytes * 8))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value: str) -> None:
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value)
+        )
+
+    def estimated_false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class EmailFilter:
+    """已注册邮箱的否定查询过滤器
+
+    加载完成前不做判断；加载后“一定不存在”的邮箱可以不查库直接回答，可能存在的仍需查库。
+    每个 worker 各有一份过滤器，其他 worker 的注册靠定期同步补入，因此距上次同步完成超过
+    max_staleness 秒（同步中断）时同样不做判断，避免长时间把其他 worker 刚注册的邮箱报告为不存在。
+    """
+
+    def __init__(
+        self,
+        false_positive_rate: float,
+        max_bytes: int,
+        max_staleness: float = EMAIL_FILTER_MAX_STALENESS_SECONDS,
+    ):
+        self.false_positive_rate = false_positive_rate
+        self.max_bytes = max_bytes
+        self.max_staleness = max_staleness
+        self._filter: Optional[BloomFilter] = None
+        self.watermark: Optional[datetime] = None
+        self.skipped_lookups = 0
+        self.passed_lookups = 0
+        self.stale_lookups = 0
+        self.rebuilt_at: Optional[float] = None
+        # 最近一次成功同步完成的时间（单调时钟）
+        self.synced_at: Optional[float] = None
+        # 重建期间本进程新注册的邮箱，安装新过滤器时补入
+        self._added_during_rebuild: Optional[List[str]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    @property
+    def fresh(self) -> bool:
+        return (
+            self.synced_at is not None
+            and time.monotonic() - self.synced_at <= self.max_staleness
+        )
+
+    def definitely_absent(self, email: str) -> bool:
+        if self._filter is None:
+            return False
+        if not self.fresh:
+            self.stale_lookups += 1
+            return False
+        if email in self._filter:
+            self.passed_lookups += 1
+            return False
+        self.skipped_lookups += 1
+        return True
+
+    def add(self, email: str) -> None:
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(email)
+        if self._filter is not None and email not in self._filter:
+            self._filter.add(email)
+
+    def begin_rebuild(self, user_count: int) -> BloomFilter:
+        self._added_during_rebuild = []
+        capacity = max(user_count * CAPACITY_HEADROOM, MIN_CAPACITY)
+        return BloomFilter(capacity, self.false_positive_rate, self.max_bytes)
+
+    def install(
+        self,
+        bloom: BloomFilter,
+        watermark: Optional[datetime],
+        synced_at: Optional[float] = None,
+    ) -> None:
+        for email in self._added_during_rebuild or ():
+            if email not in bloom:
+                bloom.add(email)
+        self._added_during_rebuild = None
+        self._filter = bloom
+        self.rebuilt_at = time.time()
+        self.mark_synced(watermark, synced_at)
+
+    def mark_synced(
+        self, watermark: Optional[datetime], synced_at: Optional[float] = None
+    ) -> None:
+        self.watermark = watermark or self.watermark
+        self.synced_at = time.monotonic() if synced_at is None else synced_at
+
+    def abort_rebuild(self) -> None:
+        self._added_during_rebuild = None
+
+    def metrics(self) -> Dict[str, object]:
+        bloom = self._filter
+        return {
+            "ready": bloom is not None,
+            "bytes": len(bloom._bits) if bloom else 0,
+            "hash_count": bloom.hash_count if bloom else 0,
+            "emails": bloom.count if bloom else 0,
+            "estimated_false_positive_rate": (
+                bloom.estimated_false_positive_rate() if bloom else None
+            ),
+            "skipped_lookups": self.skipped_lookups,
+            "passed_lookups": self.passed_lookups,
+            "stale_lookups": self.stale_lookups,
+            "fresh": self.fresh,
+            "rebuilt_at": self.rebuilt_at,
+        }
+
+
+email_filter = EmailFilter(EMAIL_FILTER_FALSE_POSITIVE_RATE, EMAIL_FILTER_MAX_BYTES)
+
+
+async def rebuild_email_filter() -> None:
+    """从数据库完整重建过滤器，并按当前用户数重新分配大小"""
+    from ..database import AsyncSessionLocal
+    from ..db_service import DatabaseService
+
+    try:
+        async with AsyncSessionLocal() as session:
+            db_service = DatabaseService(session)
+            count, watermark = await db_service.user_emails_version()
+            bloom = email_filter.begin_rebuild(count)
+            async for email in db_service.stream_user_emails():
+                bloom.add(email)
+    except Exception:
+        email_filter.abort_rebuild()
+        raise
+    email_filter.install(bloom, watermark)
+
+
+async def refresh_email_filter() -> None:
+    """把水位线之后注册的邮箱加入过滤器（包括其他 worker 注册的）"""
+    from ..database import AsyncSessionLocal
+    from ..db_service import DatabaseService
+
+    if not email_filter.ready:
+        return await rebuild_email_filter()
+    since = email_filter.watermark
+    async with AsyncSessionLocal() as session:
+        db_service = DatabaseService(session)
+        # 只取最新注册时间（created_at 索引上的一次查找），不做 count(*)
+        watermark = await db_service.latest_user_created_at()
+        if since is not None:
+            since -= REFRESH_OVERLAP
+        async for email in db_service.stream_user_emails(created_after=since):
+            email_filter.add(email)
+    email_filter.mark_synced(watermark)
+
+
+async def run_email_filter_refresher(
+    refresh_interval: float = EMAIL_FILTER_REFRESH_SECONDS,
+    rebuild_interval: float = EMAIL_FILTER_REBUILD_SECONDS,
+) -> None:
+    """后台任务：定期增量同步，并按更长的间隔完整重建"""
+    last_rebuild = time.monotonic()
+    while True:
+        await asyncio.sleep(refresh_interval)
+        try:
+            if time.monotonic() - last_rebuild >= rebuild_interval:
+                await rebuild_email_filter()
+                last_rebuild = time.monotonic()
+            else:
+                await refresh_email_filter()
+        except Exception:
+            logger.exception("refreshing email filter failed")
@@ -1,11 +1,65 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 from jose import jwt
 
 JWT_SECRET = "dev-secret-change-me"
 JWT_ALG = "HS256"
-JWT_EXPIRES_MINUTES = 60 * 24
+# 访问令牌有效期（分钟），过期后通过 /auth/refresh 续期
+JWT_EXPIRES_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "15"))
+# 已验证令牌缓存的最大条目数，0 表示关闭
+JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+
+
+class VerifiedTokenCache:
+    """已通过签名校验的令牌缓存，按令牌的 SHA-256 摘要索引，条目在令牌 exp 时失效"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Dict[str, Any] | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        # 没有 exp 的令牌无法判断何时失效，不缓存
+        if self.max_entries <= 0 or "exp" not in claims:
+            return
+        key = self._key(token)
+        self._entries[key] = (float(claims["exp"]), dict(claims))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = VerifiedTokenCache(JWT_CACHE_MAX_ENTRIES)
 
 
 def create_access_token(subject: str, claims: Dict[str, Any] | None = None) -> str:
@@ -17,5 +71,22 @@ def create_access_token(subject: str, claims: Dict[str, Any] | None = None) -> s
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALG)
 
 
+def create_user_token(user: Any) -> str:
+    """签发自包含的会话令牌：携带用户名、邮箱、角色和认证纪元，认证时无需查询用户表"""
+    return create_access_token(
+        str(user.id),
+        {
+            "role": user.role,
+            "username": user.username,
+            "email": user.email,
+            "epoch": user.auth_epoch,
+        },
+    )
+
+
 def decode_access_token(token: str) -> Dict[str, Any]:
-    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+        token_cache.put(token, claims)
+    return claims
@@ -1,8 +1,41 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
 from passlib.context import CryptContext
+from passlib.hash import pbkdf2_sha256
+
+logger = logging.getLogger(__name__)
 
 # 使用更兼容的密码哈希方案
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
+# 密码哈希成本：worker 使用 PASSWORD_HASH_ROUNDS 指定的轮数，不在各自启动时测速。
+# 部署时执行一次 `python -m app.security.passwords calibrate`，按目标校验耗时得出轮数（Docker 镜像在启动
+# uvicorn 之前自动执行并导出该变量）；未设置时使用 passlib 的默认轮数
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS") or "0")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "50"))
+# 校准轮数不低于 passlib 的默认值
+MIN_HASH_ROUNDS = pbkdf2_sha256.default_rounds
+# 存量哈希的轮数低于当前轮数的该比例时才在登录时重新哈希，避免每次校准的抖动引起反复重写
+REHASH_TOLERANCE = 0.8
+
+# 哈希计算池配置：thread（hashlib 计算时释放 GIL，可多核并行）或 process
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# 排队加执行中的任务上限，超出时直接拒绝，避免登录高峰把请求无限堆积
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 16)
+)
+
+
+class PasswordHashingBusy(RuntimeError):
+    """哈希计算池已满"""
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -10,3 +43,178 @@ def hash_password(password: str) -> str:
 
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
+
+
+def verify_and_rehash_password(
+    password: str, hashed: str
+) -> Tuple[bool, Optional[str]]:
+    """校验密码；校验通过且哈希成本已过时（passlib needs_update）时返回新哈希"""
+    if not pwd_context.verify(password, hashed):
+        return False, None
+    if pwd_context.needs_update(hashed):
+        return True, pwd_context.hash(password)
+    return True, None
+
+
+def calibrate_rounds(
+    target_ms: float = PASSWORD_HASH_TARGET_MS, samples: int = 3
+) -> int:
+    """在当前机器上测量 pbkdf2 耗时，返回单次校验约为 target_ms 毫秒的轮数"""
+    probe_rounds = MIN_HASH_ROUNDS
+    probe = pbkdf2_sha256.using(rounds=probe_rounds)
+    hashed = probe.hash("calibration")
+    elapsed = min(_timed(probe.verify, "calibration", hashed) for _ in range(samples))
+    rounds = int(probe_rounds * target_ms / 1000 / elapsed)
+    # 取整到千位，减少不同 worker 之间的差异
+    return max(MIN_HASH_ROUNDS, rounds // 1000 * 1000)
+
+
+def _timed(func: Callable, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def configure_password_hashing(rounds: int) -> None:
+    """设置新哈希使用的轮数，以及触发登录时重新哈希的最低轮数"""
+    pwd_context.update(
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=int(rounds * REHASH_TOLERANCE),
+    )
+
+
+def current_rounds() -> int:
+    return pwd_context.to_dict().get(
+        "pbkdf2_sha256__default_rounds", pbkdf2_sha256.default_rounds
+    )
+
+
+class _HashingPool:
+    """有界的密码哈希计算池，在事件循环之外执行哈希和校验，并记录队列深度"""
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # 子进程有自己的 pwd_context，启动时同步当前轮数
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=configure_password_hashing,
+                    initargs=(current_rounds(),),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def run(self, func: Callable, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashingBusy("password hashing pool is full")
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+        except asyncio.CancelledError:
+            # 请求被取消（如客户端断开）；已提交的计算仍会在池中执行完
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def metrics(self) -> Dict[str, int | str]:
+        return {
+            "executor": self.kind,
+            "rounds": current_rounds(),
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool = _HashingPool(
+    PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """在哈希计算池中计算密码哈希，不阻塞事件循环"""
+    return await _pool.run(hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """在哈希计算池中校验密码，不阻塞事件循环"""
+    return await _pool.run(verify_password, password, hashed)
+
+
+async def verify_and_rehash_password_async(
+    password: str, hashed: str
+) -> Tuple[bool, Optional[str]]:
+    """在哈希计算池中校验密码，并在成本过时时一并计算新哈希"""
+    return await _pool.run(verify_and_rehash_password, password, hashed)
+
+
+def setup_password_hashing() -> int:
+    """启动时设置哈希轮数：所有 worker 读取同一个 PASSWORD_HASH_ROUNDS，不各自校准"""
+    rounds = PASSWORD_HASH_ROUNDS
+    if not rounds:
+        rounds = MIN_HASH_ROUNDS
+        logger.warning(
+            "PASSWORD_HASH_ROUNDS is not set, using %d rounds; "
+            "run `python -m app.security.passwords calibrate` once per deployment",
+            rounds,
+        )
+    configure_password_hashing(rounds)
+    return rounds
+
+
+def hashing_metrics() -> Dict[str, int | str]:
+    """哈希计算池的队列深度和计数"""
+    return _pool.metrics()
+
+
+def shutdown_hashing_pool() -> None:
+    _pool.shutdown()
+
+
+def main(argv=None) -> int:
+    """校准（calibrate）：在部署的目标机器上执行一次，输出的轮数作为 PASSWORD_HASH_ROUNDS 提供给所有 worker"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv != ["calibrate"]:
+        print("usage: python -m app.security.passwords calibrate", file=sys.stderr)
+        return 2
+    print(calibrate_rounds())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
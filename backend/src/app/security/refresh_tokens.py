@@ -0,0 +1,101 @@
+import hashlib
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Tuple
+from uuid import UUID
+
+# 刷新令牌有效期（天）
+REFRESH_TOKEN_EXPIRES_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRES_DAYS", "14"))
+# 吊销集合清理已过期令牌的最短间隔（秒）：添加时距上次清理超过该值才遍历一次
+REVOKED_SWEEP_SECONDS = 60
+
+
+def hash_refresh_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def new_refresh_secret() -> Tuple[str, str, datetime]:
+    """生成刷新令牌密文，返回 (密文, 摘要, 过期时间)"""
+    secret = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRES_DAYS)
+    return secret, hash_refresh_secret(secret), expires_at
+
+
+def format_refresh_token(token_id: UUID, secret: str) -> str:
+    """刷新令牌格式为 `<id>.<密文>`，id 用于定位记录，密文只以摘要形式落库"""
+    return f"{token_id}.{secret}"
+
+
+def parse_refresh_token(token: str) -> Tuple[UUID, str]:
+    """解析刷新令牌；格式错误时抛出 ValueError"""
+    token_id, sep, secret = token.partition(".")
+    if not sep or not secret:
+        raise ValueError("invalid_refresh_token")
+    return UUID(token_id), secret
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 取回的时间不带时区，按 UTC 处理
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class RevokedTokenSet:
+    """已吊销且尚未过期的刷新令牌（id → 过期时间），命中时无需查库即可拒绝
+
+    令牌过期后本身已无法使用，添加时按间隔清理过期条目，集合大小只随有效期内的吊销数量变化。
+    """
+
+    def __init__(self, sweep_interval: float = REVOKED_SWEEP_SECONDS):
+        self._expires: Dict[UUID, datetime] = {}
+        self.sweep_interval = sweep_interval
+        self._swept_at = time.monotonic()
+        self.rejections = 0
+
+    def __contains__(self, token_id: UUID) -> bool:
+        expires_at = self._expires.get(token_id)
+        if expires_at is not None and expires_at > datetime.now(timezone.utc):
+            self.rejections += 1
+            return True
+        return False
+
+    def add(self, tokens: Iterable[Tuple[UUID, datetime]]) -> None:
+        self._expires.update(
+            (token_id, _as_utc(expires_at)) for token_id, expires_at in tokens
+        )
+        if time.monotonic() - self._swept_at >= self.sweep_interval:
+            self.sweep()
+
+    def replace(self, tokens: Iterable[Tuple[UUID, datetime]]) -> None:
+        self._expires = {
+            token_id: _as_utc(expires_at) for token_id, expires_at in tokens
+        }
+        self._swept_at = time.monotonic()
+
+    def sweep(self) -> None:
+        """删除已过期的条目"""
+        now = datetime.now(timezone.utc)
+        self._expires = {
+            token_id: expires_at
+            for token_id, expires_at in self._expires.items()
+            if expires_at > now
+        }
+        self._swept_at = time.monotonic()
+
+    def metrics(self) -> Dict[str, int]:
+        return {"size": len(self._expires), "rejections": self.rejections}
+
+
+revoked_refresh_tokens = RevokedTokenSet()
+
+
+async def load_revoked_refresh_tokens() -> None:
+    """启动时从数据库重建已吊销刷新令牌集合"""
+    from ..database import AsyncSessionLocal
+    from ..db_service import DatabaseService
+
+    async with AsyncSessionLocal() as session:
+        revoked_refresh_tokens.replace(
+            await DatabaseService(session).list_revoked_refresh_tokens()
+        )
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from .jwt import JWT_EXPIRES_MINUTES
+
+logger = logging.getLogger(__name__)
+
+# 按 users.updated_at 水位线增量同步吊销表的间隔（秒），多 worker 部署时其他进程的暂停操作在此间隔内生效
+AUTH_EPOCH_REFRESH_SECONDS = float(os.getenv("AUTH_EPOCH_REFRESH_SECONDS", "5"))
+# 完整重建吊销表的间隔（秒），丢弃旧令牌均已过期的已激活用户
+AUTH_EPOCH_REBUILD_SECONDS = float(os.getenv("AUTH_EPOCH_REBUILD_SECONDS", "3600"))
+
+# 增量同步时向前回看的时间窗口，覆盖水位线之前开始、之后才提交的暂停/激活
+REFRESH_OVERLAP = timedelta(seconds=5)
+# 激活超过访问令牌有效期的用户，按旧纪元签发的访问令牌均已过期，重建时不再保留
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=JWT_EXPIRES_MINUTES)
+
+
+class AuthEpochTable:
+    """进程内的认证纪元表，只记录暂停中或最近激活的用户
+
+    令牌中的纪元小于表中的纪元，或用户当前处于暂停状态时，令牌视为已吊销。
+    watermark 为已同步到的 users.updated_at，增量同步只读取其后变化的用户。
+    """
+
+    def __init__(self):
+        self._entries: Dict[UUID, Tuple[int, bool]] = {}
+        self._updated_at: Dict[UUID, float] = {}
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+
+    def get(self, user_id: UUID) -> Tuple[int, bool]:
+        """返回 (当前纪元, 是否暂停)，不在表中的用户为 (0, False)"""
+        return self._entries.get(user_id, (0, False))
+
+    def update(self, user_id: UUID, epoch: int, suspended: bool) -> None:
+        current = self._entries.get(user_id)
+        # 纪元只增不减，避免较旧的状态覆盖较新的状态
+        if current is None or epoch >= current[0]:
+            self._entries[user_id] = (epoch, suspended)
+            self._updated_at[user_id] = time.monotonic()
+
+    def replace(
+        self,
+        rows: Iterable[Tuple[UUID, int, bool]],
+        started_at: float,
+        watermark: Optional[datetime] = None,
+    ) -> None:
+        """用数据库快照替换吊销表
+
+        started_at 为开始读取快照的 time.monotonic()，之后本进程写入的条目比快照新，予以保留。
+        """
+        entries = {user_id: (epoch, suspended) for user_id, epoch, suspended in rows}
+        for user_id, updated_at in self._updated_at.items():
+            if updated_at >= started_at:
+                current = self._entries[user_id]
+                if user_id not in entries or current[0] >= entries[user_id][0]:
+                    entries[user_id] = current
+        self._entries = entries
+        self._updated_at = {}
+        self.watermark = watermark
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+
+    def merge(
+        self, rows: Iterable[Tuple[UUID, int, bool]], watermark: Optional[datetime]
+    ) -> None:
+        """合并增量同步读到的用户，从未被暂停过的用户（纪元 0 且未暂停）不入表"""
+        for user_id, epoch, suspended in rows:
+            current = self._entries.get(user_id)
+            if current is None and epoch == 0 and not suspended:
+                continue
+            if current is None or epoch >= current[0]:
+                self._entries[user_id] = (epoch, suspended)
+        self.watermark = watermark or self.watermark
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+
+    def metrics(self) -> Dict[str, float | int | None]:
+        return {
+            "size": len(self._entries),
+            "refreshes": self.refreshes,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+auth_epochs = AuthEpochTable()
+
+
+async def rebuild_auth_epochs() -> None:
+    """从数据库完整重建吊销表：暂停中的用户，以及激活后旧令牌可能尚未过期的用户"""
+    from ..database import AsyncSessionLocal
+    from ..db_service import DatabaseService
+
+    started_at = time.monotonic()
+    async with AsyncSessionLocal() as session:
+        db_service = DatabaseService(session)
+        watermark = await db_service.latest_user_updated_at()
+        rows = []
+        if watermark is not None:
+            rows = await db_service.list_revoked_auth_epochs(
+                changed_after=watermark - ACCESS_TOKEN_LIFETIME - REFRESH_OVERLAP
+            )
+    auth_epochs.replace(rows, started_at, watermark)
+
+
+async def refresh_auth_epochs() -> None:
+    """合并水位线之后变化的用户（包括其他 worker 暂停或激活的）"""
+    from ..database import AsyncSessionLocal
+    from ..db_service import DatabaseService
+
+    if auth_epochs.watermark is None:
+        return await rebuild_auth_epochs()
+    since = auth_epochs.watermark - REFRESH_OVERLAP
+    async with AsyncSessionLocal() as session:
+        db_service = DatabaseService(session)
+        # 先取水位线再读变化，两者之间提交的变化下次同步会再读到一次
+        watermark = await db_service.latest_user_updated_at()
+        rows = await db_service.list_auth_epochs(updated_after=since)
+    auth_epochs.merge(rows, watermark)
+
+
+async def run_auth_epoch_refresher(
+    refresh_interval: float = AUTH_EPOCH_REFRESH_SECONDS,
+    rebuild_interval: float = AUTH_EPOCH_REBUILD_SECONDS,
+) -> None:
+    """后台任务：定期增量同步吊销表，并按更长的间隔完整重建"""
+    last_rebuild = None
+    while True:
+        try:
+            if last_rebuild is None or time.monotonic() - last_rebuild >= rebuild_interval:
+                await rebuild_auth_epochs()
+                last_rebuild = time.monotonic()
+            else:
+                await refresh_auth_epochs()
+        except Exception:
+            logger.exception("refreshing auth epochs failed")
+        await asyncio.sleep(refresh_interval)
@@ -0,0 +1,91 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request, status
+
+# 登录限流：每个邮箱/IP 的突发容量和每分钟补充的令牌数
+LOGIN_RATE_EMAIL_BURST = int(os.getenv("LOGIN_RATE_EMAIL_BURST", "5"))
+LOGIN_RATE_EMAIL_PER_MINUTE = float(os.getenv("LOGIN_RATE_EMAIL_PER_MINUTE", "5"))
+LOGIN_RATE_IP_BURST = int(os.getenv("LOGIN_RATE_IP_BURST", "30"))
+LOGIN_RATE_IP_PER_MINUTE = float(os.getenv("LOGIN_RATE_IP_PER_MINUTE", "60"))
+# 每个限流器最多保留的桶数，超出时淘汰最久未使用的桶，内存占用固定
+LOGIN_THROTTLE_MAX_BUCKETS = int(os.getenv("LOGIN_THROTTLE_MAX_BUCKETS", "100000"))
+# 部署在 nginx 之后时按 X-Real-IP 识别客户端
+TRUST_X_REAL_IP = os.getenv("TRUST_X_REAL_IP", "false").lower() == "true"
+
+
+class TokenBucketLimiter:
+    """按键限流的令牌桶：令牌按时间连续补充，相当于平滑的滑动窗口"""
+
+    def __init__(self, burst: int, per_minute: float, max_buckets: int):
+        self.burst = burst
+        self.rate = per_minute / 60
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def acquire(self, key: str) -> float:
+        """消耗一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+            self.allowed += 1
+        else:
+            retry_after = (1 - tokens) / self.rate if self.rate > 0 else math.inf
+            self.rejected += 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+        return retry_after
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "buckets": len(self._buckets),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+        }
+
+
+login_ip_limiter = TokenBucketLimiter(
+    LOGIN_RATE_IP_BURST, LOGIN_RATE_IP_PER_MINUTE, LOGIN_THROTTLE_MAX_BUCKETS
+)
+login_email_limiter = TokenBucketLimiter(
+    LOGIN_RATE_EMAIL_BURST, LOGIN_RATE_EMAIL_PER_MINUTE, LOGIN_THROTTLE_MAX_BUCKETS
+)
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_X_REAL_IP and request.headers.get("x-real-ip"):
+        return request.headers["x-real-ip"]
+    return request.client.host if request.client else "unknown"
+
+
+def throttle_login(request: Request, email: str) -> None:
+    """登录限流，在查库和密码校验之前调用；超限时抛出 429"""
+    retry_after = login_ip_limiter.acquire(client_ip(request))
+    if not retry_after:
+        retry_after = login_email_limiter.acquire(email.lower())
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please retry later",
+            headers={"Retry-After": str(math.ceil(min(retry_after, 3600)))},
+        )
+
+
+def throttle_metrics() -> Dict[str, Dict[str, int]]:
+    return {"ip": login_ip_limiter.metrics(), "email": login_email_limiter.metrics()}
@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import Histogram
+
+logger = logging.getLogger("app.sql")
+
+# SQL 日志采样比例（0~1，0 表示只记录慢查询）和慢查询阈值（毫秒，0 表示不记录慢查询）；
+# 两者都为 0 时不注册任何事件监听，没有额外开销
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "0"))
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "0"))
+# 是否在日志中包含语句参数（可能含有敏感数据），以及语句文本的最大长度
+SQL_LOG_PARAMETERS = os.getenv("SQL_LOG_PARAMETERS", "false").lower() == "true"
+SQL_LOG_MAX_CHARS = int(os.getenv("SQL_LOG_MAX_CHARS", "2000"))
+
+# 涉及这些表的语句参数含密码哈希、刷新令牌摘要等凭据，即使 SQL_LOG_PARAMETERS=true 也不记录
+REDACTED_TABLES = ("users", "refresh_tokens")
+_REDACTED_TABLES_PATTERN = re.compile(
+    r"\b(?:%s)\b" % "|".join(REDACTED_TABLES), re.IGNORECASE
+)
+
+
+class SqlLogger:
+    """基于 cursor 执行事件的 SQL 耗时统计和结构化日志
+
+    每条语句都计时；被采样或超过慢查询阈值的语句输出一行 JSON 日志。
+    """
+
+    def __init__(
+        self,
+        sample_rate: float,
+        slow_query_ms: float,
+        log_parameters: bool = False,
+        max_chars: int = 2000,
+    ):
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self.log_parameters = log_parameters
+        self.max_chars = max_chars
+        self.duration_ms = Histogram()
+        self.sampled = 0
+        self.slow = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_query_ms > 0
+
+    def install(self, engine: Engine) -> None:
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._sql_started_at = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - context._sql_started_at) * 1000
+        self.duration_ms.observe(duration_ms)
+        slow = 0 < self.slow_query_ms <= duration_ms
+        if slow:
+            self.slow += 1
+        elif self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        else:
+            self.sampled += 1
+        record = self.format_record(
+            statement, parameters, duration_ms, cursor, executemany, slow
+        )
+        logger.log(logging.WARNING if slow else logging.INFO, record)
+
+    def format_record(
+        self, statement, parameters, duration_ms, cursor, executemany, slow
+    ) -> str:
+        record: Dict[str, Any] = {
+            "event": "slow_query" if slow else "query",
+            "duration_ms": round(duration_ms, 3),
+            "rowcount": cursor.rowcount if cursor.rowcount >= 0 else None,
+            "executemany": executemany,
+            "statement": " ".join(statement.split())[: self.max_chars],
+        }
+        if self.log_parameters:
+            if _REDACTED_TABLES_PATTERN.search(statement):
+                record["parameters"] = "[redacted]"
+            else:
+                record["parameters"] = repr(parameters)[: self.max_chars]
+        return json.dumps(record, ensure_ascii=False)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_query_ms": self.slow_query_ms,
+            "sampled": self.sampled,
+            "slow": self.slow,
+            "duration_ms": self.duration_ms.snapshot(),
+        }
+
+
+sql_logger = SqlLogger(
+    SQL_LOG_SAMPLE_RATE, SQL_SLOW_QUERY_MS, SQL_LOG_PARAMETERS, SQL_LOG_MAX_CHARS
+)
+
+
+def setup_sql_logging(engine: Engine) -> None:
+    """为引擎注册 SQL 日志；日志按行输出 JSON 到 stdout"""
+    if not sql_logger.enabled:
+        return
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    sql_logger.install(engine)
@@ -0,0 +1,149 @@
+import codecs
+import csv
+import json
+import os
+from collections import deque
+from itertools import zip_longest
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .schemas.ticket import TicketCreate
+
+# 每批校验并插入的行数
+IMPORT_BATCH_SIZE = 1000
+# 导入请求体的最大字节数，超过时中止导入并回滚已插入的批次
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class ImportTooLarge(Exception):
+    """请求体超过 IMPORT_MAX_BYTES"""
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}"
+        for err in exc.errors()
+    )
+
+
+async def iter_text_lines(
+    chunks: AsyncIterator[bytes], max_bytes: int = IMPORT_MAX_BYTES
+) -> AsyncIterator[str]:
+    """把分块到达的请求体按 UTF-8（可带 BOM）增量解码，逐行产出（保留行尾）
+
+    累计字节数超过 max_bytes 时抛出 ImportTooLarge；内容不是合法 UTF-8 时抛出 UnicodeDecodeError。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    received = 0
+    pending = ""
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise ImportTooLarge(f"request body exceeds {max_bytes} bytes")
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class _LineFeed:
+    """csv.reader 的输入行队列；只在队列中已有完整记录时才驱动 reader"""
+
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, dict]]:
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header: Optional[List[str]] = None
+    quotes = 0
+
+    async for line in lines:
+        feed.lines.append(line)
+        # 引号字段可以跨行：引号个数为偶数时才构成完整记录
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        try:
+            row = next(reader)
+        except StopIteration:
+            continue
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        # 与 csv.DictReader 一致：多出的值丢弃，缺少的字段为空；CSV 中的空字段视为未填写
+        yield reader.line_num, {
+            k: (v or None) for k, v in zip_longest(header, row) if k
+        }
+    # 结尾未闭合的引号字段
+    if header is not None and feed.lines:
+        row = next(reader, None)
+        if row:
+            yield reader.line_num, {
+                k: (v or None) for k, v in zip_longest(header, row) if k
+            }
+
+
+async def _iter_raw_rows(
+    lines: AsyncIterator[str], import_format: str
+) -> AsyncIterator[Tuple[int, object]]:
+    """逐行产出 (行号, 原始记录)；NDJSON 的 JSON 解析错误以异常对象的形式产出"""
+    if import_format == "csv":
+        async for row in _iter_csv_rows(lines):
+            yield row
+        return
+
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as exc:
+            yield line_no, exc
+
+
+async def parse_ticket_rows(
+    lines: AsyncIterator[str], import_format: str
+) -> AsyncIterator[Tuple[int, Optional[TicketCreate], Optional[str]]]:
+    """解析并校验导入内容，逐行产出 (行号, 校验通过的票据, 错误信息)"""
+    async for line_no, raw in _iter_raw_rows(lines, import_format):
+        if isinstance(raw, ValueError):
+            yield line_no, None, f"invalid JSON: {raw}"
+            continue
+        try:
+            yield line_no, TicketCreate.model_validate(raw), None
+        except ValidationError as exc:
+            yield line_no, None, _format_validation_error(exc)
+
+
+async def batched(
+    rows: AsyncIterator[Tuple[int, Optional[TicketCreate], Optional[str]]],
+    size: int = IMPORT_BATCH_SIZE,
+) -> AsyncIterator[List[Tuple[int, Optional[TicketCreate], Optional[str]]]]:
+    """按固定大小切分解析结果"""
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
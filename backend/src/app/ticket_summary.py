@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+
+# 汇总数据来源："live" 直接对 tickets 做 GROUP BY；"table" 优先读取触发器维护的汇总表（仅 PostgreSQL）。
+# 触发器让每次票据写入多一次汇总表 upsert，只在 table 模式下安装；已有数据库切换数据来源后
+# 执行 `python -m app.ticket_summary enable|disable` 安装或移除触发器
+TICKET_SUMMARY_SOURCE = os.getenv("TICKET_SUMMARY_SOURCE", "live")
+
+TICKET_SUMMARY_FUNCTION = """
+CREATE OR REPLACE FUNCTION ticket_summary_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF NOT OLD.is_soft_deleted THEN
+            UPDATE ticket_monthly_summary
+               SET ticket_count = ticket_count - 1,
+                   total_amount = total_amount - OLD.amount
+             WHERE user_id = OLD.user_id
+               AND currency = OLD.currency
+               AND status = OLD.status
+               AND month = date_trunc('month', OLD.spent_at)::date;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NOT NEW.is_soft_deleted THEN
+            INSERT INTO ticket_monthly_summary
+                (user_id, currency, status, month, ticket_count, total_amount)
+            VALUES (NEW.user_id, NEW.currency, NEW.status,
+                    date_trunc('month', NEW.spent_at)::date, 1, NEW.amount)
+            ON CONFLICT (user_id, currency, status, month) DO UPDATE
+               SET ticket_count = ticket_monthly_summary.ticket_count + 1,
+                   total_amount = ticket_monthly_summary.total_amount
+                                  + EXCLUDED.total_amount;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TICKET_SUMMARY_TRIGGER = """
+CREATE TRIGGER tickets_summary_trigger
+AFTER INSERT OR UPDATE OR DELETE ON tickets
+FOR EACH ROW EXECUTE FUNCTION ticket_summary_apply()
+"""
+
+# 安装触发器后在同一事务中重建汇总表：CREATE TRIGGER 持有的锁阻止票据写入直到提交，回填不会漏计或重复计数
+ENABLE_TICKET_SUMMARY = [
+    TICKET_SUMMARY_FUNCTION,
+    "DROP TRIGGER IF EXISTS tickets_summary_trigger ON tickets",
+    TICKET_SUMMARY_TRIGGER,
+    "DELETE FROM ticket_monthly_summary",
+    """
+    INSERT INTO ticket_monthly_summary
+        (user_id, currency, status, month, ticket_count, total_amount)
+    SELECT user_id, currency, status, date_trunc('month', spent_at)::date,
+           count(*), sum(amount)
+      FROM tickets
+     WHERE NOT is_soft_deleted
+     GROUP BY 1, 2, 3, 4
+    """,
+]
+
+DISABLE_TICKET_SUMMARY = [
+    "DROP TRIGGER IF EXISTS tickets_summary_trigger ON tickets",
+    "DROP FUNCTION IF EXISTS ticket_summary_apply()",
+    "DELETE FROM ticket_monthly_summary",
+]
+
+
+def summary_trigger_enabled() -> bool:
+    return TICKET_SUMMARY_SOURCE == "table"
+
+
+async def _run(statements) -> None:
+    from .database import engine
+
+    async with engine.begin() as conn:
+        for statement in statements:
+            await conn.exec_driver_sql(statement)
+    await engine.dispose()
+
+
+def main(argv=None) -> int:
+    """安装（enable）或移除（disable）汇总触发器"""
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {"enable": ENABLE_TICKET_SUMMARY, "disable": DISABLE_TICKET_SUMMARY}
+    if len(argv) != 1 or argv[0] not in commands:
+        print("usage: python -m app.ticket_summary enable|disable", file=sys.stderr)
+        return 2
+    asyncio.run(_run(commands[argv[0]]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
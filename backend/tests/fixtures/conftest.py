@@ -1,6 +1,7 @@
 import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Generator
 from uuid import UUID
 
@@ -10,11 +11,13 @@ from fastapi.testclient import TestClient
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 
 from app.main import app
+from app.database import get_db, get_session_factory
 from app.models import Base, User as UserModel, Ticket as TicketModel
 from app.db_service import DatabaseService
 from app.security.passwords import hash_password
@@ -29,6 +32,8 @@ test_engine = create_async_engine(
     TEST_DATABASE_URL,
     echo=False,  # 测试时不显示SQL
     future=True,
+    # 内存数据库只存在于单个连接中：测试数据和应用请求共用同一个连接
+    poolclass=StaticPool,
 )
 
 # 创建测试会话工厂
@@ -39,6 +44,27 @@ TestSessionLocal = sessionmaker(
 )
 
 
+@asynccontextmanager
+async def open_test_session() -> AsyncGenerator[AsyncSession, None]:
+    async with TestSessionLocal() as session:
+        yield session
+
+
+async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with open_test_session() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def override_db_dependencies() -> Generator:
+    """应用的数据库依赖（请求会话和流式导出使用的会话工厂）改用测试数据库"""
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: open_test_session
+    yield
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_session_factory, None)
+
+
 @pytest.fixture(scope="session")
 def event_loop() -> Generator:
     """创建一个事件循环用于整个测试会话"""
@@ -1,6 +1,7 @@
 import json
 import os
 import sys
+from uuid import UUID
 
 import pytest
 from fastapi import status
@@ -12,6 +13,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 
 from app.main import app
 from app.db_service import DatabaseService
+from app.security.throttle import LOGIN_RATE_EMAIL_BURST
 
 
 @pytest.mark.integration
@@ -105,6 +107,17 @@ class TestAuthEndpoints:
         data = response.json()
         assert data["detail"] == "User not found"
 
+    async def test_login_throttled_per_email(self, async_client: AsyncClient, clean_db):
+        """测试同一邮箱短时间内登录次数过多时返回429"""
+        login_data = {"email": "throttled@example.com", "password": "password123"}
+        statuses = [
+            (await async_client.post("/auth/login", json=login_data)).status_code
+            for _ in range(LOGIN_RATE_EMAIL_BURST + 1)
+        ]
+
+        assert statuses[:-1] == [status.HTTP_401_UNAUTHORIZED] * LOGIN_RATE_EMAIL_BURST
+        assert statuses[-1] == status.HTTP_429_TOO_MANY_REQUESTS
+
     async def test_login_forbidden_when_user_suspended(self, async_client: AsyncClient, clean_db, db_session: AsyncSession):
         """测试被暂停用户禁止登录"""
         # 先注册用户
@@ -130,6 +143,89 @@ class TestAuthEndpoints:
         data = response.json()
         assert data["detail"] == "您的账户已被停用，请联系管理员"
 
+    async def test_session_token_revoked_by_suspension(
+        self, async_client: AsyncClient, clean_db, db_session: AsyncSession
+    ):
+        """测试暂停用户后已签发的会话令牌失效，激活后需重新登录"""
+        register_data = {
+            "email": "revokeme@example.com",
+            "username": "revokeme",
+            "password": "password123",
+            "role": "employee",
+        }
+        response = await async_client.post("/auth/register", json=register_data)
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        user_id = response.json()["user"]["id"]
+
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == "revokeme"
+
+        db_service = DatabaseService(db_session)
+        await db_service.set_user_suspended(UUID(user_id), True)
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        await db_service.set_user_suspended(UUID(user_id), False)
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json()["detail"] == "Token revoked"
+
+        response = await async_client.post(
+            "/auth/login",
+            json={"email": "revokeme@example.com", "password": "password123"},
+        )
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    async def test_refresh_rotates_tokens(
+        self, async_client: AsyncClient, clean_db, sample_register_data
+    ):
+        """测试刷新令牌换取新令牌，旧刷新令牌失效"""
+        response = await async_client.post("/auth/register", json=sample_register_data)
+        refresh_token = response.json()["refresh_token"]
+
+        response = await async_client.post(
+            "/auth/refresh", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["refresh_token"] != refresh_token
+        assert data["user"]["email"] == sample_register_data["email"]
+
+        headers = {"Authorization": f"Bearer {data['token']}"}
+        response = await async_client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await async_client.post(
+            "/auth/refresh", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_logout_revokes_refresh_token(
+        self, async_client: AsyncClient, clean_db, sample_register_data
+    ):
+        """测试登出吊销刷新令牌，之后无法再续期"""
+        response = await async_client.post("/auth/register", json=sample_register_data)
+        refresh_token = response.json()["refresh_token"]
+
+        response = await async_client.post(
+            "/auth/logout", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = await async_client.post(
+            "/auth/refresh", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # 重复登出或令牌无效时同样返回 204
+        response = await async_client.post(
+            "/auth/logout", json={"refresh_token": refresh_token}
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
     async def test_me_endpoint_success(self, async_client: AsyncClient, clean_db, auth_headers_employee):
         """测试获取当前用户信息"""
         response = await async_client.get("/auth/me", headers=auth_headers_employee)
@@ -133,4 +133,32 @@ class TestEmployeeEndpoints:
             f"/employees/{fake_id}/suspend", headers=auth_headers_employer
         )
 
-        assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.integration
+class TestMetricsEndpoint:
+    """测试运行时指标端点的访问控制"""
+
+    async def test_metrics_requires_authentication(self, async_client: AsyncClient):
+        """测试未认证请求无法读取运行时指标"""
+        response = await async_client.get("/metrics")
+        assert response.status_code in (
+            status.HTTP_401_UNAUTHORIZED,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    async def test_metrics_forbidden_for_employee(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee
+    ):
+        """测试员工无法读取运行时指标"""
+        response = await async_client.get("/metrics", headers=auth_headers_employee)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_metrics_available_to_employer(
+        self, async_client: AsyncClient, clean_db, auth_headers_employer
+    ):
+        """测试雇主可以读取运行时指标"""
+        response = await async_client.get("/metrics", headers=auth_headers_employer)
+        assert response.status_code == status.HTTP_200_OK
+        assert "db_pool" in response.json()
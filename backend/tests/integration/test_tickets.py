@@ -110,7 +110,7 @@ class TestTicketEndpoints:
         response = await async_client.get("/tickets/", headers=headers)
 
         assert response.status_code == status.HTTP_200_OK
-        data = response.json()
+        data = response.json()["items"]
 
         # 应该只看到user1的票据
         assert len(data) == 1
@@ -142,7 +142,7 @@ class TestTicketEndpoints:
         response = await async_client.get("/tickets/", headers=auth_headers_employer)
 
         assert response.status_code == status.HTTP_200_OK
-        data = response.json()
+        data = response.json()["items"]
 
         # 应该看到员工的票据
         assert len(data) == 1
@@ -179,7 +179,7 @@ class TestTicketEndpoints:
         # 雇主获取票据列表时不应看到该票据
         response = await async_client.get("/tickets/", headers=auth_headers_employer)
         assert response.status_code == status.HTTP_200_OK
-        data = response.json()
+        data = response.json()["items"]
         assert all(item["id"] != str(ticket.id) for item in data)
 
     async def test_employee_cannot_get_specific_ticket_when_owner_suspended_for_employer(
@@ -223,7 +223,10 @@ class TestTicketEndpoints:
         # 员工首次获取应为空
         response = await async_client.get("/tickets/", headers=auth_headers_employee)
         assert response.status_code == status.HTTP_200_OK
-        assert response.json() == []
+        page = response.json()
+        assert page["items"] == []
+        assert page["next_cursor"] is None
+        assert page["synced_at"] is not None
 
         # 创建票据
         new_ticket = {
@@ -244,7 +247,7 @@ class TestTicketEndpoints:
         # 员工再次GET应为1
         response = await async_client.get("/tickets/", headers=auth_headers_employee)
         assert response.status_code == status.HTTP_200_OK
-        items = response.json()
+        items = response.json()["items"]
         assert len(items) == 1
         assert items[0]["id"] == ticket_id
         assert items[0]["status"] == "pending"
@@ -260,7 +263,7 @@ class TestTicketEndpoints:
         # 雇主GET应能看到状态为approved
         response = await async_client.get("/tickets/", headers=auth_headers_employer)
         assert response.status_code == status.HTTP_200_OK
-        employer_items = response.json()
+        employer_items = response.json()["items"]
         assert any(it["id"] == ticket_id and it["status"] == "approved" for it in employer_items)
 
     async def test_get_ticket_success(
@@ -359,4 +362,91 @@ class TestTicketEndpoints:
         data = response.json()
 
         # 验证票据状态
-        assert data["status"] == "denied"
\ No newline at end of file
+        assert data["status"] == "denied"
+
+    async def test_export_tickets_csv(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee, test_ticket
+    ):
+        """测试以CSV格式流式导出票据"""
+        response = await async_client.get(
+            "/tickets/export", params={"format": "csv"}, headers=auth_headers_employee
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.strip().splitlines()
+        assert lines[0].startswith("id,user_id,spent_at,amount")
+        assert len(lines) == 2
+        assert lines[1].startswith(str(test_ticket.id))
+
+    async def test_import_tickets_csv_with_error_report(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee
+    ):
+        """测试CSV批量导入：合法行写入，非法行返回错误报告"""
+        content = (
+            "spent_at,amount,currency,description,link\n"
+            "2024-01-01T10:00:00Z,12.5,USD,Taxi,\n"
+            "2024-01-02T10:00:00Z,-1,USD,Invalid amount,\n"
+        )
+        response = await async_client.post(
+            "/tickets/import",
+            content=content,
+            headers={**auth_headers_employee, "Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["imported"] == 1
+        assert data["rejected"] == 1
+        assert data["errors"][0]["line"] == 3
+
+    async def test_list_tickets_rejects_inverted_spent_range(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee
+    ):
+        """测试 spent_from 晚于 spent_to 时返回 422"""
+        response = await async_client.get(
+            "/tickets/",
+            params={
+                "spent_from": "2024-02-01T00:00:00Z",
+                "spent_to": "2024-01-01T00:00:00Z",
+            },
+            headers=auth_headers_employee,
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_list_tickets_conditional_get(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee, test_ticket
+    ):
+        """测试列表ETag：If-None-Match匹配时返回304"""
+        response = await async_client.get("/tickets/", headers=auth_headers_employee)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["etag"]
+
+        response = await async_client.get(
+            "/tickets/", headers={**auth_headers_employee, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+
+    async def test_list_ticket_changes(
+        self, async_client: AsyncClient, clean_db, auth_headers_employee, test_ticket
+    ):
+        """测试增量同步：返回水位线之后变化和删除的票据"""
+        response = await async_client.get("/tickets/", headers=auth_headers_employee)
+        assert response.status_code == status.HTTP_200_OK
+        synced_at = response.json()["synced_at"]
+        assert synced_at is not None
+
+        await async_client.delete(
+            f"/tickets/{test_ticket.id}", headers=auth_headers_employee
+        )
+        response = await async_client.get(
+            "/tickets/changes",
+            params={"since": synced_at},
+            headers=auth_headers_employee,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["changed"] == []
+        assert data["removed"] == [str(test_ticket.id)]
+        assert data["next_since"] is not None
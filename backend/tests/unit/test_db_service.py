@@ -2,15 +2,70 @@ import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+import argparse
+import json
+import logging
 import os
 import sys
+import time
+from unittest.mock import patch
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 
+from alembic import command
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+    func,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.database import (
+    MIGRATIONS_DIR,
+    InstrumentedPool,
+    SchemaVersionError,
+    check_schema_version,
+    pool_metrics,
+)
 from app.db_service import DatabaseService
-from app.models import User, Ticket
+from app.metrics import Histogram
+from app.security.dependencies import get_current_user
+from app.security.jwt import create_access_token
+from app.security.refresh_tokens import revoked_refresh_tokens
+from app.security.revocation import REFRESH_OVERLAP, AuthEpochTable, auth_epochs
+from app.models import Base, User, Ticket
+from app.pagination import decode_cursor, encode_cursor
+from app.partitions import upcoming_months
+from app.replica import (
+    PRIMARY_UNTIL_HEADER,
+    ReadYourWritesMiddleware,
+    replica_health,
+)
+from app.sql_logging import SqlLogger
+from app.ticket_import import ImportTooLarge, iter_text_lines, parse_ticket_rows
+from app import ticket_summary
 
 
 @pytest.mark.unit
@@ -56,6 +111,38 @@ class TestDatabaseService:
                 password_hash="hashed_password2",
             )
 
+    async def test_create_user_single_statement(self, db_service: DatabaseService):
+        """测试创建用户只执行一条 INSERT ... ON CONFLICT 语句，重复邮箱不改动原记录"""
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_service.session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            user = await db_service.create_user(
+                email="test@example.com",
+                username="testuser",
+                role="employee",
+                password_hash="hashed_password",
+            )
+            with pytest.raises(ValueError, match="email_exists"):
+                await db_service.create_user(
+                    email="test@example.com",
+                    username="other",
+                    role="employer",
+                    password_hash="other_hash",
+                )
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 2
+        assert all("ON CONFLICT" in statement for statement in statements)
+        assert user.created_at is not None
+        found_user = await db_service.get_user_by_email("test@example.com")
+        assert found_user.username == "testuser"
+
     async def test_get_user_by_email(self, db_service: DatabaseService):
         """测试通过邮箱获取用户"""
         created_user = await db_service.create_user(
@@ -93,6 +180,198 @@ class TestDatabaseService:
         found_user = await db_service.get_user_by_id(created_user.id)
         assert found_user.is_suspended is True
 
+    async def test_stream_user_emails(self, db_service: DatabaseService):
+        """测试邮箱过滤器使用的用户数、水位线和邮箱流"""
+        assert await db_service.user_emails_version() == (0, None)
+        for i in range(3):
+            await db_service.create_user(
+                email=f"user{i}@example.com",
+                username=f"user{i}",
+                role="employee",
+                password_hash="hashed_password",
+            )
+
+        count, watermark = await db_service.user_emails_version()
+        assert count == 3
+        assert watermark is not None
+        emails = [email async for email in db_service.stream_user_emails(batch_size=2)]
+        assert sorted(emails) == [f"user{i}@example.com" for i in range(3)]
+        recent = [
+            email
+            async for email in db_service.stream_user_emails(
+                created_after=datetime(2999, 1, 1)
+            )
+        ]
+        assert recent == []
+
+    async def test_update_password_hash(self, db_service: DatabaseService):
+        """测试只有当前哈希未被并发修改时才替换密码哈希"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="old_hash",
+        )
+        assert await db_service.update_password_hash(user.id, "stale", "x") is False
+        assert await db_service.update_password_hash(user.id, "old_hash", "new_hash")
+
+        found_user = await db_service.get_user_by_email("test@example.com")
+        assert found_user.password_hash == "new_hash"
+
+    async def test_legacy_token_reloads_user_on_each_request(
+        self, db_service: DatabaseService, db_session: AsyncSession
+    ):
+        """测试不含用户声明的旧令牌每次从数据库加载用户，其他 worker 的暂停立即生效"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        creds = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=create_access_token(str(user.id))
+        )
+        assert (await get_current_user(creds, db_session)).id == user.id
+
+        # 模拟其他 worker：直接改库，本进程的吊销表不会被主动更新
+        await db_session.execute(
+            update(User).where(User.id == user.id).values(is_suspended=True)
+        )
+        await db_session.commit()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(creds, db_session)
+        assert exc_info.value.status_code == 403
+
+    async def test_incremental_refresh_picks_up_suspension_elsewhere(
+        self, db_service: DatabaseService, db_session: AsyncSession
+    ):
+        """测试按 updated_at 水位线增量同步吊销表，只读取水位线之后变化的用户"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        other = await db_service.create_user(
+            email="other@example.com",
+            username="other",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        table = AuthEpochTable()
+        table.replace([], time.monotonic(), await db_service.latest_user_updated_at())
+        since = table.watermark - REFRESH_OVERLAP
+        # 从未被暂停过的用户不入表
+        table.merge(
+            await db_service.list_auth_epochs(updated_after=since), table.watermark
+        )
+        assert table.metrics()["size"] == 0
+
+        # 模拟其他 worker：直接改库
+        await db_session.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(
+                is_suspended=True,
+                auth_epoch=User.auth_epoch + 1,
+                updated_at=datetime.now(timezone.utc) + timedelta(minutes=1),
+            )
+        )
+        await db_session.commit()
+
+        watermark = await db_service.latest_user_updated_at()
+        rows = await db_service.list_auth_epochs(
+            updated_after=table.watermark - REFRESH_OVERLAP
+        )
+        table.merge(rows, watermark)
+        assert table.get(user.id) == (1, True)
+        assert table.get(other.id) == (0, False)
+        assert table.watermark == watermark
+
+        # 水位线之后没有变化时不读取任何用户
+        assert await db_service.list_auth_epochs(updated_after=watermark) == []
+
+    async def test_set_user_suspended_bumps_auth_epoch(
+        self, db_service: DatabaseService
+    ):
+        """测试暂停用户时递增认证纪元，激活时不变"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        assert user.auth_epoch == 0
+        long_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        assert await db_service.list_revoked_auth_epochs(changed_after=long_ago) == []
+
+        suspended = await db_service.set_user_suspended(user.id, True)
+        assert suspended.auth_epoch == 1
+        assert auth_epochs.get(user.id) == (1, True)
+
+        activated = await db_service.set_user_suspended(user.id, False)
+        assert activated.auth_epoch == 1
+        assert await db_service.list_revoked_auth_epochs(changed_after=long_ago) == [
+            (user.id, 1, False)
+        ]
+        # 激活早于访问令牌有效期的用户，旧令牌均已过期，重建时不再保留
+        later = datetime.now(timezone.utc) + timedelta(days=1)
+        assert await db_service.list_revoked_auth_epochs(changed_after=later) == []
+
+    async def test_rotate_refresh_token(self, db_service: DatabaseService):
+        """测试刷新令牌轮换：旧令牌只能使用一次，暂停用户时吊销全部刷新令牌"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+        stored = await db_service.create_refresh_token(user.id, "hash-1", expires_at)
+
+        # 摘要不匹配
+        assert await db_service.rotate_refresh_token(
+            stored.id, "wrong", "hash-2", expires_at
+        ) == (None, None)
+
+        owner, rotated = await db_service.rotate_refresh_token(
+            stored.id, "hash-1", "hash-2", expires_at
+        )
+        assert owner.id == user.id
+        assert rotated.token_hash == "hash-2"
+        assert stored.id in revoked_refresh_tokens
+
+        # 旧令牌不能再次使用
+        assert await db_service.rotate_refresh_token(
+            stored.id, "hash-1", "hash-3", expires_at
+        ) == (None, None)
+
+        await db_service.set_user_suspended(user.id, True)
+        assert rotated.id in revoked_refresh_tokens
+        assert {
+            token_id for token_id, _ in await db_service.list_revoked_refresh_tokens()
+        } == {stored.id, rotated.id}
+
+    async def test_revoke_refresh_token(self, db_service: DatabaseService):
+        """测试登出吊销单个刷新令牌：摘要必须匹配，重复吊销返回 False"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+        stored = await db_service.create_refresh_token(user.id, "hash-1", expires_at)
+
+        assert await db_service.revoke_refresh_token(stored.id, "wrong") is False
+        assert await db_service.revoke_refresh_token(stored.id, "hash-1") is True
+        assert stored.id in revoked_refresh_tokens
+        assert await db_service.revoke_refresh_token(stored.id, "hash-1") is False
+        assert await db_service.rotate_refresh_token(
+            stored.id, "hash-1", "hash-2", expires_at
+        ) == (None, None)
+
     async def test_list_employees(self, db_service: DatabaseService):
         """测试列出员工"""
         # 创建员工和雇主
@@ -152,6 +431,41 @@ class TestDatabaseService:
         assert ticket.id is not None
         assert isinstance(ticket.id, UUID)
 
+    async def test_create_ticket_single_statement(self, db_service: DatabaseService):
+        """测试创建票据只执行一条 INSERT ... RETURNING（另有一条列表版本号 upsert），服务端默认值无需再 SELECT"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_service.session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            ticket = await db_service.create_ticket(
+                user_id=user.id,
+                spent_at=datetime.now(timezone.utc),
+                amount=100.0,
+                currency="USD",
+                description=None,
+                link=None,
+            )
+            # 默认值已随 INSERT 返回，读取属性不会触发查询
+            assert ticket.created_at is not None
+            assert ticket.updated_at is not None
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(statements) == 2
+        assert statements[0].startswith("INSERT INTO tickets")
+        assert "RETURNING" in statements[0]
+        assert statements[1].startswith("INSERT INTO ticket_list_versions")
+
     async def test_get_ticket(self, db_service: DatabaseService):
         """测试获取票据"""
         user = await db_service.create_user(
@@ -274,3 +588,910 @@ class TestDatabaseService:
         tickets = await db_service.get_tickets_for_suspended_users()
         assert len(tickets) == 1
         assert tickets[0].id == suspended_ticket.id
+
+    async def test_list_visible_tickets(self, db_service: DatabaseService):
+        """测试按角色过滤可见票据（雇主看不到软删除和被暂停用户的票据）"""
+        active_user = await db_service.create_user(
+            email="active@example.com",
+            username="active",
+            role="employee",
+            password_hash="hash",
+        )
+        suspended_user = await db_service.create_user(
+            email="suspended@example.com",
+            username="suspended",
+            role="employee",
+            password_hash="hash",
+        )
+
+        visible_ticket = await db_service.create_ticket(
+            user_id=active_user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=10.0,
+            currency="USD",
+            description="visible",
+            link=None,
+        )
+        deleted_ticket = await db_service.create_ticket(
+            user_id=active_user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=15.0,
+            currency="USD",
+            description="deleted",
+            link=None,
+        )
+        await db_service.create_ticket(
+            user_id=suspended_user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=20.0,
+            currency="USD",
+            description="hidden",
+            link=None,
+        )
+        await db_service.soft_delete_ticket(deleted_ticket.id)
+        await db_service.set_user_suspended(suspended_user.id, True)
+
+        employer_view = await db_service.list_visible_tickets(
+            active_user.id, "employer"
+        )
+        assert [t.id for t in employer_view] == [visible_ticket.id]
+
+        employee_view = await db_service.list_visible_tickets(
+            suspended_user.id, "employee"
+        )
+        assert len(employee_view) == 1
+        assert employee_view[0].user_id == suspended_user.id
+
+    async def test_list_visible_tickets_keyset_pagination(
+        self, db_service: DatabaseService
+    ):
+        """测试按 (created_at, id) 倒序的键集分页"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        tickets = []
+        for day in range(1, 4):
+            ticket = await db_service.create_ticket(
+                user_id=user.id,
+                spent_at=datetime.now(timezone.utc),
+                amount=float(day),
+                currency="USD",
+                description=None,
+                link=None,
+            )
+            await db_service.session.execute(
+                update(Ticket)
+                .where(Ticket.id == ticket.id)
+                .values(created_at=datetime(2024, 1, day, tzinfo=timezone.utc))
+            )
+            tickets.append(ticket)
+        await db_service.session.commit()
+
+        first_page = await db_service.list_visible_tickets(user.id, "employee", limit=2)
+        assert [t.id for t in first_page] == [tickets[2].id, tickets[1].id]
+
+        cursor = encode_cursor(
+            "-created_at", first_page[-1].created_at, first_page[-1].id
+        )
+        second_page = await db_service.list_visible_tickets(
+            user.id, "employee", limit=2, after=decode_cursor(cursor, "-created_at")
+        )
+        assert [t.id for t in second_page] == [tickets[0].id]
+
+    async def test_list_visible_tickets_filters_and_sort(
+        self, db_service: DatabaseService
+    ):
+        """测试状态、用户、消费时间和金额筛选以及按金额排序"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        other = await db_service.create_user(
+            email="other@example.com",
+            username="other",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        for day, amount in [(1, 50.0), (2, 20.0), (3, 30.0), (4, 40.0)]:
+            await db_service.create_ticket(
+                user_id=user.id,
+                spent_at=datetime(2024, 1, day, tzinfo=timezone.utc),
+                amount=amount,
+                currency="USD",
+                description=None,
+                link=None,
+            )
+        other_ticket = await db_service.create_ticket(
+            user_id=other.id,
+            spent_at=datetime(2024, 1, 2, tzinfo=timezone.utc),
+            amount=25.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        await db_service.approve_ticket(other_ticket.id)
+
+        tickets = await db_service.list_visible_tickets(
+            user.id,
+            "employer",
+            sort="-amount",
+            status="pending",
+            owner_id=user.id,
+            spent_from=datetime(2024, 1, 2, tzinfo=timezone.utc),
+            spent_to=datetime(2024, 1, 4, tzinfo=timezone.utc),
+            min_amount=10.0,
+            max_amount=45.0,
+        )
+        assert [t.amount for t in tickets] == [30.0, 20.0]
+
+        approved = await db_service.list_visible_tickets(
+            user.id, "employer", status="approved"
+        )
+        assert [t.id for t in approved] == [other_ticket.id]
+
+    async def test_stream_visible_tickets_in_batches(
+        self, db_service: DatabaseService
+    ):
+        """测试以服务端游标分批读取可见票据"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        for amount in (10.0, 20.0, 30.0):
+            await db_service.create_ticket(
+                user_id=user.id,
+                spent_at=datetime.now(timezone.utc),
+                amount=amount,
+                currency="USD",
+                description=None,
+                link=None,
+            )
+
+        batches = [
+            batch
+            async for batch in db_service.stream_visible_tickets(
+                user.id, "employee", batch_size=2, sort="amount"
+            )
+        ]
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert [t.amount for batch in batches for t in batch] == [10.0, 20.0, 30.0]
+
+    async def test_transition_ticket_outcomes(self, db_service: DatabaseService):
+        """测试条件状态变更：成功、状态冲突、不存在以及非本人票据"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        ticket = await db_service.create_ticket(
+            user_id=user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=100.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+
+        result = await db_service.transition_ticket(ticket.id, status="approved")
+        assert result.outcome == "updated"
+        assert result.ticket.status == "approved"
+
+        result = await db_service.transition_ticket(ticket.id, status="denied")
+        assert result.outcome == "conflict"
+        assert result.ticket.status == "approved"
+
+        result = await db_service.transition_ticket(
+            UUID("00000000-0000-0000-0000-000000000000"), status="approved"
+        )
+        assert result == ("not_found", None)
+
+        other = await db_service.create_ticket(
+            user_id=user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=50.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        result = await db_service.transition_ticket(
+            other.id,
+            owner_id=UUID("00000000-0000-0000-0000-000000000001"),
+            is_soft_deleted=True,
+        )
+        assert result.outcome == "not_found"
+
+    async def test_bulk_transition_tickets(self, db_service: DatabaseService):
+        """测试批量审批返回每个票据的处理结果"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        tickets = []
+        for amount in (10.0, 20.0, 30.0):
+            tickets.append(
+                await db_service.create_ticket(
+                    user_id=user.id,
+                    spent_at=datetime.now(timezone.utc),
+                    amount=amount,
+                    currency="USD",
+                    description=None,
+                    link=None,
+                )
+            )
+        await db_service.deny_ticket(tickets[1].id)
+        await db_service.soft_delete_ticket(tickets[2].id)
+        missing_id = UUID("00000000-0000-0000-0000-000000000000")
+
+        outcomes = await db_service.bulk_transition_tickets(
+            [t.id for t in tickets] + [missing_id], status="approved"
+        )
+
+        assert outcomes[tickets[0].id].outcome == "updated"
+        assert outcomes[tickets[0].id].ticket.status == "approved"
+        assert outcomes[tickets[1].id].outcome == "conflict"
+        assert outcomes[tickets[1].id].ticket.status == "denied"
+        assert outcomes[tickets[2].id].outcome == "not_found"
+        assert outcomes[missing_id].outcome == "not_found"
+
+    async def test_create_tickets_bulk(self, db_service: DatabaseService):
+        """测试分批多行插入票据"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        rows = [
+            {
+                "spent_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                "amount": float(i + 1),
+                "currency": "USD",
+                "description": None,
+                "link": None,
+            }
+            for i in range(5)
+        ]
+
+        async def batches():
+            yield rows[:3]
+            yield rows[3:]
+
+        inserted = await db_service.create_tickets_bulk(user.id, batches())
+
+        assert inserted == 5
+        tickets = await db_service.list_tickets_by_user(user.id)
+        assert sorted(t.amount for t in tickets) == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert all(t.status == "pending" and not t.is_soft_deleted for t in tickets)
+
+    async def test_summarize_visible_tickets(self, db_service: DatabaseService):
+        """测试按月份和币种汇总可见票据"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        for day, amount, currency in [
+            (datetime(2024, 1, 5, tzinfo=timezone.utc), 10.0, "USD"),
+            (datetime(2024, 1, 20, tzinfo=timezone.utc), 5.0, "USD"),
+            (datetime(2024, 2, 1, tzinfo=timezone.utc), 7.0, "EUR"),
+        ]:
+            await db_service.create_ticket(
+                user_id=user.id,
+                spent_at=day,
+                amount=amount,
+                currency=currency,
+                description=None,
+                link=None,
+            )
+
+        rows = await db_service.summarize_visible_tickets(
+            user.id, "employer", group_by=["month"]
+        )
+
+        assert rows == [
+            {"month": "2024-01", "currency": "USD", "ticket_count": 2, "total_amount": 15.0},
+            {"month": "2024-02", "currency": "EUR", "ticket_count": 1, "total_amount": 7.0},
+        ]
+
+    async def test_visible_tickets_version_changes_on_write(
+        self, db_service: DatabaseService
+    ):
+        """测试票据写入和员工停用时递增该员工的版本号，雇主版本为各员工之和"""
+        user = await db_service.create_user(
+            email="test@example.com",
+            username="testuser",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        other = await db_service.create_user(
+            email="other@example.com",
+            username="other",
+            role="employee",
+            password_hash="hashed_password",
+        )
+
+        async def versions():
+            employer = await db_service.visible_tickets_version(user.id, "employer")
+            own = await db_service.visible_tickets_version(user.id, "employee")
+            others = await db_service.visible_tickets_version(other.id, "employee")
+            return employer.version, own.version, others.version
+
+        assert await versions() == (0, 0, 0)
+        ticket = await db_service.create_ticket(
+            user_id=user.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=10.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        assert await versions() == (1, 1, 0)
+
+        await db_service.soft_delete_ticket(ticket.id)
+        assert await versions() == (2, 2, 0)
+
+        await db_service.bulk_transition_tickets([ticket.id], status="approved")
+        assert await versions() == (2, 2, 0)  # 未命中不递增
+
+        await db_service.set_user_suspended(user.id, True)
+        assert await versions() == (3, 3, 0)
+
+        await db_service.create_ticket(
+            user_id=other.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=5.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        assert await versions() == (4, 3, 1)
+
+    async def test_list_ticket_changes(self, db_service: DatabaseService):
+        """测试增量同步返回水位线之后的新增、软删和停用用户的票据"""
+        employee = await db_service.create_user(
+            email="employee@example.com",
+            username="employee",
+            role="employee",
+            password_hash="hashed_password",
+        )
+        employer = await db_service.create_user(
+            email="employer@example.com",
+            username="employer",
+            role="employer",
+            password_hash="hashed_password",
+        )
+        kept = await db_service.create_ticket(
+            user_id=employee.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=10.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        deleted = await db_service.create_ticket(
+            user_id=employee.id,
+            spent_at=datetime.now(timezone.utc),
+            amount=20.0,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        since = datetime(2000, 1, 1)
+
+        changed, removed = await db_service.list_ticket_changes(
+            employer.id, "employer", since
+        )
+        assert {t.id for t in changed} == {kept.id, deleted.id}
+        assert removed == []
+
+        await db_service.soft_delete_ticket(deleted.id)
+        changed, removed = await db_service.list_ticket_changes(
+            employee.id, "employee", since
+        )
+        assert [t.id for t in changed] == [kept.id]
+        assert removed == [deleted.id]
+
+        await db_service.set_user_suspended(employee.id, True)
+        changed, removed = await db_service.list_ticket_changes(
+            employer.id, "employer", since
+        )
+        assert changed == []
+        assert set(removed) == {kept.id, deleted.id}
+
+        # 水位线之后没有任何变化
+        changed, removed = await db_service.list_ticket_changes(
+            employer.id, "employer", datetime(2999, 1, 1)
+        )
+        assert changed == [] and removed == []
+
+
+@pytest.mark.unit
+class TestConnectionPoolMetrics:
+    """测试连接池指标"""
+
+    def test_histogram_cumulative_buckets(self):
+        histogram = Histogram(buckets=(1, 10, 100))
+        for value in (0.5, 1, 7, 50, 500):
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 5
+        assert snapshot["max"] == 500
+        assert snapshot["buckets"] == {"1": 2, "10": 3, "100": 4, "+Inf": 5}
+
+    async def test_pool_records_connects_waits_and_timeouts(self):
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05,
+        )
+        connects = pool_metrics["primary"].connect_ms.count
+        waits = pool_metrics["primary"].checkout_wait_ms.count
+        timeouts = pool_metrics["primary"].timeouts
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                assert engine.sync_engine.pool.checkedout() == 1
+                # 唯一的连接已借出，第二次借出等待超时
+                with pytest.raises(PoolTimeoutError):
+                    await engine.connect().start()
+        finally:
+            await engine.dispose()
+
+        assert pool_metrics["primary"].connect_ms.count == connects + 1
+        assert pool_metrics["primary"].checkout_wait_ms.count == waits + 2
+        assert pool_metrics["primary"].timeouts == timeouts + 1
+
+    async def test_checkout_wait_excludes_connect_time(self):
+        """测试池未满时新建连接的耗时只计入 connect_ms，不计入借出等待"""
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:",
+            poolclass=InstrumentedPool,
+            pool_logging_name="slow_connect",
+            pool_size=1,
+            max_overflow=0,
+        )
+        original = AsyncAdaptedQueuePool._create_connection
+
+        def slow_create_connection(pool):
+            time.sleep(0.05)
+            return original(pool)
+
+        try:
+            with patch.object(
+                AsyncAdaptedQueuePool, "_create_connection", slow_create_connection
+            ):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        finally:
+            await engine.dispose()
+
+        metrics = pool_metrics["slow_connect"]
+        assert metrics.connect_ms.count == 1
+        assert metrics.connect_ms.max >= 50
+        assert metrics.checkout_wait_ms.count == 1
+        assert metrics.checkout_wait_ms.max < 50
+
+
+@pytest.mark.unit
+class TestSqlLogging:
+    """测试 SQL 采样日志"""
+
+    async def _run(self, sql_logger: SqlLogger, statement: str):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        sql_logger.install(engine.sync_engine)
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text(statement), {"x": 1})
+        finally:
+            await engine.dispose()
+
+    async def test_disabled_logger_registers_no_listeners(self):
+        sql_logger = SqlLogger(sample_rate=0, slow_query_ms=0)
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        sql_logger.install(engine.sync_engine)
+        assert not event.contains(
+            engine.sync_engine, "before_cursor_execute", sql_logger._before
+        )
+        await engine.dispose()
+
+    async def test_sampled_query_is_logged_as_json(self, caplog):
+        sql_logger = SqlLogger(sample_rate=1, slow_query_ms=0)
+        with caplog.at_level(logging.INFO, logger="app.sql"):
+            await self._run(sql_logger, "SELECT  :x\n  + 1")
+
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["event"] == "query"
+        assert record["statement"] == "SELECT ? + 1"
+        assert "parameters" not in record
+        assert sql_logger.sampled == 1
+        assert sql_logger.duration_ms.count == 1
+
+    async def test_slow_query_logged_without_sampling(self, caplog):
+        sql_logger = SqlLogger(sample_rate=0, slow_query_ms=1e-6, log_parameters=True)
+        with caplog.at_level(logging.INFO, logger="app.sql"):
+            await self._run(sql_logger, "SELECT :x")
+
+        record = json.loads(caplog.records[-1].getMessage())
+        assert caplog.records[-1].levelno == logging.WARNING
+        assert record["event"] == "slow_query"
+        assert record["parameters"] == "(1,)"
+        assert sql_logger.slow == 1
+
+    def test_parameters_redacted_for_credential_tables(self):
+        """测试 users 和 refresh_tokens 的语句不记录参数（密码哈希、令牌摘要）"""
+        sql_logger = SqlLogger(sample_rate=1, slow_query_ms=0, log_parameters=True)
+        cursor = argparse.Namespace(rowcount=1)
+        for statement in (
+            "UPDATE users SET password_hash=? WHERE users.id = ?",
+            'INSERT INTO "refresh_tokens" (token_hash) VALUES (?)',
+        ):
+            record = json.loads(
+                sql_logger.format_record(
+                    statement, ("secret", 1), 1.0, cursor, False, False
+                )
+            )
+            assert record["parameters"] == "[redacted]"
+
+        record = json.loads(
+            sql_logger.format_record(
+                "SELECT * FROM tickets WHERE id = ?", (1,), 1.0, cursor, False, False
+            )
+        )
+        assert record["parameters"] == "(1,)"
+
+    async def test_fast_unsampled_query_is_not_logged(self, caplog):
+        sql_logger = SqlLogger(sample_rate=0, slow_query_ms=60_000)
+        with caplog.at_level(logging.INFO, logger="app.sql"):
+            await self._run(sql_logger, "SELECT :x")
+
+        assert not [r for r in caplog.records if r.name == "app.sql"]
+        assert sql_logger.duration_ms.count == 1
+
+
+@pytest.mark.unit
+class TestTicketImport:
+    """测试流式解析导入内容"""
+
+    async def _chunks(self, data: bytes, size: int):
+        for start in range(0, len(data), size):
+            yield data[start : start + size]
+
+    async def _parse(self, data: bytes, import_format: str, size: int = 7, **kwargs):
+        lines = iter_text_lines(self._chunks(data, size), **kwargs)
+        return [row async for row in parse_ticket_rows(lines, import_format)]
+
+    async def test_csv_split_across_chunks(self):
+        """测试分块边界落在多字节字符和跨行引号字段中间时仍按记录解析"""
+        data = (
+            "\ufeffspent_at,amount,currency,description,link\r\n"
+            '2024-01-01T10:00:00Z,12.5,USD,"出租车\n夜间",\r\n'
+            "2024-01-02T10:00:00Z,-1,USD,Invalid amount,\r\n"
+            "2024-01-03T10:00:00Z,3,EUR,,"
+        ).encode("utf-8")
+
+        rows = await self._parse(data, "csv")
+
+        assert [line_no for line_no, _, _ in rows] == [3, 4, 5]
+        assert rows[0][1].description == "出租车\n夜间"
+        assert rows[1][1] is None and "amount" in rows[1][2]
+        assert rows[2][1].currency == "EUR" and rows[2][1].description is None
+
+    async def test_ndjson_reports_invalid_lines(self):
+        """测试 NDJSON 逐行解析，行号包含空行"""
+        data = (
+            b'{"spent_at": "2024-01-01T10:00:00Z", "amount": 1, "currency": "USD"}\n'
+            b"\n"
+            b"{not json}\n"
+        )
+
+        rows = await self._parse(data, "ndjson")
+
+        assert rows[0][0] == 1 and rows[0][1].amount == 1
+        assert rows[1][0] == 3 and rows[1][2].startswith("invalid JSON")
+
+    async def test_body_over_limit_is_rejected(self):
+        """测试累计字节数超过上限时中止解析"""
+        data = b"spent_at,amount,currency\n" + b"2024-01-01T10:00:00Z,1,USD\n" * 10
+        with pytest.raises(ImportTooLarge):
+            await self._parse(data, "csv", max_bytes=64)
+
+
+@pytest.mark.unit
+class TestReadReplicaRouting:
+    """测试只读查询的副本路由"""
+
+    @pytest_asyncio.fixture
+    async def replica_session(self, db_session: AsyncSession):
+        """与主会话共享同一数据库的“副本”会话"""
+        async with AsyncSession(db_session.bind, expire_on_commit=False) as session:
+            replica_health.record_lag(0)
+            yield session
+        replica_health.healthy = False
+
+    async def _create_user(self, db_session: AsyncSession) -> User:
+        return await DatabaseService(db_session).create_user(
+            email="replica@example.com",
+            username="replica",
+            role="employee",
+            password_hash="hash",
+        )
+
+    async def test_reads_go_to_replica_until_commit(
+        self, db_session: AsyncSession, replica_session: AsyncSession
+    ):
+        user = await self._create_user(db_session)
+        db_service = DatabaseService(db_session, read_session=replica_session)
+        routed = replica_health.routed_reads
+
+        assert (await db_service.get_user_by_id(user.id)).email == user.email
+        assert [u.id for u in await db_service.list_employees()] == [user.id]
+        assert replica_health.routed_reads == routed + 2
+
+        # 提交写入之后，本服务的读取留在主库
+        ticket = await db_service.create_ticket(
+            user_id=user.id,
+            spent_at=datetime.now(),
+            amount=1,
+            currency="USD",
+            description=None,
+            link=None,
+        )
+        assert (await db_service.get_ticket(ticket.id)).id == ticket.id
+        assert replica_health.routed_reads == routed + 2
+
+    async def test_lagging_replica_is_skipped(
+        self, db_session: AsyncSession, replica_session: AsyncSession
+    ):
+        user = await self._create_user(db_session)
+        db_service = DatabaseService(db_session, read_session=replica_session)
+        replica_health.record_lag(replica_health.max_lag + 1)
+        routed = replica_health.routed_reads
+
+        assert await db_service.get_user_by_id(user.id) is not None
+        assert replica_health.routed_reads == routed
+
+    async def test_reads_stay_on_primary_after_client_write(
+        self, db_session: AsyncSession, replica_session: AsyncSession
+    ):
+        """跨请求的读己之写：写入响应下发截止时间，客户端带回后该窗口内的读取留在主库"""
+        users = []
+
+        async def endpoint(scope, receive, send):
+            db_service = DatabaseService(db_session, read_session=replica_session)
+            if scope["path"] == "/write":
+                users.append((await self._create_user(db_session)).id)
+            else:
+                await db_service.get_user_by_id(users[0])
+            # 与 get_db 一样，请求结束时结束主会话的事务
+            await db_session.rollback()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def request(path, headers=()):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {"type": "http", "path": path, "headers": list(headers)}
+            await ReadYourWritesMiddleware(endpoint)(scope, None, send)
+            return dict(messages[0]["headers"])
+
+        header = PRIMARY_UNTIL_HEADER.lower().encode()
+        written = await request("/write")
+        assert header in written
+        routed = replica_health.routed_reads
+
+        await request("/read", [(header, written[header])])
+        assert replica_health.routed_reads == routed
+        # 没有带回截止时间（或已过期）的读取走副本，读取请求也不会下发新的截止时间
+        assert header not in await request("/read", [(header, b"1")])
+        assert replica_health.routed_reads == routed + 1
+
+    async def test_replica_failure_falls_back_to_primary(
+        self, db_session: AsyncSession
+    ):
+        user = await self._create_user(db_session)
+        # 副本库中没有任何表，查询报错后改走主库
+        broken = create_async_engine("sqlite+aiosqlite:///:memory:")
+        try:
+            async with AsyncSession(broken) as replica_session:
+                replica_health.record_lag(0)
+                fallbacks = replica_health.fallbacks
+                db_service = DatabaseService(db_session, read_session=replica_session)
+
+                assert (await db_service.get_user_by_id(user.id)).id == user.id
+                assert replica_health.fallbacks == fallbacks + 1
+                assert not replica_health.usable
+        finally:
+            await broken.dispose()
+
+
+@pytest.mark.unit
+class TestSchemaMigrations:
+    """测试数据库迁移和启动时的结构版本检查"""
+
+    def _config(self, url: str) -> Config:
+        config = Config()
+        config.set_main_option("script_location", MIGRATIONS_DIR)
+        config.set_main_option("sqlalchemy.url", url)
+        return config
+
+    def test_migrations_match_models(self, tmp_path):
+        path = tmp_path / "schema.db"
+        command.upgrade(self._config(f"sqlite+aiosqlite:///{path}"), "head")
+
+        engine = create_engine(f"sqlite:///{path}")
+        try:
+            with engine.connect() as conn:
+                # SQLite 反射出的列类型不精确（如 FLOAT 读回为 NUMERIC），只比较表、列和索引
+                context = MigrationContext.configure(conn, opts={"compare_type": False})
+                diff = compare_metadata(context, Base.metadata)
+        finally:
+            engine.dispose()
+        assert diff == []
+
+    def test_upgrade_from_stamped_baseline(self, tmp_path):
+        """引入迁移前由 create_all 建出的数据库：stamp 0001_baseline 后能升级到最新"""
+        path = tmp_path / "legacy.db"
+        legacy = MetaData()
+
+        def timestamps():
+            return (
+                Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+                Column("updated_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+            )
+
+        Table(
+            "users",
+            legacy,
+            Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            Column("email", String(255), unique=True, index=True, nullable=False),
+            Column("username", String(100), nullable=False),
+            Column("role", String(20), nullable=False),
+            Column("password_hash", String(255), nullable=False),
+            Column("is_suspended", Boolean, nullable=False),
+            *timestamps(),
+        )
+        Table(
+            "tickets",
+            legacy,
+            Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            Column("user_id", postgresql.UUID(as_uuid=True), nullable=False, index=True),
+            Column("spent_at", DateTime(timezone=True), nullable=False),
+            Column("amount", Float, nullable=False),
+            Column("currency", String(10), nullable=False),
+            Column("description", Text),
+            Column("link", Text),
+            Column("status", String(20), nullable=False),
+            Column("is_soft_deleted", Boolean, nullable=False),
+            *timestamps(),
+        )
+        engine = create_engine(f"sqlite:///{path}")
+        try:
+            legacy.create_all(engine)
+            config = self._config(f"sqlite+aiosqlite:///{path}")
+            command.stamp(config, "0001_baseline")
+            command.upgrade(config, "head")
+            with engine.connect() as conn:
+                context = MigrationContext.configure(conn, opts={"compare_type": False})
+                diff = compare_metadata(context, Base.metadata)
+        finally:
+            engine.dispose()
+        assert diff == []
+
+    def test_partitioning_requires_confirmation(self, capsys):
+        """复制整张 tickets 表的分区迁移不会在自动迁移中执行，必须显式确认"""
+        config = self._config("postgresql+asyncpg://localhost/app")
+        revisions = "0006_refresh_tokens_revoked:0007_partition_tickets"
+        with pytest.raises(RuntimeError, match="partition_tickets=yes"):
+            command.upgrade(config, revisions, sql=True)
+
+        config.cmd_opts = argparse.Namespace(x=["partition_tickets=yes"])
+        command.upgrade(config, revisions, sql=True)
+        assert "PARTITION BY RANGE (spent_at)" in capsys.readouterr().out
+
+    @pytest.mark.parametrize("source, installed", [("live", False), ("table", True)])
+    def test_summary_trigger_only_when_enabled(
+        self, monkeypatch, capsys, source, installed
+    ):
+        """汇总触发器只在 TICKET_SUMMARY_SOURCE=table 时由迁移安装"""
+        monkeypatch.setattr(ticket_summary, "TICKET_SUMMARY_SOURCE", source)
+        command.upgrade(
+            self._config("postgresql+asyncpg://localhost/app"),
+            "0007_partition_tickets:0008_ticket_summary_trigger",
+            sql=True,
+        )
+        assert ("CREATE TRIGGER tickets_summary_trigger" in capsys.readouterr().out) == installed
+
+    async def _stamp(self, engine, revision):
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS alembic_version "
+                    "(version_num VARCHAR(32))"
+                )
+            )
+            await conn.execute(text("DELETE FROM alembic_version"))
+            await conn.execute(
+                text("INSERT INTO alembic_version VALUES (:rev)"), {"rev": revision}
+            )
+
+    async def test_check_schema_version(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        head = ScriptDirectory(MIGRATIONS_DIR).get_current_head()
+        try:
+            with pytest.raises(SchemaVersionError, match="not under migration"):
+                await check_schema_version(engine)
+
+            await self._stamp(engine, head)
+            assert await check_schema_version(engine) == head
+
+            await self._stamp(engine, "0001_baseline")
+            with pytest.raises(SchemaVersionError, match="behind"):
+                await check_schema_version(engine)
+
+            # 数据库已被更新版本迁移：旧代码继续运行
+            await self._stamp(engine, "9999_future")
+            assert await check_schema_version(engine) == "9999_future"
+        finally:
+            await engine.dispose()
+
+
+@pytest.mark.unit
+class TestTicketPartitions:
+    """测试票据分区维护"""
+
+    def test_upcoming_months_cross_year(self):
+        assert upcoming_months(date(2026, 11, 17), 2) == [
+            date(2026, 11, 1),
+            date(2026, 12, 1),
+            date(2027, 1, 1),
+        ]
+
+    async def test_create_partitions_is_noop_without_postgres(
+        self, db_session: AsyncSession
+    ):
+        db_service = DatabaseService(db_session)
+        assert await db_service.create_ticket_partitions([date(2026, 11, 1)]) == []
+
+    async def test_lookup_by_id_carries_partition_key(self):
+        """PostgreSQL 上按 id 查询、更新票据时从 ticket_locators 取得 spent_at，只扫描所在分区"""
+        engine = create_async_engine("postgresql+asyncpg://localhost/app")
+        try:
+            db_service = DatabaseService(AsyncSession(bind=engine))
+            ticket_id = UUID("00000000-0000-0000-0000-000000000001")
+            for query in (select(Ticket), update(Ticket)):
+                sql = str(
+                    db_service._where_ticket_id(query, ticket_id).compile(
+                        dialect=engine.dialect
+                    )
+                )
+                assert "tickets.spent_at = (SELECT ticket_locators.spent_at" in sql
+        finally:
+            await engine.dispose()
+
+    def test_spent_at_filters_allow_partition_pruning(self):
+        """spent_at 区间必须直接比较分区键，而不是包在函数中"""
+        query = DatabaseService._apply_ticket_filters(
+            select(Ticket),
+            spent_from=datetime(2026, 1, 1, tzinfo=timezone.utc),
+            spent_to=datetime(2026, 2, 1, tzinfo=timezone.utc),
+        )
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert "tickets.spent_at >= %(spent_at_1)s" in sql
+        assert "tickets.spent_at < %(spent_at_2)s" in sql
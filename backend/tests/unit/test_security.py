@@ -1,20 +1,55 @@
+import asyncio
 import os
 import sys
+import time
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
+from uuid import uuid4
 
 import pytest
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src"))
 
+from app.security.email_filter import (
+    EMAIL_FILTER_REFRESH_SECONDS,
+    BloomFilter,
+    EmailFilter,
+)
 from app.security.jwt import (
     JWT_ALG,
+    JWT_EXPIRES_MINUTES,
     JWT_SECRET,
+    VerifiedTokenCache,
     create_access_token,
+    create_user_token,
     decode_access_token,
+    token_cache,
+)
+from app.models import User as UserModel
+from app.security import passwords
+from app.security.refresh_tokens import (
+    RevokedTokenSet,
+    format_refresh_token,
+    hash_refresh_secret,
+    new_refresh_secret,
+    parse_refresh_token,
+)
+from app.security.revocation import AuthEpochTable
+from app.security.throttle import TokenBucketLimiter
+from app.security.passwords import (
+    MIN_HASH_ROUNDS,
+    PasswordHashingBusy,
+    calibrate_rounds,
+    configure_password_hashing,
+    current_rounds,
+    hash_password,
+    hash_password_async,
+    hashing_metrics,
+    verify_and_rehash_password,
+    verify_password,
+    verify_password_async,
 )
-from app.security.passwords import hash_password, verify_password
 
 
 class TestPasswordHashing:
@@ -78,6 +113,106 @@ class TestPasswordHashing:
         assert verify_password("密码测试123", hashed) is False
 
 
+class TestAsyncPasswordHashing:
+    """测试在计算池中执行的密码哈希"""
+
+    async def test_hash_and_verify_async(self):
+        """测试异步哈希结果可被同步和异步校验"""
+        hashed = await hash_password_async("testpassword123")
+        assert verify_password("testpassword123", hashed) is True
+        assert await verify_password_async("testpassword123", hashed) is True
+        assert await verify_password_async("wrongpassword", hashed) is False
+
+    async def test_metrics_track_completed_tasks(self):
+        """测试指标记录完成数，空闲时队列深度为0"""
+        before = hashing_metrics()["completed"]
+        await hash_password_async("testpassword123")
+        metrics = hashing_metrics()
+        assert metrics["completed"] == before + 1
+        assert metrics["in_flight"] == 0
+        assert metrics["queued"] == 0
+
+    async def test_metrics_count_failures_and_cancellations_separately(self):
+        """测试失败和取消的任务不计入完成数"""
+        before = hashing_metrics()
+        with pytest.raises(ValueError):
+            await passwords._pool.run(int, "not a number")
+
+        task = asyncio.create_task(passwords._pool.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        metrics = hashing_metrics()
+        assert metrics["completed"] == before["completed"]
+        assert metrics["failed"] == before["failed"] + 1
+        assert metrics["cancelled"] == before["cancelled"] + 1
+        assert metrics["in_flight"] == 0
+
+    async def test_rejects_when_pool_is_full(self):
+        """测试排队任务达到上限时直接拒绝"""
+        with patch.object(passwords._pool, "max_pending", 0):
+            with pytest.raises(PasswordHashingBusy):
+                await hash_password_async("testpassword123")
+        assert hashing_metrics()["rejected"] >= 1
+
+
+class TestPasswordHashCost:
+    """测试哈希轮数校准和登录时重新哈希"""
+
+    @pytest.fixture(autouse=True)
+    def restore_context(self):
+        saved = passwords.pwd_context.to_dict()
+        yield
+        passwords.pwd_context.load(saved)
+
+    def test_calibrate_rounds_targets_latency(self):
+        """测试校准轮数不低于下限，且目标耗时越长轮数越多"""
+        with patch("app.security.passwords._timed", return_value=0.01):
+            assert calibrate_rounds(target_ms=100) == MIN_HASH_ROUNDS * 10
+            assert calibrate_rounds(target_ms=1) == MIN_HASH_ROUNDS
+
+    def test_workers_use_configured_rounds_without_calibrating(self, capsys):
+        """测试 worker 启动时只读取 PASSWORD_HASH_ROUNDS，校准由部署时的命令行完成一次"""
+        with patch("app.security.passwords.calibrate_rounds") as calibrate:
+            with patch("app.security.passwords.PASSWORD_HASH_ROUNDS", 120000):
+                assert passwords.setup_password_hashing() == 120000
+            with patch("app.security.passwords.PASSWORD_HASH_ROUNDS", 0):
+                assert passwords.setup_password_hashing() == MIN_HASH_ROUNDS
+            calibrate.assert_not_called()
+        assert passwords.current_rounds() == MIN_HASH_ROUNDS
+
+        with patch("app.security.passwords._timed", return_value=0.01):
+            assert passwords.main(["calibrate"]) == 0
+            expected = calibrate_rounds()
+        assert capsys.readouterr().out.strip() == str(expected)
+
+    def test_outdated_hash_is_rehashed(self):
+        """测试轮数过低的哈希在校验通过时返回新哈希"""
+        old_hash = hash_password("testpassword123")
+        configure_password_hashing(MIN_HASH_ROUNDS * 2)
+        assert current_rounds() == MIN_HASH_ROUNDS * 2
+
+        ok, new_hash = verify_and_rehash_password("testpassword123", old_hash)
+        assert ok is True
+        assert f"${MIN_HASH_ROUNDS * 2}$" in new_hash
+        assert verify_and_rehash_password("testpassword123", new_hash) == (True, None)
+
+    def test_wrong_password_is_not_rehashed(self):
+        """测试校验失败时不计算新哈希"""
+        old_hash = hash_password("testpassword123")
+        configure_password_hashing(MIN_HASH_ROUNDS * 2)
+        assert verify_and_rehash_password("wrongpassword", old_hash) == (False, None)
+
+    def test_small_calibration_drift_does_not_rehash(self):
+        """测试轮数在容差范围内变化时不重新哈希"""
+        configure_password_hashing(MIN_HASH_ROUNDS * 2)
+        hashed = hash_password("testpassword123")
+        configure_password_hashing(int(MIN_HASH_ROUNDS * 2.2))
+        assert verify_and_rehash_password("testpassword123", hashed) == (True, None)
+
+
 class TestJWTTokens:
     """测试JWT令牌功能"""
 
@@ -144,8 +279,8 @@ class TestJWTTokens:
         exp_datetime = datetime.fromtimestamp(exp_timestamp, tz=timezone.utc)
         now = datetime.now(timezone.utc)
 
-        # 令牌应该在24小时后过期
-        expected_exp = now + timedelta(minutes=60 * 24)
+        # 访问令牌应该在 JWT_EXPIRES_MINUTES 分钟后过期
+        expected_exp = now + timedelta(minutes=JWT_EXPIRES_MINUTES)
         time_diff = abs((exp_datetime - expected_exp).total_seconds())
         assert time_diff < 60  # 允许1分钟的误差
 
@@ -201,3 +336,269 @@ class TestJWTTokens:
         # 在生产环境中，密钥应该更复杂
         if JWT_SECRET == "dev-secret-change-me":
             pytest.skip("使用开发密钥，生产环境应使用更安全的密钥")
+
+
+class TestVerifiedTokenCache:
+    """测试已验证令牌缓存"""
+
+    def test_repeated_decode_skips_verification(self):
+        """测试同一令牌第二次解码直接命中缓存，不再调用 jose"""
+        token = create_access_token("user-123", {"role": "employee"})
+        first = decode_access_token(token)
+        with patch("app.security.jwt.jwt.decode") as mock_decode:
+            second = decode_access_token(token)
+        mock_decode.assert_not_called()
+        assert second == first
+
+    def test_returned_claims_are_copies(self):
+        """测试修改返回的声明不影响缓存"""
+        token = create_access_token("user-123")
+        decode_access_token(token)["sub"] = "tampered"
+        assert decode_access_token(token)["sub"] == "user-123"
+
+    def test_expired_entry_is_not_served(self):
+        """测试令牌过期后不再从缓存返回"""
+        cache = VerifiedTokenCache(max_entries=10)
+        cache.put("token", {"sub": "user-123", "exp": 100})
+        with patch("app.security.jwt.time.time", return_value=99):
+            assert cache.get("token") == {"sub": "user-123", "exp": 100}
+        with patch("app.security.jwt.time.time", return_value=100):
+            assert cache.get("token") is None
+        assert cache.metrics() == {"size": 0, "hits": 1, "misses": 1}
+
+    def test_cache_is_bounded(self):
+        """测试超过容量时淘汰最久未使用的令牌"""
+        cache = VerifiedTokenCache(max_entries=2)
+        exp = int((datetime.now(timezone.utc) + timedelta(days=1)).timestamp())
+        for token in ("a", "b", "c"):
+            cache.put(token, {"sub": token, "exp": exp})
+        assert cache.get("a") is None
+        assert cache.get("c") is not None
+
+    def test_invalid_token_is_not_cached(self):
+        """测试校验失败的令牌不进入缓存"""
+        size = token_cache.metrics()["size"]
+        with pytest.raises(Exception):
+            decode_access_token("invalid.token.here")
+        assert token_cache.metrics()["size"] == size
+
+
+class TestSessionTokens:
+    """测试自包含会话令牌和认证纪元吊销表"""
+
+    def test_user_token_carries_session_claims(self):
+        """测试会话令牌携带用户名、邮箱、角色和认证纪元"""
+        user = UserModel(
+            id=uuid4(),
+            email="test@example.com",
+            username="testuser",
+            role="employer",
+            auth_epoch=3,
+        )
+        decoded = decode_access_token(create_user_token(user))
+        assert decoded["sub"] == str(user.id)
+        assert decoded["username"] == "testuser"
+        assert decoded["email"] == "test@example.com"
+        assert decoded["role"] == "employer"
+        assert decoded["epoch"] == 3
+
+    def test_epoch_table_only_moves_forward(self):
+        """测试纪元只增不减"""
+        table = AuthEpochTable()
+        user_id = uuid4()
+        assert table.get(user_id) == (0, False)
+        table.update(user_id, 2, True)
+        table.update(user_id, 1, False)
+        assert table.get(user_id) == (2, True)
+        table.update(user_id, 2, False)
+        assert table.get(user_id) == (2, False)
+
+    def test_replace_keeps_entries_newer_than_snapshot(self):
+        """测试重建时保留读取快照之后本进程写入的条目"""
+        table = AuthEpochTable()
+        stale, fresh = uuid4(), uuid4()
+        table.update(stale, 1, True)
+        started_at = time.monotonic()
+        table.update(fresh, 1, True)
+
+        table.replace([(stale, 1, False)], started_at)
+        assert table.get(stale) == (1, False)
+        assert table.get(fresh) == (1, True)
+
+        table.replace([], time.monotonic())
+        assert table.get(fresh) == (0, False)
+        assert table.metrics()["refreshes"] == 2
+
+    def test_merge_skips_users_never_suspended(self):
+        """测试增量合并只记录被暂停过的用户，并推进水位线"""
+        table = AuthEpochTable()
+        suspended, activated, untouched = uuid4(), uuid4(), uuid4()
+        table.update(activated, 2, True)
+        watermark = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+        table.merge(
+            [(suspended, 1, True), (activated, 2, False), (untouched, 0, False)],
+            watermark,
+        )
+        assert table.get(suspended) == (1, True)
+        assert table.get(activated) == (2, False)
+        assert table.metrics()["size"] == 2
+        assert table.watermark == watermark
+
+        # 没有用户变化时水位线不后退
+        table.merge([], None)
+        assert table.watermark == watermark
+
+
+class TestRefreshTokens:
+    """测试刷新令牌的格式和吊销集合"""
+
+    def test_format_and_parse_round_trip(self):
+        """测试刷新令牌可以解析回 id 和密文，且只落库摘要"""
+        secret, token_hash, expires_at = new_refresh_secret()
+        token_id = uuid4()
+        token = format_refresh_token(token_id, secret)
+
+        assert parse_refresh_token(token) == (token_id, secret)
+        assert token_hash == hash_refresh_secret(secret)
+        assert secret not in token_hash
+        assert expires_at > datetime.now(timezone.utc)
+
+    @pytest.mark.parametrize(
+        "token", ["", "no-separator", "not-a-uuid.secret", f"{uuid4()}."]
+    )
+    def test_parse_rejects_malformed_tokens(self, token):
+        """测试格式错误的刷新令牌抛出 ValueError"""
+        with pytest.raises(ValueError):
+            parse_refresh_token(token)
+
+    def test_revoked_set(self):
+        """测试吊销集合的添加、重建和拒绝计数"""
+        revoked = RevokedTokenSet()
+        expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+        first, second = uuid4(), uuid4()
+        revoked.add([(first, expires_at)])
+        assert first in revoked
+        assert second not in revoked
+
+        revoked.replace([(second, expires_at)])
+        assert first not in revoked
+        assert second in revoked
+        assert revoked.metrics() == {"size": 1, "rejections": 2}
+
+    def test_revoked_set_evicts_expired_tokens(self):
+        """测试过期令牌不再命中，并在添加时被清理，集合不会无限增长"""
+        revoked = RevokedTokenSet(sweep_interval=0)
+        now = datetime.now(timezone.utc)
+        expired, live = uuid4(), uuid4()
+        revoked.replace([(expired, now + timedelta(seconds=1))])
+        with patch(
+            "app.security.refresh_tokens.datetime",
+            wraps=datetime,
+            **{"now.return_value": now + timedelta(seconds=2)},
+        ):
+            assert expired not in revoked
+            revoked.add([(live, now + timedelta(days=1))])
+        assert live in revoked
+        assert revoked.metrics()["size"] == 1
+
+
+class TestTokenBucketLimiter:
+    """测试登录限流令牌桶"""
+
+    def test_burst_then_reject_with_retry_after(self):
+        """测试突发容量用完后拒绝，并给出等待时间"""
+        limiter = TokenBucketLimiter(burst=2, per_minute=60, max_buckets=10)
+        with patch("app.security.throttle.time.monotonic", return_value=100.0):
+            assert limiter.acquire("a@example.com") == 0
+            assert limiter.acquire("a@example.com") == 0
+            assert limiter.acquire("a@example.com") == pytest.approx(1.0)
+            # 其他键不受影响
+            assert limiter.acquire("b@example.com") == 0
+        assert limiter.metrics()["rejected"] == 1
+
+    def test_tokens_refill_over_time(self):
+        """测试令牌随时间补充"""
+        limiter = TokenBucketLimiter(burst=1, per_minute=60, max_buckets=10)
+        with patch("app.security.throttle.time.monotonic", return_value=100.0):
+            assert limiter.acquire("key") == 0
+            assert limiter.acquire("key") > 0
+        with patch("app.security.throttle.time.monotonic", return_value=101.5):
+            assert limiter.acquire("key") == 0
+
+    def test_buckets_are_bounded(self):
+        """测试桶数量有上限，淘汰最久未使用的桶"""
+        limiter = TokenBucketLimiter(burst=1, per_minute=60, max_buckets=2)
+        for key in ("a", "b", "c"):
+            limiter.acquire(key)
+        assert limiter.metrics()["buckets"] == 2
+        assert limiter.metrics()["evicted"] == 1
+
+
+class TestEmailFilter:
+    """测试已注册邮箱的布隆过滤器"""
+
+    def test_no_false_negatives(self):
+        """测试加入过的邮箱一定判定为可能存在"""
+        bloom = BloomFilter(capacity=1000, false_positive_rate=0.01, max_bytes=1 << 20)
+        emails = [f"user{i}@example.com" for i in range(1000)]
+        for email in emails:
+            bloom.add(email)
+        assert all(email in bloom for email in emails)
+
+        false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+        assert false_positives < 300
+
+    def test_memory_budget_caps_size(self):
+        """测试位数组大小不超过内存上限"""
+        bloom = BloomFilter(capacity=10**7, false_positive_rate=0.01, max_bytes=1024)
+        assert len(bloom._bits) <= 1024
+
+    def test_not_ready_filter_never_skips_lookup(self):
+        """测试加载完成前不做否定判断"""
+        email_filter = EmailFilter(false_positive_rate=0.01, max_bytes=1 << 20)
+        assert email_filter.definitely_absent("nobody@example.com") is False
+
+    def test_definitely_absent_after_install(self):
+        """测试加载后未注册的邮箱判定为一定不存在，新注册的立即可见"""
+        email_filter = EmailFilter(false_positive_rate=0.01, max_bytes=1 << 20)
+        bloom = email_filter.begin_rebuild(user_count=1)
+        bloom.add("known@example.com")
+        # 重建期间本进程注册的邮箱在安装时补入
+        email_filter.add("during@example.com")
+        email_filter.install(bloom, watermark=None)
+
+        assert email_filter.definitely_absent("known@example.com") is False
+        assert email_filter.definitely_absent("during@example.com") is False
+        assert email_filter.definitely_absent("nobody@example.com") is True
+
+        email_filter.add("new@example.com")
+        assert email_filter.definitely_absent("new@example.com") is False
+        metrics = email_filter.metrics()
+        assert metrics["emails"] == 3
+        assert metrics["skipped_lookups"] == 1
+
+    def test_stale_filter_falls_through_to_database(self):
+        """测试距上次同步过久时不再判定不存在：其他 worker 新注册的邮箱可能尚未同步"""
+        email_filter = EmailFilter(
+            false_positive_rate=0.01, max_bytes=1 << 20, max_staleness=5
+        )
+        bloom = email_filter.begin_rebuild(user_count=1)
+        email_filter.install(bloom, watermark=None, synced_at=time.monotonic() - 10)
+        assert email_filter.definitely_absent("other-worker@example.com") is False
+        assert email_filter.metrics()["stale_lookups"] == 1
+
+        # 同步完成后重新计时
+        email_filter.mark_synced(watermark=None)
+        assert email_filter.definitely_absent("nobody@example.com") is True
+
+    def test_default_staleness_spans_several_refreshes(self):
+        """测试默认过期时间覆盖多个同步间隔，正常运行时两次同步之间不会改为查库"""
+        email_filter = EmailFilter(false_positive_rate=0.01, max_bytes=1 << 20)
+        bloom = email_filter.begin_rebuild(user_count=1)
+        email_filter.install(
+            bloom,
+            watermark=None,
+            synced_at=time.monotonic() - EMAIL_FILTER_REFRESH_SECONDS * 1.5,
+        )
+        assert email_filter.definitely_absent("nobody@example.com") is True
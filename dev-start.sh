@@ -162,6 +162,9 @@ start_backend() {
     echo -e "${BLUE}🔧 启动后端服务...${NC}"
     cd backend
     
+    # 迁移数据库结构
+    uv run alembic upgrade head
+
     # 在后台启动后端服务
     uv run uvicorn src.app.main:app --reload --host 0.0.0.0 --port 8000 &
     BACKEND_PID=$!
@@ -2,18 +2,22 @@ import { useEffect, useState } from 'react';
 import { useAppSelector, useAppDispatch } from '../store/hooks';
 import {
   fetchTickets,
+  fetchMoreTickets,
+  syncTickets,
   approveTicketAction,
   denyTicketAction,
+  bulkReviewTicketsAction,
   deleteTicketAction,
   clearError,
 } from '../store/slices/ticketsSlice';
 import { CreateTicketModal } from '../components/CreateTicketModal';
 
+const SYNC_INTERVAL_MS = 30000;
+
 function TicketListPage() {
   const dispatch = useAppDispatch();
-  const { tickets, loading, error, updating } = useAppSelector(
-    state => state.tickets
-  );
+  const { tickets, nextCursor, loading, loadingMore, error, updating } =
+    useAppSelector(state => state.tickets);
   const { user } = useAppSelector(state => state.auth);
 
   const [isCreateModalOpen, setIsCreateModalOpen] = useState(false);
@@ -25,6 +29,14 @@ function TicketListPage() {
     };
   }, [dispatch]);
 
+  // 定时增量同步，只拉取上次同步之后变化的票据
+  useEffect(() => {
+    const timer = setInterval(() => {
+      dispatch(syncTickets());
+    }, SYNC_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [dispatch]);
+
   const handleAction = (id: string, type: 'approve' | 'deny' | 'delete') => {
     if (type === 'approve') {
       dispatch(approveTicketAction(id));
@@ -35,6 +47,16 @@ function TicketListPage() {
     }
   };
 
+  const pendingIds = tickets
+    .filter(t => t.status === 'pending')
+    .map(t => t.id);
+
+  const handleBulkAction = (action: 'approve' | 'deny') => {
+    if (pendingIds.length > 0) {
+      dispatch(bulkReviewTicketsAction({ action, ticketIds: pendingIds }));
+    }
+  };
+
   return (
     <div className="space-y-6">
       {/* 页面标题 */}
@@ -86,8 +108,26 @@ function TicketListPage() {
 
       {/* 票据列表 */}
       <div className="bg-white rounded-lg shadow-sm overflow-hidden">
-        <div className="px-6 py-4 border-b border-gray-200">
+        <div className="px-6 py-4 border-b border-gray-200 flex items-center justify-between">
           <h2 className="text-lg font-semibold text-gray-900">票据列表</h2>
+          {user?.role === 'employer' && pendingIds.length > 0 && (
+            <div className="flex space-x-4 text-sm font-medium">
+              <button
+                className="text-green-600 hover:text-green-900 disabled:opacity-50 disabled:cursor-not-allowed"
+                onClick={() => handleBulkAction('approve')}
+                disabled={updating}
+              >
+                全部批准（{pendingIds.length}）
+              </button>
+              <button
+                className="text-red-600 hover:text-red-900 disabled:opacity-50 disabled:cursor-not-allowed"
+                onClick={() => handleBulkAction('deny')}
+                disabled={updating}
+              >
+                全部拒绝（{pendingIds.length}）
+              </button>
+            </div>
+          )}
         </div>
         
         {loading ? (
@@ -185,6 +225,17 @@ function TicketListPage() {
                 ))}
               </tbody>
             </table>
+            {nextCursor && (
+              <div className="flex justify-center py-4 border-t border-gray-200">
+                <button
+                  className="text-blue-600 hover:text-blue-800 text-sm font-medium disabled:opacity-50 disabled:cursor-not-allowed"
+                  onClick={() => dispatch(fetchMoreTickets())}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? '加载中...' : '加载更多'}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
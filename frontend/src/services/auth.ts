@@ -9,6 +9,8 @@ type RegisterReq = {
 };
 type AuthRes = {
   token: string;
+  refresh_token: string;
+  expires_in: number;
   user: {
     id: string;
     email: string;
@@ -28,6 +30,11 @@ export async function register(body: RegisterReq): Promise<AuthRes> {
   return data;
 }
 
+// 登出时吊销刷新令牌，之后无法再用它续期
+export async function logout(refreshToken: string): Promise<void> {
+  await api.post('/auth/logout', { refresh_token: refreshToken });
+}
+
 export async function checkUserExists(email: string): Promise<{ exists: boolean }> {
   const { data } = await api.get(`/auth/check-user/${email}`);
   return data;
@@ -1,4 +1,4 @@
-import axios, { AxiosError, AxiosResponse } from 'axios';
+import axios, { AxiosError, AxiosRequestConfig, AxiosResponse } from 'axios';
 import { store } from '../store';
 import { logoutUser } from '../store/slices/authSlice';
 
@@ -44,6 +44,10 @@ export const api = axios.create({
   },
 });
 
+// 写入之后服务端返回的主库读取截止时间，之后的请求原样带回，刚写入的数据不会从只读副本读到旧值
+const PRIMARY_UNTIL_HEADER = 'X-Read-Primary-Until';
+let primaryUntil: string | null = null;
+
 // 请求拦截器
 api.interceptors.request.use(
   config => {
@@ -52,6 +56,10 @@ api.interceptors.request.use(
       config.headers = config.headers || {};
       (config.headers as any)['Authorization'] = `Bearer ${token}`;
     }
+    if (primaryUntil) {
+      config.headers = config.headers || {};
+      (config.headers as any)[PRIMARY_UNTIL_HEADER] = primaryUntil;
+    }
     
     // 添加请求时间戳
     config.metadata = { startTime: new Date() };
@@ -63,9 +71,39 @@ api.interceptors.request.use(
   }
 );
 
+// 同一时间只发起一次刷新请求，并发的 401 共享同一个结果
+let refreshing: Promise<string | null> | null = null;
+
+// 用刷新令牌换取新的访问令牌（刷新令牌同时轮换），失败时返回 null
+function refreshAccessToken(): Promise<string | null> {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) return Promise.resolve(null);
+  if (!refreshing) {
+    refreshing = api
+      .post('/auth/refresh', { refresh_token: refreshToken }, {
+        _skipRefresh: true,
+      } as AxiosRequestConfig)
+      .then(({ data }) => {
+        localStorage.setItem('token', data.token);
+        localStorage.setItem('refresh_token', data.refresh_token);
+        return data.token as string;
+      })
+      .catch(() => null)
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+}
+
 // 响应拦截器
 api.interceptors.response.use(
   (response: AxiosResponse) => {
+    const until = response.headers?.[PRIMARY_UNTIL_HEADER.toLowerCase()];
+    if (until) {
+      primaryUntil = until;
+    }
+
     // 计算请求耗时
     const endTime = new Date();
     const startTime = (response.config as any).metadata?.startTime;
@@ -76,7 +114,27 @@ api.interceptors.response.use(
     
     return response;
   },
-  (error: AxiosError) => {
+  async (error: AxiosError) => {
+    // 访问令牌过期：先尝试续期并重放原请求
+    const config = error.config as
+      | (AxiosRequestConfig & { _skipRefresh?: boolean; _retried?: boolean })
+      | undefined;
+    if (
+      error.response?.status === 401 &&
+      config &&
+      !config._skipRefresh &&
+      !config._retried &&
+      !config.url?.startsWith('/auth/login')
+    ) {
+      const token = await refreshAccessToken();
+      if (token) {
+        config._retried = true;
+        config.headers = config.headers || {};
+        (config.headers as any)['Authorization'] = `Bearer ${token}`;
+        return api(config);
+      }
+    }
+
     const apiError = createApiError(error);
     
     // 处理不同类型的错误
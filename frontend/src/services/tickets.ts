@@ -1,7 +1,24 @@
 import { api } from './http';
 
-export async function getTickets() {
-  const { data } = await api.get('/tickets/');
+export interface TicketQuery {
+  status?: 'pending' | 'approved' | 'denied';
+  user_id?: string;
+  spent_from?: string;
+  spent_to?: string;
+  min_amount?: number;
+  max_amount?: number;
+  sort?: string;
+}
+
+export async function getTickets(
+  params?: TicketQuery & { cursor?: string; limit?: number }
+) {
+  const { data } = await api.get('/tickets/', { params });
+  return data;
+}
+
+export async function getTicketChanges(since: string) {
+  const { data } = await api.get('/tickets/changes', { params: { since } });
   return data;
 }
 
@@ -26,6 +43,16 @@ export async function denyTicket(id: string) {
   return data;
 }
 
+export async function bulkReviewTickets(
+  action: 'approve' | 'deny',
+  ticketIds: string[]
+) {
+  const { data } = await api.post(`/tickets/bulk/${action}`, {
+    ticket_ids: ticketIds,
+  });
+  return data;
+}
+
 export async function deleteTicket(id: string) {
   const { data } = await api.delete(`/tickets/${id}`);
   return data;
@@ -1,5 +1,11 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit';
-import { login, register, checkUserExists as checkUserExistsService, validateToken } from '../../services/auth';
+import {
+  login,
+  logout,
+  register,
+  checkUserExists as checkUserExistsService,
+  validateToken,
+} from '../../services/auth';
 
 export interface User {
   id: string;
@@ -41,6 +47,7 @@ export const loginUser = createAsyncThunk(
     try {
       const response = await login(credentials);
       localStorage.setItem('token', response.token);
+      localStorage.setItem('refresh_token', response.refresh_token);
       localStorage.setItem('role', response.user.role);
       return response;
     } catch (error: any) {
@@ -75,6 +82,7 @@ export const registerUser = createAsyncThunk(
     try {
       const response = await register(userData);
       localStorage.setItem('token', response.token);
+      localStorage.setItem('refresh_token', response.refresh_token);
       localStorage.setItem('role', response.user.role);
       return response;
     } catch (error: any) {
@@ -105,7 +113,12 @@ export const logoutUser = createAsyncThunk(
   'auth/logout',
   async (_, { rejectWithValue }) => {
     try {
+      const refreshToken = localStorage.getItem('refresh_token');
+      // 先清除本地令牌：吊销请求失败（如网络错误）时仍完成本地登出
       localStorage.clear();
+      if (refreshToken) {
+        await logout(refreshToken).catch(() => undefined);
+      }
       return null;
     } catch (error: any) {
       return rejectWithValue(error?.message || '登出失败');
@@ -1,9 +1,12 @@
 import { createSlice, createAsyncThunk, PayloadAction } from '@reduxjs/toolkit';
 import {
+  TicketQuery,
   getTickets,
+  getTicketChanges,
   createTicket,
   approveTicket,
   denyTicket,
+  bulkReviewTickets,
   deleteTicket,
 } from '../../services/tickets';
 
@@ -17,6 +20,7 @@ export interface Ticket {
   status: 'pending' | 'approved' | 'denied';
   created_at: string;
   updated_at: string;
+  user_id: string;
   employee_id: string;
   employee?: {
     id: string;
@@ -33,9 +37,31 @@ export interface CreateTicketData {
   link?: string;
 }
 
+export interface TicketPage {
+  items: Ticket[];
+  next_cursor: string | null;
+  synced_at: string | null;
+}
+
+export interface TicketChanges {
+  changed: Ticket[];
+  removed: string[];
+  next_since: string;
+}
+
+export interface TicketBulkResult {
+  id: string;
+  outcome: 'updated' | 'not_found' | 'conflict';
+  status: Ticket['status'] | null;
+}
+
 export interface TicketsState {
   tickets: Ticket[];
+  query: TicketQuery;
+  nextCursor: string | null;
+  syncedAt: string | null;
   loading: boolean;
+  loadingMore: boolean;
   error: string | null;
   creating: boolean;
   updating: boolean;
@@ -43,18 +69,49 @@ export interface TicketsState {
 
 const initialState: TicketsState = {
   tickets: [],
+  query: {},
+  nextCursor: null,
+  syncedAt: null,
   loading: false,
+  loadingMore: false,
   error: null,
   creating: false,
   updating: false,
 };
 
-// 异步thunk：获取票据列表
-export const fetchTickets = createAsyncThunk(
+// 票据是否满足列表的筛选条件，与后端一致：spent_at 左闭右开，金额上下限均包含
+export function matchesQuery(ticket: Ticket, query: TicketQuery): boolean {
+  if (query.status !== undefined && ticket.status !== query.status) {
+    return false;
+  }
+  if (query.user_id !== undefined && ticket.user_id !== query.user_id) {
+    return false;
+  }
+  const spentAt = Date.parse(ticket.spent_at);
+  if (
+    query.spent_from !== undefined &&
+    spentAt < Date.parse(query.spent_from)
+  ) {
+    return false;
+  }
+  if (query.spent_to !== undefined && spentAt >= Date.parse(query.spent_to)) {
+    return false;
+  }
+  if (query.min_amount !== undefined && ticket.amount < query.min_amount) {
+    return false;
+  }
+  if (query.max_amount !== undefined && ticket.amount > query.max_amount) {
+    return false;
+  }
+  return true;
+}
+
+// 异步thunk：获取票据列表（第一页），可传入筛选和排序条件
+export const fetchTickets = createAsyncThunk<TicketPage, TicketQuery | void>(
   'tickets/fetchTickets',
-  async (_, { rejectWithValue }) => {
+  async (query, { rejectWithValue }) => {
     try {
-      const response = await getTickets();
+      const response = await getTickets(query || undefined);
       return response;
     } catch (error: any) {
       return rejectWithValue(
@@ -64,6 +121,43 @@ export const fetchTickets = createAsyncThunk(
   }
 );
 
+// 异步thunk：按游标加载下一页票据
+export const fetchMoreTickets = createAsyncThunk<
+  TicketPage,
+  void,
+  { state: { tickets: TicketsState } }
+>('tickets/fetchMoreTickets', async (_, { getState, rejectWithValue }) => {
+  try {
+    const { query, nextCursor } = getState().tickets;
+    const response = await getTickets({
+      ...query,
+      ...(nextCursor ? { cursor: nextCursor } : {}),
+    });
+    return response;
+  } catch (error: any) {
+    return rejectWithValue(
+      error?.response?.data?.detail || error?.message || '获取票据失败'
+    );
+  }
+});
+
+// 异步thunk：按水位线增量同步票据，尚未加载过列表时不做任何事
+export const syncTickets = createAsyncThunk<
+  TicketChanges | null,
+  void,
+  { state: { tickets: TicketsState } }
+>('tickets/syncTickets', async (_, { getState, rejectWithValue }) => {
+  try {
+    const { syncedAt } = getState().tickets;
+    if (!syncedAt) return null;
+    return await getTicketChanges(syncedAt);
+  } catch (error: any) {
+    return rejectWithValue(
+      error?.response?.data?.detail || error?.message || '同步票据失败'
+    );
+  }
+});
+
 // 异步thunk：创建票据
 export const createNewTicket = createAsyncThunk(
   'tickets/createTicket',
@@ -109,6 +203,24 @@ export const denyTicketAction = createAsyncThunk(
   }
 );
 
+// 异步thunk：批量批准/拒绝票据
+export const bulkReviewTicketsAction = createAsyncThunk(
+  'tickets/bulkReviewTickets',
+  async (
+    { action, ticketIds }: { action: 'approve' | 'deny'; ticketIds: string[] },
+    { rejectWithValue }
+  ) => {
+    try {
+      const response = await bulkReviewTickets(action, ticketIds);
+      return response.results as TicketBulkResult[];
+    } catch (error: any) {
+      return rejectWithValue(
+        error?.response?.data?.detail || error?.message || '批量审批失败'
+      );
+    }
+  }
+);
+
 // 异步thunk：删除票据
 export const deleteTicketAction = createAsyncThunk(
   'tickets/deleteTicket',
@@ -133,24 +245,71 @@ const ticketsSlice = createSlice({
     },
     clearTickets: state => {
       state.tickets = [];
+      state.nextCursor = null;
+      state.syncedAt = null;
     },
   },
   extraReducers: builder => {
     builder
       // 获取票据列表
-      .addCase(fetchTickets.pending, state => {
+      .addCase(fetchTickets.pending, (state, action) => {
         state.loading = true;
+        state.query = action.meta.arg || {};
         state.error = null;
       })
       .addCase(fetchTickets.fulfilled, (state, action) => {
         state.loading = false;
-        state.tickets = action.payload;
+        state.tickets = action.payload.items;
+        state.nextCursor = action.payload.next_cursor;
+        state.syncedAt = action.payload.synced_at;
         state.error = null;
       })
       .addCase(fetchTickets.rejected, (state, action) => {
         state.loading = false;
         state.error = action.payload as string;
       })
+      // 加载更多票据
+      .addCase(fetchMoreTickets.pending, state => {
+        state.loadingMore = true;
+        state.error = null;
+      })
+      .addCase(fetchMoreTickets.fulfilled, (state, action) => {
+        state.loadingMore = false;
+        // 增量同步或新建时已插到列表前面的票据可能再次出现在后续页中，按 id 去重
+        const loadedIds = new Set(state.tickets.map(t => t.id));
+        state.tickets.push(
+          ...action.payload.items.filter(t => !loadedIds.has(t.id))
+        );
+        state.nextCursor = action.payload.next_cursor;
+        state.error = null;
+      })
+      .addCase(fetchMoreTickets.rejected, (state, action) => {
+        state.loadingMore = false;
+        state.error = action.payload as string;
+      })
+      // 增量同步票据：移除已删除的，更新已加载的（变化后不再满足筛选条件的移出列表，
+      // 例如筛选待审批时被批准的票据）；无筛选条件时把新票据插到列表前面
+      .addCase(syncTickets.fulfilled, (state, action) => {
+        if (!action.payload) return;
+        const { changed, removed, next_since } = action.payload;
+        const removedIds = new Set(removed);
+        state.tickets = state.tickets.filter(t => !removedIds.has(t.id));
+        const filtered = Object.values(state.query).some(v => v !== undefined);
+        changed.forEach(ticket => {
+          const index = state.tickets.findIndex(t => t.id === ticket.id);
+          if (!matchesQuery(ticket, state.query)) {
+            if (index >= 0) state.tickets.splice(index, 1);
+          } else if (index >= 0) {
+            state.tickets[index] = ticket;
+          } else if (!filtered) {
+            state.tickets.unshift(ticket);
+          }
+        });
+        state.syncedAt = next_since;
+      })
+      .addCase(syncTickets.rejected, (state, action) => {
+        state.error = action.payload as string;
+      })
       // 创建票据
       .addCase(createNewTicket.pending, state => {
         state.creating = true;
@@ -203,6 +362,28 @@ const ticketsSlice = createSlice({
         state.updating = false;
         state.error = action.payload as string;
       })
+      // 批量批准/拒绝票据
+      .addCase(bulkReviewTicketsAction.pending, state => {
+        state.updating = true;
+        state.error = null;
+      })
+      .addCase(bulkReviewTicketsAction.fulfilled, (state, action) => {
+        state.updating = false;
+        action.payload.forEach(result => {
+          const ticket = state.tickets.find(t => t.id === result.id);
+          if (!ticket) return;
+          if (result.outcome === 'not_found') {
+            state.tickets = state.tickets.filter(t => t.id !== result.id);
+          } else if (result.status) {
+            ticket.status = result.status;
+          }
+        });
+        state.error = null;
+      })
+      .addCase(bulkReviewTicketsAction.rejected, (state, action) => {
+        state.updating = false;
+        state.error = action.payload as string;
+      })
       // 删除票据
       .addCase(deleteTicketAction.pending, state => {
         state.updating = true;